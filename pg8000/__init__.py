@@ -3,8 +3,10 @@ from .core import (
     Error, OperationalError, IntegrityError, InternalError, NotSupportedError,
     ArrayContentNotHomogenousError, ArrayContentEmptyError,
     ArrayDimensionsNotConsistentError, ArrayContentNotSupportedError, utc,
-    Connection, Cursor, Binary, Date, DateFromTicks, Time, TimeFromTicks,
-    Timestamp, TimestampFromTicks, BINARY, Interval)
+    Connection, Cursor, Pipeline, PreparedStatement, StatementCache, Binary,
+    Date, DateFromTicks, Time, TimeFromTicks, Timestamp, TimestampFromTicks,
+    BINARY, Interval, tuple_row, list_row, dict_row, namedtuple_row,
+    READ_BUFFER_SIZE)
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
@@ -42,7 +44,10 @@ __author__ = "Mathieu Fenniak"
 def connect(
         user=None, host='localhost', unix_sock=None, port=5432, database=None,
         password=None, ssl=False, timeout=None,
-        application_name=None, **kwargs):
+        application_name=None, max_prepared_statements=100, fetch_size=100,
+        row_factory=tuple_row, prepare_threshold=0, tcp_nodelay=True,
+        tcp_keepalive=False, socket_rcvbuf=None, socket_sndbuf=None,
+        read_buffer_size=READ_BUFFER_SIZE, **kwargs):
     """Creates a connection to a PostgreSQL database.
 
     This function is part of the `DBAPI 2.0 specification
@@ -103,12 +108,66 @@ def connect(
         connection to the database will time out. The default is ``None`` which
         means no timeout.
 
+    :keyword max_prepared_statements:
+        The maximum number of prepared statements the connection keeps on the
+        server. When the limit is reached, the least recently used statement
+        is closed. The default is ``100``. See
+        :attr:`Connection.statement_cache`.
+
+    :keyword fetch_size:
+        The number of rows that cursors fetch from the server at a time, unless
+        their :attr:`~Cursor.fetch_size` is changed. The value ``0`` means
+        fetch all the rows at once. The default is ``100``.
+
+    :keyword row_factory:
+        How the rows of results are made, unless a cursor's
+        :attr:`~Cursor.row_factory` is changed. The default is
+        :func:`tuple_row`, which makes each row a tuple. The others are
+        :func:`list_row`, :func:`dict_row` and :func:`namedtuple_row`.
+
+    :keyword prepare_threshold:
+        The number of times a statement is run with the unnamed statement
+        before it's prepared as a named statement and kept in the
+        :attr:`~Connection.statement_cache`. The default of ``0`` prepares
+        every statement the first time it's run, and ``None`` means that
+        statements are never prepared. See
+        :attr:`Connection.prepare_threshold`.
+
+    :keyword tcp_nodelay:
+        If ``True``, the ``TCP_NODELAY`` option is set on the socket, so that
+        messages are sent straight away rather than being held back by Nagle's
+        algorithm. The default is ``True``. Only used for TCP/IP connections.
+
+    :keyword tcp_keepalive:
+        If ``True``, the ``SO_KEEPALIVE`` option is set on the socket, so that
+        the operating system sends keepalive probes on an idle connection. The
+        default is ``False``. Only used for TCP/IP connections.
+
+    :keyword socket_rcvbuf:
+        The size in bytes of the socket's receive buffer, set with the
+        ``SO_RCVBUF`` option before connecting. A bigger buffer allows a
+        bigger TCP window, which can speed up receiving large results over a
+        link with a high latency. The default is ``None``, which leaves the
+        size to the operating system.
+
+    :keyword socket_sndbuf:
+        The size in bytes of the socket's send buffer, set with the
+        ``SO_SNDBUF`` option. The default is ``None``, which leaves the size
+        to the operating system.
+
+    :keyword read_buffer_size:
+        The size in bytes of the buffer that messages from the server are read
+        into. A bigger buffer means fewer reads from the socket for large
+        results. The default is ``65536``.
+
     :rtype:
         A :class:`Connection` object.
     """
     return Connection(
         user, host, unix_sock, port, database, password, ssl,
-        timeout, application_name)
+        timeout, application_name, max_prepared_statements, fetch_size,
+        row_factory, prepare_threshold, tcp_nodelay, tcp_keepalive,
+        socket_rcvbuf, socket_sndbuf, read_buffer_size)
 
 apilevel = "2.0"
 """The DBAPI level supported, currently "2.0".
@@ -172,8 +231,9 @@ __all__ = [
     ProgrammingError, Error, OperationalError, IntegrityError, InternalError,
     NotSupportedError, ArrayContentNotHomogenousError, ArrayContentEmptyError,
     ArrayDimensionsNotConsistentError, ArrayContentNotSupportedError, utc,
-    Connection, Cursor, Binary, Date, DateFromTicks, Time, TimeFromTicks,
-    Timestamp, TimestampFromTicks, BINARY, Interval]
+    Connection, Cursor, Pipeline, PreparedStatement, StatementCache, Binary,
+    Date, DateFromTicks, Time, TimeFromTicks, Timestamp, TimestampFromTicks,
+    BINARY, Interval, tuple_row, list_row, dict_row, namedtuple_row]
 
 """Version string for pg8000.
 
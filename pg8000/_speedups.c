@@ -0,0 +1,448 @@
+/*
+ * Optional C versions of the hot parts of pg8000.core: the loop that decodes
+ * the values of a DataRow message, and the receive functions of the common
+ * binary types. pg8000 works without this module, falling back to the pure
+ * Python code, and the two must always give the same values.
+ *
+ * Each column has a kind, worked out in Python from its receive function.
+ * Columns of kind CALL, and columns whose data isn't the expected width, are
+ * decoded by calling the receive function in the same way as the pure Python
+ * code does.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <datetime.h>
+#include <stdint.h>
+
+enum {
+    KIND_CALL = 0,
+    KIND_BOOL,
+    KIND_INT2,
+    KIND_INT4,
+    KIND_INT8,
+    KIND_FLOAT4,
+    KIND_FLOAT8,
+    KIND_OID,
+    KIND_TEXT,
+    KIND_BYTEA,
+    KIND_DATE,
+    KIND_TIMESTAMP,
+    KIND_TIMESTAMPTZ,
+    KIND_INTERVAL
+};
+
+/* The ordinal of 2000-01-01, the PostgreSQL epoch, and of 1970-01-01. */
+#define EPOCH_DATE_ORDINAL 730120
+#define UNIX_EPOCH_ORDINAL 719163
+#define MAX_DATE_ORDINAL 3652059
+#define USECS_PER_DAY INT64_C(86400000000)
+
+/* Set by init() */
+static PyObject *utc = NULL;
+static PyObject *interval_type = NULL;
+
+#if PY_VERSION_HEX >= 0x030B0000
+#define unpack_float4(p) PyFloat_Unpack4((const char *)(p), 0)
+#define unpack_float8(p) PyFloat_Unpack8((const char *)(p), 0)
+#else
+#define unpack_float4(p) _PyFloat_Unpack4((const unsigned char *)(p), 0)
+#define unpack_float8(p) _PyFloat_Unpack8((const unsigned char *)(p), 0)
+#endif
+
+static uint16_t
+read_uint16(const unsigned char *p)
+{
+    return (uint16_t)((p[0] << 8) | p[1]);
+}
+
+static uint32_t
+read_uint32(const unsigned char *p)
+{
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) |
+        ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+}
+
+static uint64_t
+read_uint64(const unsigned char *p)
+{
+    return ((uint64_t)read_uint32(p) << 32) | read_uint32(p + 4);
+}
+
+static int64_t
+floor_div(int64_t a, int64_t b)
+{
+    int64_t q = a / b;
+    if ((a % b != 0) && ((a < 0) != (b < 0)))
+        q--;
+    return q;
+}
+
+/* Converts a proleptic Gregorian ordinal, as used by date.toordinal(), to a
+ * year, month and day. */
+static void
+ordinal_to_ymd(int64_t ordinal, int *year, int *month, int *day)
+{
+    int64_t z = ordinal - UNIX_EPOCH_ORDINAL + 719468;
+    int64_t era = floor_div(z, 146097);
+    int64_t doe = z - era * 146097;
+    int64_t yoe = (doe - doe / 1460 + doe / 36524 - doe / 146096) / 365;
+    int64_t doy = doe - (365 * yoe + yoe / 4 - yoe / 100);
+    int64_t mp = (5 * doy + 2) / 153;
+    int64_t m = mp < 10 ? mp + 3 : mp - 9;
+
+    *day = (int)(doy - (153 * mp + 2) / 5 + 1);
+    *month = (int)m;
+    *year = (int)(yoe + era * 400 + (m <= 2));
+}
+
+static PyObject *
+date_recv(const unsigned char *p)
+{
+    int32_t days = (int32_t)read_uint32(p);
+    int64_t ordinal;
+    int year, month, day;
+
+    if (days == INT32_MAX)
+        return PyDate_FromDate(9999, 12, 31);
+    else if (days == INT32_MIN)
+        return PyDate_FromDate(1, 1, 1);
+
+    ordinal = (int64_t)days + EPOCH_DATE_ORDINAL;
+    if (ordinal < 1 || ordinal > MAX_DATE_ORDINAL) {
+        PyErr_Format(
+            PyExc_ValueError, "ordinal must be in 1..%d", MAX_DATE_ORDINAL);
+        return NULL;
+    }
+    ordinal_to_ymd(ordinal, &year, &month, &day);
+    return PyDate_FromDate(year, month, day);
+}
+
+static PyObject *
+timestamp_recv(const unsigned char *p, PyObject *tz)
+{
+    int64_t micros = (int64_t)read_uint64(p);
+    int64_t days, rem, ordinal;
+    int year, month, day;
+
+    if (micros == INT64_MAX)
+        return PyDateTimeAPI->DateTime_FromDateAndTime(
+            9999, 12, 31, 23, 59, 59, 999999, tz, PyDateTimeAPI->DateTimeType);
+    else if (micros == INT64_MIN)
+        return PyDateTimeAPI->DateTime_FromDateAndTime(
+            1, 1, 1, 0, 0, 0, 0, tz, PyDateTimeAPI->DateTimeType);
+
+    days = floor_div(micros, USECS_PER_DAY);
+    rem = micros - days * USECS_PER_DAY;
+    ordinal = days + EPOCH_DATE_ORDINAL;
+    if (ordinal < 1 || ordinal > MAX_DATE_ORDINAL) {
+        PyErr_SetString(PyExc_OverflowError, "date value out of range");
+        return NULL;
+    }
+    ordinal_to_ymd(ordinal, &year, &month, &day);
+    return PyDateTimeAPI->DateTime_FromDateAndTime(
+        year, month, day, (int)(rem / INT64_C(3600000000)),
+        (int)(rem / 60000000 % 60), (int)(rem / 1000000 % 60),
+        (int)(rem % 1000000), tz, PyDateTimeAPI->DateTimeType);
+}
+
+static PyObject *
+interval_recv(const unsigned char *p)
+{
+    int64_t micros = (int64_t)read_uint64(p);
+    int32_t days = (int32_t)read_uint32(p + 8);
+    int32_t months = (int32_t)read_uint32(p + 12);
+    int64_t seconds, total_days;
+
+    if (months != 0)
+        return PyObject_CallFunction(
+            interval_type, "Lii", (long long)micros, (int)days, (int)months);
+
+    seconds = floor_div(micros, 1000000);
+    micros -= seconds * 1000000;
+    total_days = days + floor_div(seconds, 86400);
+    seconds -= floor_div(seconds, 86400) * 86400;
+    if (total_days > 999999999 || total_days < -999999999) {
+        PyErr_Format(
+            PyExc_OverflowError,
+            "days=%lld; must have magnitude <= 999999999",
+            (long long)total_days);
+        return NULL;
+    }
+    return PyDelta_FromDSU((int)total_days, (int)seconds, (int)micros);
+}
+
+/* Decodes one value that isn't NULL. The receive function is only used if
+ * the value can't be decoded here. */
+static PyObject *
+decode_value(
+        int kind, const unsigned char *p, Py_ssize_t len, PyObject *func,
+        PyObject *data, Py_ssize_t offset, const char *encoding)
+{
+    switch (kind) {
+    case KIND_BOOL:
+        if (len == 1)
+            return PyBool_FromLong(p[0] == 1);
+        break;
+    case KIND_INT2:
+        if (len == 2)
+            return PyLong_FromLong((int16_t)read_uint16(p));
+        break;
+    case KIND_INT4:
+        if (len == 4)
+            return PyLong_FromLong((int32_t)read_uint32(p));
+        break;
+    case KIND_INT8:
+        if (len == 8)
+            return PyLong_FromLongLong((int64_t)read_uint64(p));
+        break;
+    case KIND_FLOAT4:
+        if (len == 4) {
+            double v = unpack_float4(p);
+            if (v == -1.0 && PyErr_Occurred())
+                return NULL;
+            return PyFloat_FromDouble(v);
+        }
+        break;
+    case KIND_FLOAT8:
+        if (len == 8) {
+            double v = unpack_float8(p);
+            if (v == -1.0 && PyErr_Occurred())
+                return NULL;
+            return PyFloat_FromDouble(v);
+        }
+        break;
+    case KIND_OID:
+        if (len == 4)
+            return PyLong_FromUnsignedLong(read_uint32(p));
+        break;
+    case KIND_TEXT:
+        return PyUnicode_Decode((const char *)p, len, encoding, NULL);
+    case KIND_BYTEA:
+        return PyBytes_FromStringAndSize((const char *)p, len);
+    case KIND_DATE:
+        if (len == 4)
+            return date_recv(p);
+        break;
+    case KIND_TIMESTAMP:
+        if (len == 8)
+            return timestamp_recv(p, Py_None);
+        break;
+    case KIND_TIMESTAMPTZ:
+        if (len == 8 && utc != NULL)
+            return timestamp_recv(p, utc);
+        break;
+    case KIND_INTERVAL:
+        if (len == 16 && interval_type != NULL)
+            return interval_recv(p);
+        break;
+    }
+    return PyObject_CallFunction(func, "Onn", data, offset, len);
+}
+
+/* Reads the length of the next value, checking that the value is within the
+ * buffer. */
+static int
+read_length(const Py_buffer *view, Py_ssize_t pos, Py_ssize_t *len)
+{
+    int32_t vlen;
+
+    if (pos + 4 > view->len) {
+        PyErr_SetString(PyExc_ValueError, "message is too short");
+        return -1;
+    }
+    vlen = (int32_t)read_uint32((const unsigned char *)view->buf + pos);
+    if (vlen < -1 || pos + 4 + vlen > view->len) {
+        PyErr_SetString(PyExc_ValueError, "value length is out of range");
+        return -1;
+    }
+    *len = vlen;
+    return 0;
+}
+
+/* Decodes values that are each preceded by their length, from offset up to
+ * end, or until count values have been decoded. Returns a new list, or a new
+ * tuple if as_tuple is set and count is known, or NULL on error. */
+static PyObject *
+decode_values(
+        PyObject *data, Py_ssize_t offset, Py_ssize_t end, Py_ssize_t count,
+        PyObject *kinds, PyObject *funcs, const char *encoding, int as_tuple)
+{
+    Py_buffer view;
+    PyObject *values, *value;
+    Py_ssize_t pos, len, i;
+    const unsigned char *buf;
+    int kind;
+
+    if (PyObject_GetBuffer(data, &view, PyBUF_SIMPLE) < 0)
+        return NULL;
+    buf = (const unsigned char *)view.buf;
+    if (end > view.len)
+        end = view.len;
+
+    as_tuple = as_tuple && count >= 0;
+    if (as_tuple)
+        values = PyTuple_New(count);
+    else
+        values = PyList_New(count < 0 ? 0 : count);
+    if (values == NULL)
+        goto error;
+
+    pos = offset;
+    for (i = 0; count < 0 ? pos < end : i < count; i++) {
+        if (read_length(&view, pos, &len) < 0)
+            goto error;
+        pos += 4;
+        if (len == -1) {
+            Py_INCREF(Py_None);
+            value = Py_None;
+        } else {
+            if (PyTuple_Check(kinds)) {
+                kind = (int)PyLong_AsLong(PyTuple_GET_ITEM(kinds, i));
+                value = decode_value(
+                    kind, buf + pos, len, PyTuple_GET_ITEM(funcs, i), data,
+                    pos, encoding);
+            } else {
+                kind = (int)PyLong_AsLong(kinds);
+                value = decode_value(
+                    kind, buf + pos, len, funcs, data, pos, encoding);
+            }
+            if (value == NULL)
+                goto error;
+            pos += len;
+        }
+        if (as_tuple) {
+            PyTuple_SET_ITEM(values, i, value);
+        } else if (count >= 0) {
+            PyList_SET_ITEM(values, i, value);
+        } else {
+            if (PyList_Append(values, value) < 0) {
+                Py_DECREF(value);
+                goto error;
+            }
+            Py_DECREF(value);
+        }
+    }
+    PyBuffer_Release(&view);
+    return values;
+
+error:
+    Py_XDECREF(values);
+    PyBuffer_Release(&view);
+    return NULL;
+}
+
+PyDoc_STRVAR(decode_row_doc,
+"decode_row(data, kinds, funcs, encoding, as_tuple=False)\n\n"
+"Decodes the contents of a DataRow message into a list, or a tuple if\n"
+"as_tuple is true. kinds and funcs are tuples with the kind and the receive\n"
+"function of each column.");
+
+static PyObject *
+decode_row(PyObject *self, PyObject *args)
+{
+    PyObject *data, *kinds, *funcs;
+    const char *encoding;
+    int as_tuple = 0;
+
+    if (!PyArg_ParseTuple(
+            args, "OO!O!s|p:decode_row", &data, &PyTuple_Type, &kinds,
+            &PyTuple_Type, &funcs, &encoding, &as_tuple))
+        return NULL;
+    if (PyTuple_GET_SIZE(kinds) != PyTuple_GET_SIZE(funcs)) {
+        PyErr_SetString(
+            PyExc_ValueError, "kinds and funcs must be the same length");
+        return NULL;
+    }
+    return decode_values(
+        data, 2, PY_SSIZE_T_MAX, PyTuple_GET_SIZE(funcs), kinds, funcs,
+        encoding, as_tuple);
+}
+
+PyDoc_STRVAR(array_values_doc,
+"array_values(data, offset, end, kind, func, encoding)\n\n"
+"Decodes the elements of a binary array, from offset up to end, into a\n"
+"flat list.");
+
+static PyObject *
+array_values(PyObject *self, PyObject *args)
+{
+    PyObject *data, *kind, *func;
+    Py_ssize_t offset, end;
+    const char *encoding;
+
+    if (!PyArg_ParseTuple(
+            args, "OnnO!Os:array_values", &data, &offset, &end,
+            &PyLong_Type, &kind, &func, &encoding))
+        return NULL;
+    return decode_values(data, offset, end, -1, kind, func, encoding, 0);
+}
+
+PyDoc_STRVAR(init_doc,
+"init(utc, interval_type)\n\n"
+"Sets the tzinfo of timestamptz values, and the class of intervals that\n"
+"have months.");
+
+static PyObject *
+init(PyObject *self, PyObject *args)
+{
+    PyObject *new_utc, *new_interval_type;
+
+    if (!PyArg_ParseTuple(args, "OO:init", &new_utc, &new_interval_type))
+        return NULL;
+    Py_INCREF(new_utc);
+    Py_XSETREF(utc, new_utc);
+    Py_INCREF(new_interval_type);
+    Py_XSETREF(interval_type, new_interval_type);
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef speedups_methods[] = {
+    {"decode_row", decode_row, METH_VARARGS, decode_row_doc},
+    {"array_values", array_values, METH_VARARGS, array_values_doc},
+    {"init", init, METH_VARARGS, init_doc},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "pg8000._speedups",
+    "C versions of the DataRow loop and the common binary receive "
+    "functions.",
+    -1,
+    speedups_methods
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    PyObject *m;
+
+    PyDateTime_IMPORT;
+    if (PyDateTimeAPI == NULL)
+        return NULL;
+
+    m = PyModule_Create(&speedups_module);
+    if (m == NULL)
+        return NULL;
+
+    if (PyModule_AddIntConstant(m, "CALL", KIND_CALL) < 0 ||
+            PyModule_AddIntConstant(m, "BOOL", KIND_BOOL) < 0 ||
+            PyModule_AddIntConstant(m, "INT2", KIND_INT2) < 0 ||
+            PyModule_AddIntConstant(m, "INT4", KIND_INT4) < 0 ||
+            PyModule_AddIntConstant(m, "INT8", KIND_INT8) < 0 ||
+            PyModule_AddIntConstant(m, "FLOAT4", KIND_FLOAT4) < 0 ||
+            PyModule_AddIntConstant(m, "FLOAT8", KIND_FLOAT8) < 0 ||
+            PyModule_AddIntConstant(m, "OID", KIND_OID) < 0 ||
+            PyModule_AddIntConstant(m, "TEXT", KIND_TEXT) < 0 ||
+            PyModule_AddIntConstant(m, "BYTEA", KIND_BYTEA) < 0 ||
+            PyModule_AddIntConstant(m, "DATE", KIND_DATE) < 0 ||
+            PyModule_AddIntConstant(m, "TIMESTAMP", KIND_TIMESTAMP) < 0 ||
+            PyModule_AddIntConstant(
+                m, "TIMESTAMPTZ", KIND_TIMESTAMPTZ) < 0 ||
+            PyModule_AddIntConstant(m, "INTERVAL", KIND_INTERVAL) < 0) {
+        Py_DECREF(m);
+        return NULL;
+    }
+    return m;
+}
@@ -0,0 +1,476 @@
+"""asyncio support for pg8000.
+
+The :func:`connect` coroutine returns a :class:`Connection` that talks to the
+server over asyncio streams instead of a blocking socket. The protocol handling
+and the type conversions are shared with :class:`pg8000.Connection`; only the
+reading and writing is different, so that a single event loop can drive many
+connections at once::
+
+    conn = await pg8000.aio.connect(user="postgres", password="C.P.Snow")
+    cursor = conn.cursor()
+    await cursor.execute("SELECT generate_series(1, 1000)")
+    async for row in cursor:
+        print(row)
+    await conn.close()
+
+This module requires Python 3.5 or later.
+"""
+
+import asyncio
+
+from pg8000 import core
+from pg8000.core import (
+    Error, InterfaceError, NotSupportedError, OperationalError,
+    ProgrammingError,
+    ci_unpack, ii_pack, CLOSE, ERROR_RESPONSE, PORTAL, READY_FOR_QUERY,
+    SYNC_MSG, TERMINATE_MSG, CANCEL_TIMEOUT, READ_BUFFER_SIZE,
+    set_socket_options, tuple_row)
+
+
+async def connect(
+        user=None, host='localhost', unix_sock=None, port=5432, database=None,
+        password=None, ssl=False, timeout=None, application_name=None,
+        max_prepared_statements=100, fetch_size=100, row_factory=tuple_row,
+        prepare_threshold=0, tcp_nodelay=True, tcp_keepalive=False,
+        socket_rcvbuf=None, socket_sndbuf=None,
+        read_buffer_size=READ_BUFFER_SIZE):
+    """Creates a connection to a PostgreSQL database. This is a coroutine.
+
+    The arguments are the same as for :func:`pg8000.connect`. The ``timeout``
+    applies to opening the connection. The socket options are set once the
+    connection is open, and the ``read_buffer_size`` is the limit of the
+    stream reader's buffer.
+
+    :rtype:
+        A :class:`pg8000.aio.Connection` object.
+    """
+    conn = Connection(
+        user, password, max_prepared_statements, fetch_size, row_factory,
+        prepare_threshold)
+    await conn._connect(
+        host, unix_sock, port, database, ssl, timeout, application_name,
+        tcp_nodelay, tcp_keepalive, socket_rcvbuf, socket_sndbuf,
+        read_buffer_size)
+    return conn
+
+
+class StatementTimeout(object):
+    # Cancels the statement that a connection is running if it's still
+    # running after a timeout. The cancel request is sent by a task that's
+    # waited for once the statement has finished, so a late request can't
+    # cancel a statement that's run afterwards.
+    def __init__(self, connection, timeout):
+        self._c = connection
+        self._timeout = timeout
+        self._handle = self._task = None
+
+    async def __aenter__(self):
+        if self._timeout is not None:
+            self._handle = asyncio.get_event_loop().call_later(
+                self._timeout, self._cancel)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self._handle is not None:
+            self._handle.cancel()
+        if self._task is not None:
+            try:
+                await self._task
+            except Error:
+                pass
+
+    def _cancel(self):
+        self._task = asyncio.ensure_future(self._c.cancel())
+
+
+class Cursor(core.Cursor):
+    """An asyncio cursor is returned by the :meth:`Connection.cursor` method of
+    an asyncio connection. It has the same attributes as
+    :class:`pg8000.Cursor`, but the methods that talk to the server are
+    coroutines, and the rows are retrieved with ``async for`` rather than a
+    plain ``for`` loop.
+    """
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    async def execute(
+            self, operation, args=None, stream=None, prepare=None,
+            timeout=None):
+        """Executes a database operation. This is a coroutine.
+
+        The arguments are the same as for :meth:`pg8000.Cursor.execute`.
+        """
+        try:
+            async with self._c._lock, StatementTimeout(self._c, timeout):
+                self.stream = stream
+
+                if not self._c.in_transaction and not self._c.autocommit:
+                    await self._c.execute(self, "begin transaction", None)
+                await self._c.execute(self, operation, args, prepare)
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+
+    async def executemany(self, operation, param_sets):
+        """Executes a database operation against all the parameter sequences or
+        mappings provided. This is a coroutine.
+        """
+        rowcounts = []
+        for parameters in param_sets:
+            await self.execute(operation, parameters)
+            rowcounts.append(self._row_count)
+
+        self._row_count = -1 if -1 in rowcounts else sum(rowcounts)
+
+    def copy_rows(self, table, columns, rows):
+        raise NotSupportedError(
+            "copy_rows() isn't supported on asyncio connections.")
+
+    def copy_out_rows(self, query):
+        raise NotSupportedError(
+            "copy_out_rows() isn't supported on asyncio connections.")
+
+    def fetch_columns(self):
+        raise NotSupportedError(
+            "fetch_columns() isn't supported on asyncio connections.")
+
+    def fetch_numpy(self):
+        raise NotSupportedError(
+            "fetch_numpy() isn't supported on asyncio connections.")
+
+    def fetch_arrow_batches(self, batch_size=65536):
+        raise NotSupportedError(
+            "fetch_arrow_batches() isn't supported on asyncio connections.")
+
+    async def fetchone(self):
+        """Fetch the next row of a query result set. This is a coroutine.
+
+        :returns:
+            A row as a sequence of field values, or ``None`` if no more rows
+            are available.
+        """
+        try:
+            return await self.__anext__()
+        except StopAsyncIteration:
+            return None
+        except TypeError:
+            raise ProgrammingError("attempting to use unexecuted cursor")
+        except AttributeError:
+            raise ProgrammingError("attempting to use unexecuted cursor")
+
+    async def fetchmany(self, num=None):
+        """Fetches the next set of rows of a query result. This is a
+        coroutine.
+
+        :param size:
+
+            The number of rows to fetch when called.  If not provided, the
+            :attr:`arraysize` attribute value is used instead.
+        """
+        rows = []
+        for i in range(self.arraysize if num is None else num):
+            row = await self.fetchone()
+            if row is None:
+                break
+            rows.append(row)
+        return tuple(rows)
+
+    async def fetchall(self):
+        """Fetches all remaining rows of a query result. This is a coroutine.
+        """
+        rows = []
+        while True:
+            row = await self.fetchone()
+            if row is None:
+                return tuple(rows)
+            rows.append(row)
+
+    def __iter__(self):
+        raise InterfaceError(
+            "An asyncio cursor must be iterated over with 'async for'.")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return self._cached_rows.popleft()
+        except IndexError:
+            if self.portal_suspended:
+                async with self._c._lock:
+                    await self._c._fetch_more(self)
+            try:
+                return self._cached_rows.popleft()
+            except IndexError:
+                if self.ps is None:
+                    raise ProgrammingError("A query hasn't been issued.")
+                elif len(self.ps['row_desc']) == 0:
+                    raise ProgrammingError("no result set")
+                else:
+                    raise StopAsyncIteration()
+
+
+class Connection(core.Connection):
+    """An asyncio connection is returned by the :func:`pg8000.aio.connect`
+    coroutine. It has the same attributes as :class:`pg8000.Connection`, but
+    the methods that talk to the server are coroutines.
+
+    Two-phase commit and pipelines aren't supported on asyncio connections.
+    """
+
+    def __init__(
+            self, user, password, max_prepared_statements=100,
+            fetch_size=100, row_factory=tuple_row, prepare_threshold=0):
+        self._setup(
+            user, password, max_prepared_statements, fetch_size, row_factory,
+            prepare_threshold)
+        self._lock = asyncio.Lock()
+        self._reader = self._writer = self._sock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _connect(
+            self, host, unix_sock, port, database, ssl, timeout,
+            application_name, tcp_nodelay=True, tcp_keepalive=False,
+            socket_rcvbuf=None, socket_sndbuf=None,
+            read_buffer_size=READ_BUFFER_SIZE):
+        # The address is kept for the side connections of cancel().
+        self._host, self._port, self._unix_sock = host, port, unix_sock
+        if unix_sock is None and host is not None:
+            opening = asyncio.open_connection(
+                host, port, limit=read_buffer_size)
+        elif unix_sock is not None:
+            opening = asyncio.open_unix_connection(
+                unix_sock, limit=read_buffer_size)
+        else:
+            raise ProgrammingError("one of host or unix_sock must be provided")
+
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                opening, timeout)
+            set_socket_options(
+                self._writer.get_extra_info('socket'), unix_sock is None,
+                tcp_nodelay, tcp_keepalive, socket_rcvbuf, socket_sndbuf)
+
+            if ssl:
+                try:
+                    import ssl as sslmodule
+                except ImportError:
+                    raise InterfaceError(
+                        "SSL required but ssl module not available in "
+                        "this python installation")
+                if not hasattr(self._writer, 'start_tls'):
+                    raise InterfaceError(
+                        "SSL with pg8000.aio needs Python 3.11 or later")
+
+                # Int32(8) - Message length, including self.
+                # Int32(80877103) - The SSL request code.
+                self._writer.write(ii_pack(8, 80877103))
+                await self._writer.drain()
+                resp = await self._reader.readexactly(1)
+                if resp != b'S':
+                    raise InterfaceError("Server refuses SSL")
+                context = sslmodule.create_default_context()
+                context.check_hostname = False
+                context.verify_mode = sslmodule.CERT_NONE
+                await self._writer.start_tls(context)
+        except (OSError, asyncio.TimeoutError, EOFError) as e:
+            if self._writer is not None:
+                self._writer.close()
+            raise InterfaceError("communication error", e)
+        self._sock = self._writer
+
+        self._write(self._startup_message(database, application_name))
+
+        self._cursor = self.cursor()
+        async with self._lock:
+            try:
+                code = self.error = None
+                await self._writer.drain()
+                while code not in (READY_FOR_QUERY, ERROR_RESPONSE):
+                    code, data_len = ci_unpack(
+                        await self._reader.readexactly(5))
+                    self.message_types[code](
+                        await self._reader.readexactly(data_len - 4), None)
+                    # The authentication handler may have written a reply.
+                    await self._writer.drain()
+                if self.error is not None:
+                    raise self.error
+            except Exception as e:
+                try:
+                    self._close()
+                except Exception:
+                    pass
+                raise e
+
+    # Writes go straight into the transport's buffer, and the transport is
+    # drained before waiting for a response, so there's nothing to flush.
+    def _write(self, data):
+        self._writer.write(data)
+
+    def _flush(self):
+        pass
+
+    def cursor(self, name=None):
+        """Creates a :class:`pg8000.aio.Cursor` object bound to this
+        connection. Named cursors aren't supported.
+        """
+        if name is not None:
+            raise NotSupportedError(
+                "Named cursors aren't supported on asyncio connections.")
+        return Cursor(self)
+
+    async def commit(self):
+        """Commits the current database transaction. This is a coroutine.
+        """
+        async with self._lock:
+            await self.execute(self._cursor, "commit", None)
+
+    async def rollback(self):
+        """Rolls back the current database transaction. This is a coroutine.
+        """
+        async with self._lock:
+            if not self.in_transaction:
+                return
+            await self.execute(self._cursor, "rollback", None)
+
+    def _close(self):
+        if self._writer is None:
+            raise InterfaceError("connection is closed")
+        try:
+            # Byte1('X') - Identifies the message as a terminate message.
+            # Int32(4) - Message length, including self.
+            self._writer.write(TERMINATE_MSG)
+            self._writer.close()
+        finally:
+            self._writer = None
+            self._sock = None
+
+    async def close(self):
+        """Closes the database connection. This is a coroutine.
+        """
+        async with self._lock:
+            writer = self._writer
+            self._close()
+        try:
+            await writer.wait_closed()
+        except (AttributeError, OSError):
+            pass
+
+    async def cancel(self):
+        """Asks the server to cancel the statement that the connection is
+        running. This is a coroutine. As with
+        :meth:`pg8000.Connection.cancel`, the request is sent over a separate
+        connection and the connection's lock isn't taken.
+        """
+        request = self._cancel_request()
+        try:
+            await asyncio.wait_for(self._send_cancel(request), CANCEL_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise OperationalError(str(e))
+
+    async def _send_cancel(self, request):
+        if self._unix_sock is None:
+            reader, writer = await asyncio.open_connection(
+                self._host, self._port)
+        else:
+            reader, writer = await asyncio.open_unix_connection(
+                self._unix_sock)
+        try:
+            writer.write(request)
+            # The server closes the connection once it's handled the request,
+            # without replying.
+            await reader.read(1)
+        finally:
+            writer.close()
+
+    async def execute(self, cursor, operation, vals, prepare=None):
+        key, statement, params, args = self._lookup_statement(operation, vals)
+        if not self._use_unnamed(key, prepare):
+            try:
+                ps = self.statement_cache.get(key)
+                cursor.ps = ps
+            except KeyError:
+                ps = await self._parse(cursor, statement, params)
+                self.statement_cache.put(key, ps)
+            self._send_bind_execute(cursor, ps, args)
+        elif self.single_round_trip and key in self._result_types:
+            self._send_unnamed(cursor, key, statement, params, args)
+        else:
+            ps = await self._parse(cursor, statement, params, named=False)
+            self._remember_result_types(key, ps)
+            self._send_bind_execute(cursor, ps, args)
+
+        await self._handle_messages(cursor)
+        if cursor.portal_suspended:
+            self._suspended_portals += 1
+        else:
+            await self._close_portal(cursor)
+
+    async def _parse(self, cursor, statement, params, named=True):
+        ps = self._send_parse(statement, params, named)
+        cursor.ps = ps
+        self._write(SYNC_MSG)
+        await self._handle_messages(cursor)
+        self._complete_parse(ps, params)
+        return ps
+
+    async def _fetch_more(self, cursor):
+        self.send_EXECUTE(cursor)
+        self._write(SYNC_MSG)
+        await self._handle_messages(cursor)
+        if not cursor.portal_suspended:
+            self._suspended_portals -= 1
+            await self._close_portal(cursor)
+
+    async def _close_portal(self, cursor):
+        self._send_message(CLOSE, PORTAL + cursor.portal_name_bin)
+        self._write(SYNC_MSG)
+        await self._handle_messages(cursor)
+
+    async def _handle_messages(self, cursor):
+        code = self.error = None
+
+        try:
+            await self._writer.drain()
+            while code != READY_FOR_QUERY:
+                code, data_len = ci_unpack(await self._reader.readexactly(5))
+                self.message_types[code](
+                    await self._reader.readexactly(data_len - 4), cursor)
+        except asyncio.IncompleteReadError:
+            self.error = OperationalError("No data to read from socket")
+        except OSError as e:
+            self.error = OperationalError(str(e))
+        except Exception:
+            self._close()
+            raise
+
+        if self.error is not None:
+            raise self.error
+
+    def pipeline(self):
+        raise NotSupportedError(
+            "Pipelines aren't supported on asyncio connections.")
+
+    def prepare(self, operation):
+        raise NotSupportedError(
+            "Prepared statements aren't supported on asyncio connections.")
+
+    def _tpc_not_supported(self, *args, **kwargs):
+        raise NotSupportedError(
+            "Two-phase commit isn't supported on asyncio connections.")
+
+    tpc_begin = tpc_prepare = tpc_commit = tpc_rollback = tpc_recover = \
+        _tpc_not_supported
@@ -0,0 +1,396 @@
+"""Column-wise collection of query results, for
+:meth:`pg8000.Cursor.fetch_numpy` and
+:meth:`pg8000.Cursor.fetch_arrow_batches`.
+
+Rather than decoding each DataRow message into a row, the values of columns
+with a fixed-width binary type are copied as they are into a buffer per
+column, or for a result with only such columns into a single buffer of whole
+rows. NumPy then converts each buffer to an array in one go. The values of
+other columns are decoded as usual, and kept in a list.
+
+NumPy and PyArrow are only imported when the arrays are made, so this module
+can be imported without them.
+"""
+
+from collections import deque
+from struct import calcsize
+
+from pg8000.core import (
+    InterfaceError, NULL_BYTE, bool_send, date_recv, date_send, d_pack,
+    f_pack, h_pack, i_pack, i_unpack, q_pack, I_pack, timestamp_recv_integer,
+    timestamp_send_integer, timestamptz_recv_integer, timestamptz_send_integer)
+
+# The NumPy type of the big-endian values of each struct format character.
+NUMPY_FORMATS = {
+    '?': '?',
+    'h': '>i2',
+    'i': '>i4',
+    'q': '>i8',
+    'f': '>f4',
+    'd': '>f8',
+    'I': '>u4',
+}
+
+SEND_FUNCS = {
+    '?': bool_send,
+    'h': h_pack,
+    'i': i_pack,
+    'q': q_pack,
+    'f': f_pack,
+    'd': d_pack,
+    'I': I_pack,
+}
+
+# Timestamps and dates are kept as the number of microseconds or days since
+# 2000-01-01, and converted to datetime64 values when the arrays are made.
+TIMESTAMP = 'timestamp'
+TIMESTAMPTZ = 'timestamptz'
+DATE = 'date'
+
+# The microseconds and days from 1970-01-01, the epoch of datetime64, to
+# 2000-01-01.
+EPOCH_MICROSECONDS = 946684800000000
+EPOCH_DAYS = 10957
+
+
+# The Arrow type for each type oid, by the name of its function in pyarrow.
+# Columns of other types have their Arrow type inferred from their values,
+# apart from numeric, which is a decimal if it has a precision and otherwise a
+# string, as it may have any number of digits.
+ARROW_TYPES = {
+    16: ('bool_',),  # bool
+    17: ('binary',),  # bytea
+    19: ('string',),  # name
+    20: ('int64',),  # int8
+    21: ('int16',),  # int2
+    23: ('int32',),  # int4
+    25: ('string',),  # text
+    26: ('uint32',),  # oid
+    700: ('float32',),  # float4
+    701: ('float64',),  # float8
+    705: ('string',),  # unknown
+    1042: ('string',),  # char
+    1043: ('string',),  # varchar
+    1082: ('date32',),  # date
+    1114: ('timestamp', 'us'),  # timestamp
+    1184: ('timestamp', 'us', 'UTC'),  # timestamp w/ tz
+}
+
+
+NUMERIC = 1700
+
+
+class Column(object):
+    def __init__(self, name, type_oid, type_modifier, func, fmt, kind):
+        self.name = name
+        self.type_oid = type_oid
+        self.type_modifier = type_modifier
+        self.func = func
+
+        # The struct format character of a fixed-width column, else None
+        self.fmt = fmt
+
+        # TIMESTAMP, TIMESTAMPTZ, DATE or None
+        self.kind = kind
+
+        if fmt is None:
+            self.values = []
+        else:
+            self.width = calcsize('!' + fmt)
+            self.raw = bytearray()
+            self.null = NULL_BYTE * self.width
+            if kind == TIMESTAMP:
+                self.send = timestamp_send_integer
+            elif kind == TIMESTAMPTZ:
+                self.send = timestamptz_send_integer
+            elif kind == DATE:
+                self.send = date_send
+            else:
+                self.send = SEND_FUNCS[fmt]
+
+        # The numbers of the rows where the value is NULL
+        self.nulls = []
+
+
+class Columns(object):
+    """Collects the rows of a result a column at a time.
+
+    :param conn:
+        The :class:`pg8000.Connection` that the result is from.
+
+    :param row_desc:
+        The row description of the result.
+    """
+
+    def __init__(self, conn, row_desc):
+        self.encoding = conn._client_encoding
+        self.num_rows = 0
+        self.columns = []
+        for col in row_desc:
+            func = col['func']
+            kind = None
+            if func is timestamp_recv_integer:
+                fmt, kind = 'q', TIMESTAMP
+            elif func is timestamptz_recv_integer:
+                fmt, kind = 'q', TIMESTAMPTZ
+            elif func is date_recv:
+                fmt, kind = 'i', DATE
+            else:
+                fmt = conn.fixed_width_formats.get(func)
+            self.columns.append(
+                Column(
+                    col['name'], col['type_oid'], col['type_modifier'], func,
+                    fmt, kind))
+
+        # If all the columns have a fixed width, each row without a NULL has
+        # the same size, and the rows are kept together in one buffer.
+        if len(self.columns) > 0 and \
+                all(c.fmt is not None for c in self.columns):
+            self.row_size = 2 + sum(4 + c.width for c in self.columns)
+            self.rows = bytearray()
+        else:
+            self.row_size = None
+
+    def add(self, data):
+        """Adds the contents of a DataRow message."""
+        if self.row_size is not None:
+            if len(data) == self.row_size:
+                self.rows += data
+            else:
+                self._add_row_with_nulls(data)
+            self.num_rows += 1
+            return
+
+        idx = 2
+        for c in self.columns:
+            vlen = i_unpack(data, idx)[0]
+            idx += 4
+            if vlen == -1:
+                c.nulls.append(self.num_rows)
+                if c.fmt is None:
+                    c.values.append(None)
+                else:
+                    c.raw += c.null
+            else:
+                if c.fmt is None:
+                    c.values.append(c.func(data, idx, vlen))
+                else:
+                    c.raw += data[idx:idx + vlen]
+                idx += vlen
+        self.num_rows += 1
+
+    def _add_row_with_nulls(self, data):
+        # The NULLs are replaced with zeros, so that the row can go in the
+        # buffer with the others.
+        row = bytearray(data[:2])
+        idx = 2
+        for c in self.columns:
+            vlen = i_unpack(data, idx)[0]
+            if vlen == -1:
+                row += i_pack(c.width) + c.null
+                c.nulls.append(self.num_rows)
+                idx += 4
+            else:
+                row += data[idx:idx + 4 + vlen]
+                idx += 4 + vlen
+        self.rows += row
+
+    def add_row(self, row):
+        """Adds a row that's already been decoded. The values of the
+        fixed-width columns are encoded again.
+        """
+        if self.row_size is not None:
+            data = bytearray(h_pack(len(row)))
+            for c, v in zip(self.columns, row):
+                if v is None:
+                    data += i_pack(-1)
+                else:
+                    data += i_pack(c.width) + c.send(v)
+            self.add(data)
+            return
+
+        for c, v in zip(self.columns, row):
+            if v is None:
+                c.nulls.append(self.num_rows)
+            if c.fmt is None:
+                c.values.append(v)
+            elif v is None:
+                c.raw += c.null
+            else:
+                c.raw += c.send(v)
+        self.num_rows += 1
+
+    def _arrays(self, numpy):
+        # Returns a NumPy array and a mask of the NULLs for each column. The
+        # array is None for columns that aren't fixed-width.
+        if self.row_size is not None:
+            fields = [('count', '>i2')]
+            for i, c in enumerate(self.columns):
+                fields.append(('length%d' % i, '>i4'))
+                fields.append(('value%d' % i, NUMPY_FORMATS[c.fmt]))
+            table = numpy.frombuffer(self.rows, numpy.dtype(fields))
+
+        arrays = []
+        for i, c in enumerate(self.columns):
+            if c.fmt is None:
+                arr = None
+            elif self.row_size is None:
+                arr = self._convert(
+                    numpy, c, numpy.frombuffer(c.raw, NUMPY_FORMATS[c.fmt]))
+            else:
+                arr = self._convert(numpy, c, table['value%d' % i])
+
+            mask = numpy.zeros(self.num_rows, dtype=bool)
+            mask[c.nulls] = True
+            arrays.append((arr, mask))
+        return arrays
+
+    def to_numpy(self):
+        """Returns a list of NumPy masked arrays, one for each column, with
+        the NULLs masked.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise InterfaceError("fetch_numpy() needs NumPy to be installed")
+
+        arrays = []
+        for c, (arr, mask) in zip(self.columns, self._arrays(numpy)):
+            if arr is None:
+                arr = numpy.empty(self.num_rows, dtype=object)
+                for j, v in enumerate(c.values):
+                    arr[j] = v
+            arrays.append(numpy.ma.MaskedArray(arr, mask=mask))
+        return arrays
+
+    def arrow_types(self, pyarrow):
+        """Returns the Arrow type of each column, or None for a column whose
+        type is inferred from its values.
+        """
+        types = []
+        for c in self.columns:
+            if c.type_oid == NUMERIC:
+                if c.type_modifier == -1:
+                    types.append(pyarrow.string())
+                else:
+                    precision = (c.type_modifier - 4) >> 16
+                    scale = (c.type_modifier - 4) & 0xffff
+                    if precision > 38:
+                        types.append(pyarrow.decimal256(precision, scale))
+                    else:
+                        types.append(pyarrow.decimal128(precision, scale))
+            elif c.type_oid in ARROW_TYPES:
+                args = ARROW_TYPES[c.type_oid]
+                types.append(getattr(pyarrow, args[0])(*args[1:]))
+            else:
+                types.append(None)
+        return types
+
+    def to_arrow(self, types=None):
+        """Returns a ``pyarrow.RecordBatch`` of the rows. Infinite dates and
+        timestamps are null.
+
+        :param types:
+            The Arrow type of each column, as returned by
+            :meth:`arrow_types`, with None for a type that's to be inferred.
+        """
+        try:
+            import numpy
+            import pyarrow
+        except ImportError:
+            raise InterfaceError(
+                "fetch_arrow_batches() needs PyArrow and NumPy to be "
+                "installed")
+
+        if types is None:
+            types = self.arrow_types(pyarrow)
+        arrays = []
+        for c, arrow_type, (arr, mask) in zip(
+                self.columns, types, self._arrays(numpy)):
+            if arr is None:
+                values = c.values
+                if c.type_oid == NUMERIC and c.type_modifier == -1:
+                    values = [None if v is None else str(v) for v in values]
+                arrays.append(pyarrow.array(values, type=arrow_type))
+            else:
+                if c.kind is not None:
+                    mask |= numpy.isnat(arr)
+                arrays.append(
+                    pyarrow.array(arr, type=arrow_type, mask=mask))
+        names = [c.name.decode(self.encoding) for c in self.columns]
+        return pyarrow.RecordBatch.from_arrays(arrays, names=names)
+
+    def _convert(self, numpy, column, raw):
+        # Converts the big-endian values of a column to an array of the
+        # native type, with timestamps and dates as datetime64 values.
+        # Infinite timestamps and dates become NaT.
+        if column.kind is None:
+            return raw.astype(raw.dtype.newbyteorder('='))
+
+        values = raw.astype(numpy.int64)
+        if column.kind == DATE:
+            unit, offset, infinity = 'D', EPOCH_DAYS, 2 ** 31 - 1
+        else:
+            unit, offset, infinity = 'us', EPOCH_MICROSECONDS, 2 ** 63 - 1
+        infinite = (values == infinity) | (values == -infinity - 1)
+        values[~infinite] += offset
+        values[infinite] = numpy.iinfo(numpy.int64).min
+        return values.view('datetime64[' + unit + ']')
+
+
+class Batches(object):
+    """Collects rows into batches of a fixed number of rows.
+
+    :param conn:
+        The :class:`pg8000.Connection` that the result is from.
+
+    :param row_desc:
+        The row description of the result.
+
+    :param batch_size:
+        The number of rows in each batch.
+    """
+
+    def __init__(self, conn, row_desc, batch_size):
+        self._conn = conn
+        self._row_desc = row_desc
+        self.batch_size = batch_size
+
+        # The full batches, as Columns objects
+        self.full = deque()
+
+        # The batch being filled
+        self.current = Columns(conn, row_desc)
+
+        # The Arrow type of each column, which is None until it's known for
+        # columns whose type is inferred from the values of the first batch.
+        self._types = None
+
+    def to_arrow(self, columns):
+        """Returns a ``pyarrow.RecordBatch`` of a batch. Each batch has the
+        same schema.
+        """
+        batch = columns.to_arrow(self._types)
+        from pyarrow.types import is_null
+        types = batch.schema.types
+        if self._types is None:
+            self._types = [None] * len(types)
+        for i, t in enumerate(types):
+            if self._types[i] is None and not is_null(t):
+                self._types[i] = t
+        return batch
+
+    def _next_batch(self):
+        if self.current.num_rows == self.batch_size:
+            self.full.append(self.current)
+            self.current = Columns(self._conn, self._row_desc)
+
+    def add(self, data):
+        """Adds the contents of a DataRow message."""
+        self.current.add(data)
+        self._next_batch()
+
+    def add_row(self, row):
+        """Adds a row that's already been decoded."""
+        self.current.add_row(row)
+        self._next_batch()
@@ -7,8 +7,8 @@ import struct
 from struct import pack
 from hashlib import md5
 from decimal import Decimal
-from collections import deque, defaultdict, OrderedDict
-from itertools import count, islice
+from collections import deque, defaultdict, namedtuple, OrderedDict
+from itertools import groupby, islice
 from six.moves import map
 from six import (
     b, PY2, integer_types, next, text_type, u, binary_type, itervalues)
@@ -20,6 +20,12 @@ from struct import Struct
 import time
 import pg8000
 from json import loads
+import re
+
+try:
+    from pg8000 import _speedups
+except ImportError:
+    _speedups = None
 
 # Copyright (c) 2007-2009, Mathieu Fenniak
 # All rights reserved.
@@ -68,6 +74,36 @@ class UTC(datetime.tzinfo):
 utc = UTC()
 
 
+class FixedOffset(datetime.tzinfo):
+    # A time zone that's a fixed number of seconds east of UTC, for the
+    # values of the time with time zone type.
+
+    def __init__(self, seconds):
+        self._offset = timedelta(seconds=seconds)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def tzname(self, dt):
+        return None
+
+    def dst(self, dt):
+        return ZERO
+
+    def __repr__(self):
+        return "FixedOffset(%d)" % self._offset.total_seconds()
+
+FIXED_OFFSETS = {0: utc}
+
+
+def fixed_offset(seconds):
+    try:
+        return FIXED_OFFSETS[seconds]
+    except KeyError:
+        tz = FIXED_OFFSETS[seconds] = FixedOffset(seconds)
+        return tz
+
+
 class Interval(object):
     """An Interval represents a measurement of time.  In PostgreSQL, an
     interval is defined in the measure of months, days, and microseconds; as
@@ -165,9 +201,13 @@ iii_pack, iii_unpack = pack_funcs('iii')
 ii_pack, ii_unpack = pack_funcs('ii')
 qii_pack, qii_unpack = pack_funcs('qii')
 dii_pack, dii_unpack = pack_funcs('dii')
+qi_pack, qi_unpack = pack_funcs('qi')
+di_pack, di_unpack = pack_funcs('di')
 ihihih_pack, ihihih_unpack = pack_funcs('ihihih')
 ci_pack, ci_unpack = pack_funcs('ci')
 bh_pack, bh_unpack = pack_funcs('bh')
+hhHh_pack, hhHh_unpack = pack_funcs('hhHh')
+I_pack, I_unpack = pack_funcs('I')
 cccc_pack, cccc_unpack = pack_funcs('cccc')
 
 
@@ -419,174 +459,129 @@ BINARY_SPACE = b(" ")
 DDL_COMMANDS = b("ALTER"), b("CREATE")
 
 
-def convert_paramstyle(style, query):
-    # I don't see any way to avoid scanning the query string char by char,
-    # so we might as well take that careful approach and create a
-    # state-based scanner.  We'll use int variables for the state.
-    #  0 -- outside quoted string
-    #  1 -- inside single-quote string '...'
-    #  2 -- inside quoted identifier   "..."
-    #  3 -- inside escaped single-quote string, E'...'
-    #  4 -- inside parameter name eg. :name
-    OUTSIDE = 0
-    INSIDE_SQ = 1
-    INSIDE_QI = 2
-    INSIDE_ES = 3
-    INSIDE_PN = 4
-
-    in_quote_escape = False
-    in_param_escape = False
-    placeholders = []
-    output_query = []
-    param_idx = map(lambda x: "$" + str(x), count(1))
-    state = OUTSIDE
-    prev_c = None
-    for i, c in enumerate(query):
-        if i + 1 < len(query):
-            next_c = query[i + 1]
-        else:
-            next_c = None
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
 
-        if state == OUTSIDE:
-            if c == "'":
-                output_query.append(c)
-                if prev_c == 'E':
-                    state = INSIDE_ES
-                else:
-                    state = INSIDE_SQ
-            elif c == '"':
-                output_query.append(c)
-                state = INSIDE_QI
-            elif style == "qmark" and c == "?":
-                output_query.append(next(param_idx))
-            elif style == "numeric" and c == ":":
-                output_query.append("$")
-            elif style == "named" and c == ":":
-                state = INSIDE_PN
-                placeholders.append('')
-            elif style == "pyformat" and c == '%' and next_c == "(":
-                state = INSIDE_PN
-                placeholders.append('')
-            elif style in ("format", "pyformat") and c == "%":
-                style = "format"
-                if in_param_escape:
-                    in_param_escape = False
-                    output_query.append(c)
-                else:
-                    if next_c == "%":
-                        in_param_escape = True
-                    elif next_c == "s":
-                        state = INSIDE_PN
-                        output_query.append(next(param_idx))
-                    else:
-                        raise InterfaceError(
-                            "Only %s and %% are supported in the query.")
-            else:
-                output_query.append(c)
 
-        elif state == INSIDE_SQ:
-            if c == "'":
-                output_query.append(c)
-                if in_quote_escape:
-                    in_quote_escape = False
-                else:
-                    if next_c == "'":
-                        in_quote_escape = True
-                    else:
-                        state = OUTSIDE
-            elif style in ("pyformat", "format") and c == "%":
-                # hm... we're only going to support an escaped percent sign
-                if in_param_escape:
-                    in_param_escape = False
-                    output_query.append(c)
-                else:
-                    if next_c == "%":
-                        in_param_escape = True
-                    else:
-                        raise InterfaceError(
-                            "'%" + next_c + "' not supported in a quoted "
-                            "string within the query string")
-            else:
-                output_query.append(c)
-
-        elif state == INSIDE_QI:
-            if c == '"':
-                state = OUTSIDE
-                output_query.append(c)
-            elif style in ("pyformat", "format") and c == "%":
-                # hm... we're only going to support an escaped percent sign
-                if in_param_escape:
-                    in_param_escape = False
-                    output_query.append(c)
-                else:
-                    if next_c == "%":
-                        in_param_escape = True
-                    else:
-                        raise InterfaceError(
-                            "'%" + next_c + "' not supported in a quoted "
-                            "string within the query string")
-            else:
-                output_query.append(c)
-
-        elif state == INSIDE_ES:
-            if c == "'" and prev_c != "\\":
-                # check for escaped single-quote
-                output_query.append(c)
-                state = OUTSIDE
-            elif style in ("pyformat", "format") and c == "%":
-                # hm... we're only going to support an escaped percent sign
-                if in_param_escape:
-                    in_param_escape = False
-                    output_query.append(c)
-                else:
-                    if next_c == "%":
-                        in_param_escape = True
-                    else:
-                        raise InterfaceError(
-                            "'%" + next_c + "' not supported in a quoted "
-                            "string within the query string.")
-            else:
-                output_query.append(c)
+# The tokens of a query that convert_paramstyle() looks at for each paramstyle:
+# quoted strings and identifiers, in which placeholders aren't replaced, and
+# the placeholders. The text between the tokens is copied unchanged. A '::'
+# cast is a token of its own so that it isn't taken for a placeholder.
+QUOTED_TOKENS = r"E'(?:[^'\\]|\\.)*'?|'(?:[^']|'')*'?|\"[^\"]*\"?"
+PARAMSTYLE_TOKENS = dict(
+    (style, re.compile(QUOTED_TOKENS + '|' + tokens, re.DOTALL | re.UNICODE))
+    for style, tokens in (
+        ('qmark', r"\?"),
+        ('numeric', r"::|:(?=\d)"),
+        ('named', r"::|:(\w+)"),
+        ('format', r"%.?"),
+        ('pyformat', r"%\(([^()]*)\)s|%.?")))
+QUOTED_PERCENT = re.compile(r"%(.?)", re.DOTALL)
 
-        elif state == INSIDE_PN:
-            if style == 'named':
-                placeholders[-1] += c
-                if next_c is None or (not next_c.isalnum() and next_c != '_'):
-                    state = OUTSIDE
-                    try:
-                        pidx = placeholders.index(placeholders[-1], 0, -1)
-                        output_query.append("$" + str(pidx + 1))
-                        del placeholders[-1]
-                    except ValueError:
-                        output_query.append("$" + str(len(placeholders)))
-            elif style == 'pyformat':
-                if prev_c == ')' and c == "s":
-                    state = OUTSIDE
-                    try:
-                        pidx = placeholders.index(placeholders[-1], 0, -1)
-                        output_query.append("$" + str(pidx + 1))
-                        del placeholders[-1]
-                    except ValueError:
-                        output_query.append("$" + str(len(placeholders)))
-                elif c in "()":
-                    pass
-                else:
-                    placeholders[-1] += c
-            elif style == 'format':
-                state = OUTSIDE
 
-        prev_c = c
+def quoted_percent(match):
+    # Only an escaped percent sign is supported in a quoted string.
+    c = match.group(1)
+    if c != '%':
+        raise InterfaceError(
+            "'%" + c + "' not supported in a quoted string within the query "
+            "string")
+    return c
+
+
+def convert_paramstyle(style, query):
+    # Converts a query with placeholders in the given paramstyle to one with
+    # the $1, $2 ... placeholders of PostgreSQL. Returns the new query, and a
+    # function that makes the tuple of arguments from the parameters.
+    try:
+        tokens = PARAMSTYLE_TOKENS[style]
+    except KeyError:
+        raise InterfaceError("Unknown paramstyle " + repr(style) + ".")
+
+    output_query = []
+    names = {}
+    placeholders = []
+    positional = 0
+    pos = 0
+    for match in tokens.finditer(query):
+        output_query.append(query[pos:match.start()])
+        pos = match.end()
+        token = match.group()
+        first = token[0]
+        if first in "E'\"":
+            if '%' in token and style in ('format', 'pyformat'):
+                token = QUOTED_PERCENT.sub(quoted_percent, token)
+            output_query.append(token)
+        elif token == '::':
+            output_query.append(token)
+        elif style == 'qmark':
+            positional += 1
+            output_query.append('$' + str(positional))
+        elif style == 'numeric':
+            output_query.append('$')
+        elif style == 'named' or len(token) > 2:
+            name = match.group(1)
+            try:
+                idx = names[name]
+            except KeyError:
+                placeholders.append(name)
+                idx = names[name] = len(placeholders)
+            output_query.append('$' + str(idx))
+        elif token == '%s':
+            positional += 1
+            output_query.append('$' + str(positional))
+        elif token == '%%':
+            output_query.append('%')
+        else:
+            raise InterfaceError("Only %s and %% are supported in the query.")
+    output_query.append(query[pos:])
+
+    if style == 'pyformat' and positional > 0:
+        if len(placeholders) > 0:
+            raise InterfaceError(
+                "The query mixes %s and %(name)s placeholders.")
+        style = 'format'
 
     if style in ('numeric', 'qmark', 'format'):
         def make_args(vals):
             return vals
     else:
+        placeholders = tuple(placeholders)
+
         def make_args(vals):
             return tuple(vals[p] for p in placeholders)
 
     return ''.join(output_query), make_args
 
 
+# The most statements that Connection.prepare_threshold counts the executions
+# of, and that Connection.single_round_trip remembers the result types of.
+MAX_EXECUTION_COUNTS = 1000
+
+
+# The conversions made by convert_paramstyle(), keyed by paramstyle and query,
+# shared by all the connections of the process. When there are more than
+# MAX_CONVERSIONS, the oldest are dropped.
+MAX_CONVERSIONS = 1000
+_conversions = OrderedDict()
+_conversions_lock = threading.Lock()
+
+
+def cached_convert_paramstyle(style, query):
+    key = style, query
+    try:
+        return _conversions[key]
+    except KeyError:
+        pass
+
+    conversion = convert_paramstyle(style, query)
+    with _conversions_lock:
+        _conversions[key] = conversion
+        while len(_conversions) > MAX_CONVERSIONS:
+            _conversions.popitem(last=False)
+    return conversion
+
+
 EPOCH = datetime.datetime(2000, 1, 1)
 EPOCH_TZ = EPOCH.replace(tzinfo=utc)
 EPOCH_SECONDS = timegm(EPOCH.timetuple())
@@ -632,6 +627,60 @@ def timestamp_send_float(v):
     return d_pack(timegm(v.timetuple()) + v.microsecond / 1e6 - EPOCH_SECONDS)
 
 
+EPOCH_DATE_ORDINAL = EPOCH.toordinal()
+
+
+# data is 32-bit integer representing days since 2000-01-01
+def date_send(v):
+    if v == datetime.date.max:
+        return i_pack(2 ** 31 - 1)
+    elif v == datetime.date.min:
+        return i_pack(-2 ** 31)
+    else:
+        return i_pack(v.toordinal() - EPOCH_DATE_ORDINAL)
+
+
+# data is 32-bit integer representing days since 2000-01-01
+def date_recv(data, offset, length):
+    days = i_unpack(data, offset)[0]
+    if days == 2 ** 31 - 1:
+        return datetime.date.max
+    elif days == -2 ** 31:
+        return datetime.date.min
+    else:
+        return datetime.date.fromordinal(days + EPOCH_DATE_ORDINAL)
+
+
+def time_from_micros(micros):
+    seconds, micros = divmod(micros, 1000000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    return datetime.time(hour, minute, second, micros)
+
+
+# data is 64-bit integer representing microseconds since midnight
+def time_recv_integer(data, offset, length):
+    return time_from_micros(q_unpack(data, offset)[0])
+
+
+# data is double-precision float representing seconds since midnight
+def time_recv_float(data, offset, length):
+    return time_from_micros(int(round(d_unpack(data, offset)[0] * 1e6)))
+
+
+# data is the time as for time_recv_integer, followed by a 32-bit integer
+# representing the time zone in seconds west of UTC
+def timetz_recv_integer(data, offset, length):
+    micros, zone = qi_unpack(data, offset)
+    return time_from_micros(micros).replace(tzinfo=fixed_offset(-zone))
+
+
+def timetz_recv_float(data, offset, length):
+    seconds, zone = di_unpack(data, offset)
+    return time_from_micros(int(round(seconds * 1e6))).replace(
+        tzinfo=fixed_offset(-zone))
+
+
 def timestamptz_send_integer(v):
     # timestamps should be sent as UTC.  If they have zone info,
     # convert them.
@@ -716,6 +765,10 @@ def interval_recv_float(data, offset, length):
         return Interval(int(seconds * 1000 * 1000), days, months)
 
 
+if _speedups is not None:
+    _speedups.init(utc, Interval)
+
+
 def int8_recv(data, offset, length):
     return q_unpack(data, offset)[0]
 
@@ -736,6 +789,87 @@ def float8_recv(data, offset, length):
     return d_unpack(data, offset)[0]
 
 
+NUMERIC_POS = 0x0000
+NUMERIC_NEG = 0x4000
+NUMERIC_NAN = 0xC000
+NUMERIC_PINF = 0xD000
+NUMERIC_NINF = 0xF000
+
+
+# The unpack functions for binary numerics of each length
+NUMERIC_UNPACKS = {}
+
+
+# data is the number of base 10000 digits, the weight of the first digit, the
+# sign, the number of decimal digits after the decimal point, and then the
+# base 10000 digits.
+def numeric_recv(data, offset, length):
+    try:
+        unpack = NUMERIC_UNPACKS[length]
+    except KeyError:
+        unpack = NUMERIC_UNPACKS[length] = Struct(
+            '!hhHh' + 'h' * ((length - 8) // 2)).unpack_from
+    values = unpack(data, offset)
+    ndigits, weight, sign, dscale = values[:4]
+    if sign == NUMERIC_NAN:
+        return Decimal('NaN')
+    elif sign == NUMERIC_PINF:
+        return Decimal('Infinity')
+    elif sign == NUMERIC_NINF:
+        return Decimal('-Infinity')
+
+    coefficient = 0
+    for digit in values[4:]:
+        coefficient = coefficient * 10000 + digit
+
+    # Scale the coefficient so that the exponent is -dscale, which keeps the
+    # trailing zeros of the value in the database.
+    shift = (weight + 1 - ndigits) * 4 + dscale
+    if shift < 0:
+        coefficient //= 10 ** -shift
+    elif shift > 0:
+        coefficient *= 10 ** shift
+    return Decimal(
+        ('-' if sign == NUMERIC_NEG else '') + str(coefficient) + 'E-' +
+        str(dscale))
+
+
+def numeric_send(v):
+    sign, digits, exponent = v.as_tuple()
+    if exponent in ('n', 'N'):
+        return hhHh_pack(0, 0, NUMERIC_NAN, 0)
+    elif exponent == 'F':
+        return hhHh_pack(0, 0, NUMERIC_NINF if sign else NUMERIC_PINF, 0)
+
+    dscale = max(0, -exponent)
+
+    # Pad the decimal digits so that they split into base 10000 digits
+    # either side of the decimal point.
+    pad = exponent % 4
+    exponent -= pad
+    digits = ''.join(map(str, digits)) + '0' * pad
+    digits = '0' * (-len(digits) % 4) + digits
+    base_digits = [int(digits[i:i + 4]) for i in range(0, len(digits), 4)]
+    weight = len(base_digits) - 1 + exponent // 4
+
+    # Leading and trailing zero digits aren't stored
+    start = 0
+    end = len(base_digits)
+    while start < end and base_digits[start] == 0:
+        start += 1
+        weight -= 1
+    while end > start and base_digits[end - 1] == 0:
+        end -= 1
+    base_digits = base_digits[start:end]
+    if len(base_digits) == 0:
+        weight = 0
+
+    ndigits = len(base_digits)
+    return hhHh_pack(
+        ndigits, weight, NUMERIC_NEG if sign else NUMERIC_POS, dscale) + \
+        pack('!' + 'h' * ndigits, *base_digits)
+
+
 def bytea_send(v):
     return v
 
@@ -745,7 +879,7 @@ if PY2:
         return Bytea(data[offset:offset + length])
 else:
     def bytea_recv(data, offset, length):
-        return data[offset:offset + length]
+        return bytes(data[offset:offset + length])
 
 
 def uuid_send(v):
@@ -753,7 +887,7 @@ def uuid_send(v):
 
 
 def uuid_recv(data, offset, length):
-    return UUID(bytes=data[offset:offset+length])
+    return UUID(bytes=bytes(data[offset:offset+length]))
 
 
 TRUE = b("\x01")
@@ -773,8 +907,87 @@ def null_send(v):
     return NULL
 
 
-def int_in(data, offset, length):
-    return int(data[offset: offset + length])
+def oid_recv(data, offset, length):
+    return I_unpack(data, offset)[0]
+
+
+# The tokens of an array literal: braces, commas, quoted elements, and unquoted
+# elements. Whitespace between tokens doesn't match, and so is skipped.
+ARRAY_TOKENS = re.compile(r'[{},]|"((?:[^"\\]|\\.)*)"|([^{},"\s]+)')
+ARRAY_ESCAPES = re.compile(r'\\(.)')
+
+
+def array_parse(text, convert):
+    # Parses the text format of an array, calling convert() on the text of
+    # each element that isn't NULL.
+
+    # Skip any dimensions, as in '[0:1]={1,2}'
+    if text.startswith('['):
+        text = text[text.index('=') + 1:]
+
+    stack = []
+    current = None
+    for match in ARRAY_TOKENS.finditer(text):
+        token = match.group()
+        if token == '{':
+            stack.append(current)
+            current = []
+            if stack[-1] is not None:
+                stack[-1].append(current)
+        elif token == '}':
+            parent = stack.pop()
+            if parent is None:
+                return current
+            current = parent
+        elif token == ',':
+            pass
+        else:
+            quoted, unquoted = match.groups()
+            if unquoted is None:
+                if '\\' in quoted:
+                    quoted = ARRAY_ESCAPES.sub(r'\1', quoted)
+                current.append(convert(quoted))
+            elif unquoted.upper() == 'NULL':
+                current.append(None)
+            else:
+                current.append(convert(unquoted))
+    raise InterfaceError("Malformed array literal: " + text)
+
+
+# Row factories. A row factory is called once for each statement, with the
+# names of the columns of its result, and returns a function that makes a row
+# from a tuple of the values of the columns.
+
+def tuple_row(names):
+    """A row factory for rows that are tuples. This is the default."""
+    return tuple
+
+
+def list_row(names):
+    """A row factory for rows that are lists, as in earlier versions of
+    pg8000.
+    """
+    return list
+
+
+def dict_row(names):
+    """A row factory for rows that are dictionaries, keyed by the column
+    names.
+    """
+    keys = tuple(names)
+
+    def make_row(values):
+        return dict(zip(keys, values))
+    return make_row
+
+
+def namedtuple_row(names):
+    """A row factory for rows that are named tuples, with an attribute for
+    each column. Column names that aren't valid identifiers, or that are
+    repeated, are replaced with names of the form ``_1``, the position of the
+    column.
+    """
+    return namedtuple('Row', names, rename=True)._make
 
 
 class Cursor():
@@ -814,6 +1027,7 @@ class Cursor():
           version 9.
         - Using a ``COPY`` query statement on PostgreSQL server version 8.1 or
           older.
+        - Using a named cursor.
 
         This attribute is part of the `DBAPI 2.0 specification
         <http://www.python.org/dev/peps/pep-0249/>`_.
@@ -828,17 +1042,81 @@ class Cursor():
 
         This attribute is part of the `DBAPI 2.0 specification
         <http://www.python.org/dev/peps/pep-0249/>`_.
+
+    .. attribute:: executemany_batch_size
+
+        This read/write attribute specifies the maximum number of parameter
+        sets that :meth:`executemany` sends to the server before waiting for
+        the results. Larger batches mean fewer round trips to the server, at
+        the cost of more memory. It defaults to 1000.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: fetch_size
+
+        This read/write attribute specifies the number of rows that
+        :meth:`execute` fetches from the server at a time. When they've all
+        been read from the cursor, the next lot of rows is fetched. Bigger
+        values mean fewer round trips to the server, at the cost of more
+        memory. The value ``0`` means fetch all the rows at once. It defaults
+        to the ``fetch_size`` of the connection.
+
+        With autocommit on, outside of a transaction started with ``BEGIN``,
+        all the rows are always fetched at once, as the result can't be kept
+        open on the server between fetches. Named cursors don't have this
+        restriction.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: name
+
+        The name of the cursor on the server for a named cursor, otherwise
+        ``None``. See :meth:`Connection.cursor`.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: row_factory
+
+        This read/write attribute specifies how the rows of a result are
+        made. It's one of :func:`pg8000.tuple_row`, :func:`pg8000.list_row`,
+        :func:`pg8000.dict_row` and :func:`pg8000.namedtuple_row`, or a
+        function of your own that's called with the list of the column names
+        of a result and returns a function that makes a row from a tuple of
+        values. The factory is only called once for each prepared statement,
+        so for example the class of named tuple rows is made when a
+        statement is first run rather than for each row. It defaults to the
+        ``row_factory`` of the connection. A change takes effect with the
+        next lot of rows fetched from the server.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
     """
 
-    def __init__(self, connection):
+    def __init__(self, connection, name=None):
         self._c = connection
+        self.name = name
         self.arraysize = 1
+        self.executemany_batch_size = 1000
+        self.fetch_size = connection.fetch_size
+        self.row_factory = connection.row_factory
         self.ps = None
         self._row_count = -1
         self._cached_rows = deque()
         self.portal_name = None
         self.portal_suspended = False
 
+        # For a named cursor, whether it's been declared on the server, the
+        # value of the connection's _transactions_ended when it was declared,
+        # whether it's declared WITH HOLD, and whether there may be more
+        # rows to fetch.
+        self._declared = False
+        self._declared_in = None
+        self._hold = False
+        self._more_rows = False
+
     def __enter__(self):
         return self
 
@@ -873,7 +1151,9 @@ class Cursor():
     # or mapping and will be bound to variables in the operation.
     # <p>
     # Stability: Part of the DBAPI 2.0 specification.
-    def execute(self, operation, args=None, stream=None):
+    def execute(
+            self, operation, args=None, stream=None, prepare=None,
+            timeout=None):
         """Executes a database operation.  Parameters may be provided as a
         sequence, or as a mapping, depending upon the value of
         :data:`pg8000.paramstyle`.
@@ -899,14 +1179,40 @@ class Cursor():
             object, and for COPY TO it must be writable.
 
             .. versionadded:: 1.9.11
+
+        :param prepare: This is a pg8000 extension. If it's ``True``, the
+            statement is prepared as a named statement and kept in the
+            :attr:`~Connection.statement_cache`, and if it's ``False`` it's run
+            with the unnamed statement unless it's already prepared. The
+            default of ``None`` leaves the choice to the
+            :attr:`~Connection.prepare_threshold` of the connection.
+            Statements run in a pipeline are always prepared.
+
+        :param timeout: This is a pg8000 extension. The time in seconds that
+            the statement may run for before it's cancelled with
+            :meth:`Connection.cancel`, which makes it raise a
+            :exc:`ProgrammingError` with the SQLSTATE code ``57014``. The
+            default of ``None`` means no timeout.
         """
         try:
-            with self._c._lock:
+            with self._c._lock, StatementTimeout(self._c, timeout):
                 self.stream = stream
 
                 if not self._c.in_transaction and not self._c.autocommit:
                     self._c.execute(self, "begin transaction", None)
-                self._c.execute(self, operation, args)
+                if self.name is not None:
+                    if self._c._pipeline is not None or stream is not None:
+                        raise InterfaceError(
+                            "A named cursor can't be used in a pipeline or "
+                            "with the COPY command.")
+                    self._c.declare(self, operation, args, prepare)
+                elif self._c._pipeline is None:
+                    self._c.execute(self, operation, args, prepare)
+                elif stream is None:
+                    self._c._pipeline.execute(self, operation, args)
+                else:
+                    raise InterfaceError(
+                        "The COPY command can't be used in a pipeline.")
         except AttributeError as e:
             if self._c is None:
                 raise InterfaceError("Cursor closed")
@@ -928,13 +1234,288 @@ class Cursor():
             A sequence of parameters to execute the statement with. The values
             in the sequence should be sequences or mappings of parameters, the
             same as the args argument of the :meth:`execute` method.
+
+        The parameter sets are sent to the server in batches of
+        :attr:`executemany_batch_size`, each batch taking a single round trip
+        to the server. In :attr:`~Connection.autocommit` mode, all the
+        parameter sets are executed in a single transaction, so if one of
+        them fails none of them take effect.
+        """
+        if self.name is not None:
+            raise ProgrammingError(
+                "executemany() can't be used with a named cursor.")
+        try:
+            with self._c._lock:
+                self.stream = None
+
+                if self._c.in_transaction:
+                    self._c.executemany(
+                        self, operation, param_sets,
+                        self.executemany_batch_size)
+                elif not self._c.autocommit:
+                    self._c.execute(self, "begin transaction", None)
+                    self._c.executemany(
+                        self, operation, param_sets,
+                        self.executemany_batch_size)
+                else:
+                    self._executemany_autocommit(operation, param_sets)
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+
+    def _executemany_autocommit(self, operation, param_sets):
+        # Each Sync would otherwise commit a batch, so how much of a failed
+        # executemany() took effect would depend on the batch size. The
+        # transaction's statements use the connection's own cursor, to leave
+        # the rowcount of this one alone.
+        c = self._c
+        c.execute(c._cursor, "begin transaction", None)
+        committed = False
+        try:
+            c.executemany(
+                self, operation, param_sets, self.executemany_batch_size)
+            c.execute(c._cursor, "commit", None)
+            committed = True
+        finally:
+            if not committed and c.in_transaction:
+                try:
+                    c.execute(c._cursor, "rollback", None)
+                except Error:
+                    pass
+
+    def copy_rows(self, table, columns, rows):
+        """Loads rows into a table using the binary format of the PostgreSQL
+        `COPY <http://www.postgresql.org/docs/current/static/sql-copy.html>`_
+        command. This is much faster than inserting the rows one at a time,
+        and unlike a CSV stream the values keep their exact types.
+
+        This method is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+        :param table:
+            The name of the table to copy the rows into. It's put into the
+            ``COPY`` command as it is, so it can be qualified with a schema,
+            and must be quoted if it needs to be.
+
+        :param columns:
+            A sequence of the names of the columns that the values of each row
+            are for. Each name is quoted, so it's matched exactly, with its
+            case.
+
+        :param rows:
+            An iterable of sequences of values, one value for each column.
+            Rows are read from the iterable and sent to the server in chunks,
+            so a generator can be used to load any number of rows without
+            holding them all in memory.
+
+        Columns of types that pg8000 can't send in the binary format raise
+        :class:`NotSupportedError`. After the copy, :attr:`rowcount` is the
+        number of rows loaded.
+        """
+        try:
+            with self._c._lock:
+                if self._c._pipeline is not None:
+                    raise InterfaceError(
+                        "The COPY command can't be used in a pipeline.")
+                self.stream = None
+
+                if not self._c.in_transaction and not self._c.autocommit:
+                    self._c.execute(self, "begin transaction", None)
+                self._c.copy_rows(self, table, columns, rows)
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+
+    def copy_out_rows(self, query):
+        """Runs a query using the binary format of the PostgreSQL `COPY
+        <http://www.postgresql.org/docs/current/static/sql-copy.html>`_
+        command, and returns an iterator over the rows of the result, made
+        by the :attr:`row_factory`. The rows are decoded as they arrive from
+        the server, so large results can be read with the throughput of
+        ``COPY`` without holding them all in memory.
+
+        This method is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+        :param query:
+            The query whose result is copied, typically a ``SELECT``
+            statement. Parameters can't be used.
+
+        The query is run when the iterator is first advanced, and until the
+        iterator is exhausted or closed, using the connection for anything
+        else raises :class:`InterfaceError`. Columns of types that pg8000
+        can't receive in the binary format raise :class:`NotSupportedError`.
+        """
+        # The lock is only held while each CopyData message is read, so that
+        # the connection isn't left locked by an iterator that's abandoned.
+        c = self._c
+        batches = None
+        try:
+            with c._lock:
+                if c._pipeline is not None:
+                    raise InterfaceError(
+                        "The COPY command can't be used in a pipeline.")
+                self.stream = None
+
+                if not c.in_transaction and not c.autocommit:
+                    c.execute(self, "begin transaction", None)
+                batches = c.copy_out_rows(self, query)
+
+            while True:
+                with c._lock:
+                    rows = next(batches, None)
+                if rows is None:
+                    break
+                for row in rows:
+                    yield row
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+        finally:
+            if batches is not None:
+                with c._lock:
+                    batches.close()
+
+    def fetch_columns(self):
+        """Fetches all remaining rows of a query result, a column at a time.
+
+        This method is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+        :returns:
+            A list with a list of values for each column.
+        """
+        if self.ps is None:
+            raise ProgrammingError("A query hasn't been issued.")
+        columns = [[] for col in self.ps['row_desc']]
+        appends = [column.append for column in columns]
+        for row in self._values(self):
+            for append, value in zip(appends, row):
+                append(value)
+        return columns
+
+    def _values(self, rows):
+        # Returns each of the rows as a sequence of values in the order of the
+        # columns, whatever the row factory that made it.
+        names = None
+        for row in rows:
+            if isinstance(row, dict):
+                if names is None:
+                    names = [
+                        col['name'].decode(self._c._client_encoding)
+                        for col in self.ps['row_desc']]
+                row = [row[name] for name in names]
+            yield row
+
+    def fetch_numpy(self):
+        """Fetches all remaining rows of a query result as `NumPy
+        <http://www.numpy.org/>`_ arrays, one for each column. The values of
+        columns of the types ``bool``, ``int2``, ``int4``, ``int8``,
+        ``float4``, ``float8``, ``oid``, ``date``, ``timestamp`` and
+        ``timestamptz`` are copied from the messages from the server straight
+        into arrays of the matching NumPy type, without being decoded to
+        Python objects. Dates and timestamps are ``datetime64[D]`` and
+        ``datetime64[us]`` values in UTC, with infinity as ``NaT``. Columns
+        of other types are arrays of Python objects.
+
+        This method is not part of the DBAPI standard; it is a pg8000
+        extension. It needs NumPy to be installed.
+
+        :returns:
+            A list of ``numpy.ma.MaskedArray`` objects, one for each column,
+            in which the NULLs are masked.
         """
-        rowcounts = []
-        for parameters in param_sets:
-            self.execute(operation, parameters)
-            rowcounts.append(self._row_count)
+        from pg8000.columnar import Columns
+        try:
+            with self._c._lock:
+                if self.ps is None:
+                    raise ProgrammingError("A query hasn't been issued.")
+                elif len(self.ps['row_desc']) == 0:
+                    raise ProgrammingError("no result set")
+                columns = Columns(self._c, self.ps['row_desc'])
+                for row in self._values(self._cached_rows):
+                    columns.add_row(row)
+                self._cached_rows.clear()
+                while self._c.fetch_raw(self, columns.add):
+                    pass
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+        return columns.to_numpy()
+
+    def fetch_arrow_batches(self, batch_size=65536):
+        """Fetches the remaining rows of a query result as `Apache Arrow
+        <https://arrow.apache.org/>`_ record batches. The rows are collected a
+        column at a time, in the same way as :meth:`fetch_numpy`, and each
+        batch is made once ``batch_size`` rows have been collected, so only
+        the rows of about one batch are held in memory at a time if
+        :attr:`fetch_size` is set. The Arrow type of each column comes from
+        its PostgreSQL type, so that ``int4`` is ``int32``, ``text`` is
+        ``string``, ``timestamptz`` is ``timestamp[us, tz=UTC]`` and so on.
+        A ``numeric`` column with a precision is a ``decimal128`` and
+        otherwise a ``string``, as it may have any number of digits. Columns
+        of other types have their Arrow type inferred from the values of the
+        first batch in which they aren't all NULL, and later batches use the
+        same type. Infinite dates and timestamps are null.
+
+        This method is not part of the DBAPI standard; it is a pg8000
+        extension. It needs PyArrow and NumPy to be installed.
+
+        :param batch_size:
+            The greatest number of rows in each batch.
 
-        self._row_count = -1 if -1 in rowcounts else sum(rowcounts)
+        :returns:
+            An iterator of ``pyarrow.RecordBatch`` objects. If the result
+            has no rows, a single empty batch is returned, so that the
+            schema is still available.
+        """
+        from pg8000.columnar import Batches
+        if batch_size < 1:
+            raise ProgrammingError("batch_size must be at least 1")
+        try:
+            with self._c._lock:
+                if self.ps is None:
+                    raise ProgrammingError("A query hasn't been issued.")
+                elif len(self.ps['row_desc']) == 0:
+                    raise ProgrammingError("no result set")
+                batches = Batches(self._c, self.ps['row_desc'], batch_size)
+                for row in self._values(self._cached_rows):
+                    batches.add_row(row)
+                self._cached_rows.clear()
+
+            more = True
+            sent = False
+            while more:
+                while len(batches.full) > 0:
+                    yield batches.to_arrow(batches.full.popleft())
+                    sent = True
+                with self._c._lock:
+                    more = self._c.fetch_raw(self, batches.add)
+        except AttributeError as e:
+            if self._c is None:
+                raise InterfaceError("Cursor closed")
+            elif self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+        if batches.current.num_rows > 0 or not sent:
+            yield batches.to_arrow(batches.current)
 
     def fetchone(self):
         """Fetch the next row of a query result set.
@@ -999,7 +1580,13 @@ class Cursor():
 
         This method is part of the `DBAPI 2.0 specification
         <http://www.python.org/dev/peps/pep-0249/>`_.
+
+        A named cursor is also closed on the server.
         """
+        if self._declared and self._c is not None and \
+                self._c._sock is not None:
+            with self._c._lock:
+                self._c.close_named(self)
         self._c = None
 
     def __iter__(self):
@@ -1028,13 +1615,8 @@ class Cursor():
             try:
                 return self._cached_rows.popleft()
             except IndexError:
-                if self.portal_suspended:
-                    self._c.send_EXECUTE(self)
-                    self._c._write(SYNC_MSG)
-                    self._c._flush()
-                    self._c.handle_messages(self)
-                    if not self.portal_suspended:
-                        self._c.close_portal(self)
+                if self.portal_suspended or self._more_rows:
+                    self._c._fetch_more(self)
                 try:
                     return self._cached_rows.popleft()
                 except IndexError:
@@ -1066,6 +1648,7 @@ NO_DATA = b("n")
 PARAMETER_DESCRIPTION = b("t")
 NOTIFICATION_RESPONSE = b("A")
 COPY_DONE = b("c")
+COPY_FAIL = b("f")
 COPY_DATA = b("d")
 COPY_IN_RESPONSE = b("G")
 COPY_OUT_RESPONSE = b("H")
@@ -1086,6 +1669,22 @@ SYNC_MSG = SYNC + i_pack(4)
 TERMINATE_MSG = TERMINATE + i_pack(4)
 COPY_DONE_MSG = COPY_DONE + i_pack(4)
 
+# The signature, flags field and header extension length that start the binary
+# COPY format, and the field count of -1 that ends it.
+COPY_BINARY_SIGNATURE = b("PGCOPY\n\xff\r\n\x00")
+COPY_BINARY_HEADER = COPY_BINARY_SIGNATURE + ii_pack(0, 0)
+COPY_BINARY_TRAILER = h_pack(-1)
+
+# The size of the chunks of data sent by copy_rows().
+COPY_CHUNK_SIZE = 2 ** 16
+
+# The size of the buffer that messages from the server are read into.
+READ_BUFFER_SIZE = 2 ** 16
+
+# The time in seconds that the separate connection of Connection.cancel() may
+# take to connect, and for the server to handle the request.
+CANCEL_TIMEOUT = 10
+
 # DESCRIBE constants
 STATEMENT = b('S')
 PORTAL = b('P')
@@ -1112,29 +1711,368 @@ IDLE_IN_FAILED_TRANSACTION = b("E")
 arr_trans = dict(zip(map(ord, u("[] 'u")), list(u('{}')) + [None] * 3))
 
 
-class MulticastDelegate(object):
-    def __init__(self):
-        self.delegates = []
+class StatementCache(object):
+    """The cache of prepared statements of a connection, available as its
+    :attr:`~Connection.statement_cache` attribute. When the cache is full, the
+    least recently used statement is evicted from it, and closed on the server.
 
-    def __iadd__(self, delegate):
-        self.add(delegate)
-        return self
+    This class is not part of the DBAPI standard; it is a pg8000 extension.
 
-    def add(self, delegate):
-        self.delegates.append(delegate)
+    .. attribute:: max_size
 
-    def __isub__(self, delegate):
-        self.delegates.remove(delegate)
-        return self
+        The maximum number of prepared statements kept. This attribute can be
+        changed, and takes effect the next time a statement is prepared.
 
-    def __call__(self, *args, **kwargs):
-        for d in self.delegates:
-            d(*args, **kwargs)
+    .. attribute:: hits
 
+        The number of times an execution found its statement already prepared.
 
-class Connection(object):
-    """A connection object is returned by the :func:`pg8000.connect` function.
-    It represents a single physical connection to a PostgreSQL database.
+    .. attribute:: misses
+
+        The number of times an execution had to prepare its statement.
+
+    .. attribute:: evictions
+
+        The number of statements evicted to keep within :attr:`max_size`.
+    """
+
+    def __init__(self, max_size, on_evict):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._on_evict = on_evict
+        self._statements = OrderedDict()
+
+    def __len__(self):
+        return len(self._statements)
+
+    def __contains__(self, key):
+        return key in self._statements
+
+    def get(self, key):
+        try:
+            ps = self._statements.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        self._statements[key] = ps
+        self.hits += 1
+        return ps
+
+    def put(self, key, ps):
+        self._statements[key] = ps
+        while len(self._statements) > self.max_size:
+            self.evictions += 1
+            self._on_evict(self._statements.popitem(last=False)[1])
+
+    def touch(self, key):
+        # Marks a statement as the most recently used, for statements that
+        # are used without being looked up with get().
+        self._statements[key] = self._statements.pop(key)
+
+    def discard(self, key):
+        try:
+            self._on_evict(self._statements.pop(key))
+        except KeyError:
+            pass
+
+    def clear(self):
+        for ps in itervalues(self._statements):
+            self._on_evict(ps)
+        self._statements.clear()
+
+
+class Pipeline(object):
+    """A pipeline is returned by the :meth:`~Connection.pipeline` method of a
+    connection. While the pipeline is active, statements executed with
+    :meth:`Cursor.execute` on any cursor of the connection aren't sent to the
+    server straight away, but are queued up. When the pipeline is synchronized,
+    the queued statements are sent to the server together, in the order they
+    were executed, and their results are then read back and delivered to the
+    cursors that executed them. This means that a whole series of prepared
+    statements takes about the same number of round trips to the server as a
+    single one. A statement that isn't in the
+    :attr:`~Connection.statement_cache` yet takes an extra round trip to be
+    prepared, after the statements before it have run, so that it can depend
+    on them.
+
+    The pipeline is synchronized when the ``with`` block exits, when
+    :meth:`sync` is called, and before :meth:`Connection.commit` or
+    :meth:`Connection.rollback`. If the ``with`` block exits with an
+    exception, the statements still in the queue are discarded.
+
+    Each statement fetches all its rows in one go, so the pipeline is meant for
+    statements that return a modest number of rows. The ``COPY`` command can't
+    be used in a pipeline.
+
+    This class is not part of the DBAPI standard; it is a pg8000 extension.
+
+    .. attribute:: errors
+
+        A list of ``(cursor, operation, exception)`` tuples, one for each
+        statement that failed the last time the pipeline was synchronized,
+        in the order that the statements were executed.
+
+    .. attribute:: skipped
+
+        A list of ``(cursor, operation)`` tuples for the statements that the
+        server didn't run the last time the pipeline was synchronized, because
+        an earlier statement failed in the same transaction.
+    """
+
+    def __init__(self, connection):
+        self._c = connection
+        self._queue = []
+        self.errors = []
+        self.skipped = []
+
+    def __enter__(self):
+        with self._c._lock:
+            if self._c._pipeline is not None:
+                raise InterfaceError(
+                    "A pipeline is already active on this connection.")
+            self._c._pipeline = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.sync()
+        finally:
+            with self._c._lock:
+                self._c._pipeline = None
+                del self._queue[:]
+
+    def execute(self, cursor, operation, args):
+        key, statement, params, vals = self._c._lookup_statement(
+            operation, args)
+        self._queue.append((cursor, operation, key, statement, params, vals))
+
+    def sync(self):
+        """Sends all the queued statements to the server, and delivers the
+        results to the cursors that executed them.
+
+        If any of the statements fail, then once all the results have been
+        read, the exception for the first failing statement is raised. The
+        exceptions for all the failing statements are available from
+        :attr:`errors`, and the statements that weren't run because of an
+        earlier failure are listed in :attr:`skipped`.
+        """
+        with self._c._lock:
+            self._sync()
+
+    def _sync(self):
+        c = self._c
+        queue, self._queue = self._queue, []
+        self.errors = []
+        self.skipped = []
+        if len(queue) == 0:
+            return
+
+        # The statements are sent in the order they were executed, each one
+        # bound and executed on the unnamed portal and followed by a Sync, so
+        # that in autocommit mode an error only affects the statement that
+        # caused it. A statement that isn't prepared yet is parsed at its
+        # place in the stream, as it may depend on the statements before it,
+        # such as a table created earlier in the pipeline. Its Bind needs the
+        # result formats from its row description, so the statements so far
+        # are sent and their results read along with the Parse.
+        execute_msg = NULL_BYTE + i_pack(0)
+        sent = []
+        for cursor, operation, key, statement, params, vals in queue:
+            try:
+                ps = c.statement_cache.get(key)
+            except KeyError:
+                ps = c._send_parse(statement, params)
+                c._write(SYNC_MSG)
+                c._flush()
+                self._read_results(sent)
+                sent = []
+                try:
+                    self._read_result(cursor, ps)
+                except ProgrammingError as e:
+                    self._fail(cursor, operation, e)
+                    continue
+                c._complete_parse(ps, params)
+                c.statement_cache.put(key, ps)
+
+            c._send_message(BIND, c._make_bind(NULL_BYTE, ps, vals))
+            c._send_message(EXECUTE, execute_msg)
+            c._write(SYNC_MSG)
+            sent.append((cursor, operation, ps))
+        c._flush()
+        self._read_results(sent)
+
+        if len(self.errors) > 0:
+            raise self.errors[0][2]
+
+    def _read_results(self, sent):
+        for cursor, operation, ps in sent:
+            try:
+                self._read_result(cursor, ps)
+            except ProgrammingError as e:
+                self._fail(cursor, operation, e)
+
+    def _read_result(self, cursor, ps):
+        cursor._cached_rows.clear()
+        cursor._row_count = -1
+        cursor.portal_suspended = False
+        cursor.ps = ps
+        self._c.handle_messages(cursor)
+
+    def _fail(self, cursor, operation, error):
+        # Once a statement has failed in a transaction block, the server
+        # refuses the statements after it until the transaction ends. They
+        # haven't failed in their own right, so they're reported as skipped.
+        if len(self.errors) > 0 and error.args[1:2] == ('25P02',):
+            self.skipped.append((cursor, operation))
+        else:
+            self.errors.append((cursor, operation, error))
+
+
+class PreparedStatement(object):
+    """A prepared statement is returned by the :meth:`~Connection.prepare`
+    method of a connection. It's a handle on a query that's meant to be run
+    many times, and its :meth:`execute` method skips most of the work that
+    :meth:`Cursor.execute` does on each call. The query is converted from the
+    :data:`pg8000.paramstyle` once, when the prepared statement is created,
+    and as long as the parameters have the same Python types as on the
+    previous call, the statement on the server is reused without looking it up
+    in the :attr:`~Connection.statement_cache`.
+
+    This class is not part of the DBAPI standard; it is a pg8000 extension.
+
+    .. attribute:: operation
+
+        The SQL statement, as it was given to :meth:`~Connection.prepare`.
+
+    .. attribute:: cursor
+
+        The :class:`Cursor` that the results are read from, and that
+        :meth:`execute` returns.
+    """
+
+    def __init__(self, connection, operation):
+        self._c = connection
+        self.operation = operation
+        self.cursor = connection.cursor()
+        self._statement, self._make_args = cached_convert_paramstyle(
+            pg8000.paramstyle, operation)
+        self._types = None
+        self._key = self._ps = None
+
+    def execute(self, args=None):
+        """Executes the statement, with parameters in the same form as for
+        :meth:`Cursor.execute`, and returns :attr:`cursor` for reading the
+        results. Any rows left from the previous execution are discarded.
+
+        A prepared statement can't be executed while a pipeline is active.
+        """
+        cursor = self.cursor
+        try:
+            with self._c._lock:
+                if self._c._pipeline is not None:
+                    raise InterfaceError(
+                        "A prepared statement can't be used in a pipeline.")
+                cursor.stream = None
+                if not self._c.in_transaction and not self._c.autocommit:
+                    self._c.execute(cursor, "begin transaction", None)
+                self._c.execute_prepared(cursor, self, args)
+        except AttributeError as e:
+            if self._c._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+        return cursor
+
+
+class StatementTimeout(object):
+    # Cancels the statement that a connection is running if it's still
+    # running after a timeout. Once the statement has finished, a cancel
+    # request that's already been started is waited for, so a late request
+    # can't cancel a statement that's run afterwards. The wait is limited, in
+    # case the server doesn't respond to the request.
+    def __init__(self, connection, timeout):
+        self._c = connection
+        self._lock = threading.Lock()
+        self._running = True
+        self._cancelling = False
+        self._cancelled = threading.Event()
+        if timeout is None:
+            self._timer = None
+        else:
+            self._timer = threading.Timer(timeout, self._cancel)
+            self._timer.daemon = True
+
+    def __enter__(self):
+        if self._timer is not None:
+            self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._timer is not None:
+            self._timer.cancel()
+            with self._lock:
+                self._running = False
+                cancelling = self._cancelling
+            if cancelling:
+                self._cancelled.wait(CANCEL_TIMEOUT)
+
+    def _cancel(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._cancelling = True
+        try:
+            self._c.cancel()
+        except Error:
+            # There's no one to tell in the timer's thread, and the statement
+            # just runs to the end.
+            pass
+        finally:
+            self._cancelled.set()
+
+
+class MulticastDelegate(object):
+    def __init__(self):
+        self.delegates = []
+
+    def __iadd__(self, delegate):
+        self.add(delegate)
+        return self
+
+    def add(self, delegate):
+        self.delegates.append(delegate)
+
+    def __isub__(self, delegate):
+        self.delegates.remove(delegate)
+        return self
+
+    def __call__(self, *args, **kwargs):
+        for d in self.delegates:
+            d(*args, **kwargs)
+
+
+def set_socket_options(
+        sock, tcp, tcp_nodelay, tcp_keepalive, socket_rcvbuf, socket_sndbuf):
+    # Sets the options given to connect() on a socket. The TCP options are
+    # only set on TCP sockets, and the buffer sizes are left to the operating
+    # system if they're None.
+    if tcp:
+        sock.setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, int(tcp_nodelay))
+        sock.setsockopt(
+            socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(tcp_keepalive))
+    if socket_rcvbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, socket_rcvbuf)
+    if socket_sndbuf is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, socket_sndbuf)
+
+
+class Connection(object):
+    """A connection object is returned by the :func:`pg8000.connect` function.
+    It represents a single physical connection to a PostgreSQL database.
 
     .. attribute:: Connection.notifies
 
@@ -1175,6 +2113,65 @@ class Connection(object):
 
         .. versionadded:: 1.9
 
+    .. attribute:: Connection.fetch_size
+
+        The :attr:`~Cursor.fetch_size` of new cursors. It's set by the
+        ``fetch_size`` argument of :func:`pg8000.connect`.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: Connection.row_factory
+
+        The :attr:`~Cursor.row_factory` of new cursors. It's set by the
+        ``row_factory`` argument of :func:`pg8000.connect`.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: Connection.prepare_threshold
+
+        The number of times a statement is run with the unnamed statement
+        before it's prepared as a named statement on the server and kept in
+        the :attr:`statement_cache`. The unnamed statement is replaced by the
+        next one, so a statement that's only run a few times doesn't take up
+        memory on the server, while one that's run often is prepared and
+        planned only once. With the default of ``0`` every statement is
+        prepared the first time it's run, and with ``None`` statements are
+        never prepared. It's set by the ``prepare_threshold`` argument of
+        :func:`pg8000.connect`, and can be overridden for a single statement
+        by the ``prepare`` argument of :meth:`Cursor.execute`.
+
+        The number of times each statement has been run is counted for up to
+        ``MAX_EXECUTION_COUNTS`` (1000) statements, after which the least
+        recently run are forgotten.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: Connection.single_round_trip
+
+        If this is ``True``, a statement that's run with the unnamed statement
+        (see :attr:`prepare_threshold`) is sent as Parse, Bind, Describe and
+        Execute messages together, so that it takes one round trip to the
+        server rather than two. The Bind needs the types of the result
+        columns, so this only applies once the statement has been run before
+        and its result types are known. The first time, it takes two round
+        trips as usual. The result types are remembered for up to
+        ``MAX_EXECUTION_COUNTS`` (1000) statements. It defaults to ``False``.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+    .. attribute:: Connection.statement_cache
+
+        The :class:`StatementCache` of the statements prepared on the server
+        by this connection. Its size is limited by the
+        ``max_prepared_statements`` argument of :func:`pg8000.connect`.
+
+        This attribute is not part of the DBAPI standard; it is a pg8000
+        extension.
+
     .. exception:: Connection.Error
                    Connection.Warning
                    Connection.InterfaceError
@@ -1206,14 +2203,6 @@ class Connection(object):
     NotSupportedError = property(
         lambda self: self._getError(NotSupportedError))
 
-    # Determines the number of rows to read from the database server at once.
-    # Reading more rows increases performance at the cost of memory.  The
-    # default value is 100 rows.  The effect of this parameter is transparent.
-    # That is, the library reads more rows when the cache is empty
-    # automatically.
-    _row_cache_size = 100
-    _row_cache_size_bin = i_pack(_row_cache_size)
-
     def _getError(self, error):
         warn(
             "DB-API extension connection.%s used" %
@@ -1222,33 +2211,13 @@ class Connection(object):
 
     def __init__(
             self, user, host, unix_sock, port, database, password, ssl,
-            timeout, application_name):
-        self._client_encoding = "utf8"
-        self._commands_with_count = (
-            b("INSERT"), b("DELETE"), b("UPDATE"), b("MOVE"),
-            b("FETCH"), b("COPY"), b("SELECT"))
-        self._lock = threading.Lock()
-
-        if user is None:
-            raise InterfaceError(
-                "The 'user' connection parameter cannot be None")
-
-        if isinstance(user, text_type):
-            self.user = user.encode('utf8')
-        else:
-            self.user = user
-
-        if isinstance(password, text_type):
-            self.password = password.encode('utf8')
-        else:
-            self.password = password
-
-        self.autocommit = False
-        self._xid = None
-
-        self._caches = defaultdict(lambda: defaultdict(dict))
-        self.statement_number = 0
-        self.portal_number = 0
+            timeout, application_name, max_prepared_statements=100,
+            fetch_size=100, row_factory=tuple_row, prepare_threshold=0,
+            tcp_nodelay=True, tcp_keepalive=False, socket_rcvbuf=None,
+            socket_sndbuf=None, read_buffer_size=READ_BUFFER_SIZE):
+        self._setup(
+            user, password, max_prepared_statements, fetch_size, row_factory,
+            prepare_threshold)
 
         try:
             if unix_sock is None and host is not None:
@@ -1265,6 +2234,15 @@ class Connection(object):
             if not PY2 and timeout is not None:
                 self._usock.settimeout(timeout)
 
+            # The options are set before connecting, as the receive buffer
+            # size decides the TCP window scaling that's agreed on connecting.
+            set_socket_options(
+                self._usock, unix_sock is None, tcp_nodelay, tcp_keepalive,
+                socket_rcvbuf, socket_sndbuf)
+
+            # The address is kept for the side connections of cancel().
+            self._host, self._port, self._unix_sock = host, port, unix_sock
+
             if unix_sock is None and host is not None:
                 self._usock.connect((host, port))
             elif unix_sock is not None:
@@ -1287,13 +2265,98 @@ class Connection(object):
                             "SSL required but ssl module not available in "
                             "this python installation")
 
-            self._sock = self._usock.makefile(mode="rwb")
+            self._sock = self._usock.makefile("rwb", read_buffer_size)
         except socket.error as e:
             self._usock.close()
             raise InterfaceError("communication error", e)
-        self._flush = self._sock.flush
         self._read = self._sock.read
-        self._write = self._sock.write
+
+        # Messages are written to a buffer, and sent to the server together
+        # by _flush().
+        self._wbuf = bytearray()
+        self._write = self._wbuf.extend
+
+        # The buffer that messages are read into, see _read_message()
+        self._read_buffer_size = read_buffer_size
+        self._rbuf = bytearray(read_buffer_size)
+        self._rview = memoryview(self._rbuf)
+        self._rbuf_pos = self._rbuf_end = 0
+
+        self._write(self._startup_message(database, application_name))
+        self._flush()
+
+        self._cursor = self.cursor()
+        with self._lock:
+            try:
+                code = self.error = None
+                while code not in (READY_FOR_QUERY, ERROR_RESPONSE):
+                    code, data = self._read_message()
+                    self.message_types[code](data, None)
+                if self.error is not None:
+                    raise self.error
+            except Exception as e:
+                try:
+                    self._close()
+                except Exception:
+                    pass
+                raise e
+
+    def _setup(
+            self, user, password, max_prepared_statements, fetch_size,
+            row_factory, prepare_threshold):
+        # Everything that doesn't depend on the transport to the server.
+        self._client_encoding = "utf8"
+        self._commands_with_count = (
+            b("INSERT"), b("DELETE"), b("UPDATE"), b("MOVE"),
+            b("FETCH"), b("COPY"), b("SELECT"))
+        self._lock = threading.Lock()
+
+        if user is None:
+            raise InterfaceError(
+                "The 'user' connection parameter cannot be None")
+
+        if isinstance(user, text_type):
+            self.user = user.encode('utf8')
+        else:
+            self.user = user
+
+        if isinstance(password, text_type):
+            self.password = password.encode('utf8')
+        else:
+            self.password = password
+
+        self.autocommit = False
+        self.fetch_size = fetch_size
+        self.row_factory = row_factory
+        self.prepare_threshold = prepare_threshold
+        self.single_round_trip = False
+        self._xid = None
+
+        # The number of times that each statement that isn't prepared has
+        # been run, for prepare_threshold.
+        self._executions = OrderedDict()
+
+        # The type oids of the result columns of statements run with the
+        # unnamed statement, for single_round_trip.
+        self._result_types = OrderedDict()
+
+        self.statement_cache = StatementCache(
+            max_prepared_statements, self._evict_statement)
+        self._statements_to_close = []
+        self._suspended_portals = 0
+        self._transactions_ended = 0
+
+        # The FETCH statements prepared for each named cursor, which are
+        # evicted when the name is used for a new query as the rows they
+        # return will have changed.
+        self._fetch_statements = defaultdict(set)
+        self._pipeline = None
+
+        # Whether a COPY started by copy_out_rows() is still being read.
+        self._copy_out = False
+        self.statement_number = 0
+        self.portal_number = 0
+
         self._backend_key_data = None
 
         ##
@@ -1351,31 +2414,13 @@ class Connection(object):
         def unknown_out(v):
             return str(v).encode(self._client_encoding)
 
-        trans_tab = dict(zip(map(ord, u('{}')), u('[]')))
-        glbls = {'Decimal': Decimal}
-
-        def array_in(data, idx, length):
-            arr = []
-            prev_c = None
-            for c in data[idx:idx+length].decode(
-                    self._client_encoding).translate(
-                    trans_tab).replace(u('NULL'), u('None')):
-                if c not in ('[', ']', ',', 'N') and prev_c in ('[', ','):
-                    arr.extend("Decimal('")
-                elif c in (']', ',') and prev_c not in ('[', ']', ',', 'e'):
-                    arr.extend("')")
-
-                arr.append(c)
-                prev_c = c
-            return eval(''.join(arr), glbls)
-
         def array_recv(data, idx, length):
             final_idx = idx + length
             dim, hasnull, typeoid = iii_unpack(data, idx)
             idx += 12
 
             # get type conversion method for typeoid
-            conversion = self.pg_types[typeoid][1]
+            conversion = self._binary_recv_func(typeoid)
 
             # Read dimension info
             dim_lengths = []
@@ -1384,15 +2429,21 @@ class Connection(object):
                 idx += 8
 
             # Read all array values
-            values = []
-            while idx < final_idx:
-                element_len, = i_unpack(data, idx)
-                idx += 4
-                if element_len == -1:
-                    values.append(None)
-                else:
-                    values.append(conversion(data, idx, element_len))
-                    idx += element_len
+            if self.speedup_kinds is None:
+                values = []
+                while idx < final_idx:
+                    element_len, = i_unpack(data, idx)
+                    idx += 4
+                    if element_len == -1:
+                        values.append(None)
+                    else:
+                        values.append(conversion(data, idx, element_len))
+                        idx += element_len
+            else:
+                values = _speedups.array_values(
+                    data, idx, final_idx,
+                    self.speedup_kinds.get(conversion, _speedups.CALL),
+                    conversion, self._client_encoding)
 
             # at this point, {{1,2,3},{4,5,6}}::int[][] looks like
             # [1,2,3,4,5,6]. go through the dimensions and fix up the array
@@ -1401,9 +2452,18 @@ class Connection(object):
                 values = list(map(list, zip(*[iter(values)] * length)))
             return values
 
-        def vector_in(data, idx, length):
-            return eval('[' + data[idx:idx+length].decode(
-                self._client_encoding).replace(' ', ',') + ']')
+        def array_in(element_oid):
+            # Returns a function that receives the text format of an array of
+            # the type element_oid.
+            def element_in(v):
+                data = v.encode(self._client_encoding)
+                return self.pg_types[element_oid][1](data, 0, len(data))
+
+            def array_in_elements(data, offset, length):
+                return array_parse(
+                    bytes(data[offset:offset + length]).decode(
+                        self._client_encoding), element_in)
+            return array_in_elements
 
         if PY2:
             def text_recv(data, offset, length):
@@ -1429,32 +2489,54 @@ class Connection(object):
                 return loads(
                     str(data[offset: offset + length], self._client_encoding))
 
-        def time_in(data, offset, length):
-            hour = int(data[offset:offset + 2])
-            minute = int(data[offset + 3:offset + 5])
-            sec = Decimal(
-                data[offset + 6:offset + length].decode(self._client_encoding))
-            return datetime.time(
-                hour, minute, int(sec), int((sec - int(sec)) * 1000000))
-
-        def date_in(data, offset, length):
-            year_str = data[offset:offset + 4].decode(self._client_encoding)
-            if year_str == 'infi':
-                return datetime.date.max
-            elif year_str == '-inf':
-                return datetime.date.min
-            else:
-                return datetime.date(
-                    int(year_str), int(data[offset + 5:offset + 7]),
-                    int(data[offset + 8:offset + 10]))
+        # The binary format of jsonb is a version number byte, followed by the
+        # text of the value.
+        def jsonb_recv(data, offset, length):
+            return json_in(data, offset + 1, length - 1)
 
         def numeric_in(data, offset, length):
             return Decimal(
-                data[offset: offset + length].decode(self._client_encoding))
+                bytes(data[offset: offset + length]).decode(
+                    self._client_encoding))
 
         def numeric_out(d):
             return str(d).encode(self._client_encoding)
 
+        # The receive functions for binary types with a fixed width, whose
+        # values are decoded by a struct format character, for
+        # _make_row_decoder().
+        self.fixed_width_formats = {
+            bool_recv: '?',
+            int2_recv: 'h',
+            int4_recv: 'i',
+            int8_recv: 'q',
+            float4_recv: 'f',
+            float8_recv: 'd',
+            oid_recv: 'I',
+        }
+
+        # The kinds of column that the _speedups extension decodes itself,
+        # by receive function. Columns with other receive functions are
+        # decoded by calling the function.
+        if _speedups is None:
+            self.speedup_kinds = None
+        else:
+            self.speedup_kinds = {
+                bool_recv: _speedups.BOOL,
+                int2_recv: _speedups.INT2,
+                int4_recv: _speedups.INT4,
+                int8_recv: _speedups.INT8,
+                float4_recv: _speedups.FLOAT4,
+                float8_recv: _speedups.FLOAT8,
+                oid_recv: _speedups.OID,
+                text_recv: _speedups.TEXT,
+                bytea_recv: _speedups.BYTEA,
+                date_recv: _speedups.DATE,
+                timestamp_recv_integer: _speedups.TIMESTAMP,
+                timestamptz_recv_integer: _speedups.TIMESTAMPTZ,
+                interval_recv_integer: _speedups.INTERVAL,
+            }
+
         self.pg_types = defaultdict(
             lambda: (FC_TEXT, text_recv), {
                 16: (FC_BINARY, bool_recv),  # boolean
@@ -1462,39 +2544,52 @@ class Connection(object):
                 19: (FC_BINARY, text_recv),  # name type
                 20: (FC_BINARY, int8_recv),  # int8
                 21: (FC_BINARY, int2_recv),  # int2
-                22: (FC_TEXT, vector_in),  # int2vector
+                22: (FC_BINARY, array_recv),  # int2vector
                 23: (FC_BINARY, int4_recv),  # int4
                 25: (FC_BINARY, text_recv),  # TEXT type
-                26: (FC_TEXT, int_in),  # oid
-                28: (FC_TEXT, int_in),  # xid
-                114: (FC_TEXT, json_in),  # json
+                26: (FC_BINARY, oid_recv),  # oid
+                28: (FC_BINARY, oid_recv),  # xid
+                114: (FC_BINARY, json_in),  # json
                 700: (FC_BINARY, float4_recv),  # float4
                 701: (FC_BINARY, float8_recv),  # float8
                 705: (FC_BINARY, text_recv),  # unknown
                 829: (FC_TEXT, text_recv),  # MACADDR type
+                30: (FC_BINARY, array_recv),  # oidvector
+                199: (FC_BINARY, array_recv),  # JSON[]
                 1000: (FC_BINARY, array_recv),  # BOOL[]
                 1003: (FC_BINARY, array_recv),  # NAME[]
                 1005: (FC_BINARY, array_recv),  # INT2[]
                 1007: (FC_BINARY, array_recv),  # INT4[]
                 1009: (FC_BINARY, array_recv),  # TEXT[]
+                1011: (FC_BINARY, array_recv),  # XID[]
                 1014: (FC_BINARY, array_recv),  # CHAR[]
                 1015: (FC_BINARY, array_recv),  # VARCHAR[]
                 1016: (FC_BINARY, array_recv),  # INT8[]
+                1028: (FC_BINARY, array_recv),  # OID[]
                 1021: (FC_BINARY, array_recv),  # FLOAT4[]
                 1022: (FC_BINARY, array_recv),  # FLOAT8[]
                 1042: (FC_BINARY, text_recv),  # CHAR type
                 1043: (FC_BINARY, text_recv),  # VARCHAR type
-                1082: (FC_TEXT, date_in),  # date
-                1083: (FC_TEXT, time_in),
+                1082: (FC_BINARY, date_recv),  # date
+                1083: (FC_BINARY, time_recv_integer),  # time
+                1115: (FC_BINARY, array_recv),  # TIMESTAMP[]
+                1182: (FC_BINARY, array_recv),  # DATE[]
+                1183: (FC_BINARY, array_recv),  # TIME[]
+                1185: (FC_BINARY, array_recv),  # TIMESTAMPTZ[]
+                1187: (FC_BINARY, array_recv),  # INTERVAL[]
                 1114: (FC_BINARY, timestamp_recv_float),  # timestamp w/ tz
                 1184: (FC_BINARY, timestamptz_recv_float),
                 1186: (FC_BINARY, interval_recv_integer),
-                1231: (FC_TEXT, array_in),  # NUMERIC[]
+                1231: (FC_BINARY, array_recv),  # NUMERIC[]
                 1263: (FC_BINARY, array_recv),  # cstring[]
+                1266: (FC_BINARY, timetz_recv_integer),  # time w/ tz
+                1270: (FC_BINARY, array_recv),  # TIMETZ[]
                 1700: (FC_TEXT, numeric_in),  # NUMERIC
                 2275: (FC_BINARY, text_recv),  # cstring
                 2950: (FC_BINARY, uuid_recv),  # uuid
-                3802: (FC_TEXT, json_in),  # jsonb
+                2951: (FC_BINARY, array_recv),  # UUID[]
+                3802: (FC_BINARY, jsonb_recv),  # jsonb
+                3807: (FC_BINARY, array_recv),  # JSONB[]
             })
 
         self.py_types = {
@@ -1513,6 +2608,33 @@ class Connection(object):
             UUID: (2950, FC_BINARY, uuid_send),  # uuid
         }
 
+        # The functions that receive types in the binary format, for array
+        # elements and COPY, where pg_types has a text format function.
+        self.pg_binary_recv = {
+            1700: numeric_recv,  # NUMERIC
+        }
+
+        # The functions that send each type in the binary format, for COPY.
+        self.pg_binary_send = {
+            16: bool_send,  # boolean
+            17: bytea_send,  # bytea
+            19: text_out,  # name type
+            20: q_pack,  # int8
+            21: h_pack,  # int2
+            23: i_pack,  # int4
+            25: text_out,  # TEXT type
+            700: f_pack,  # float4
+            701: d_pack,  # float8
+            1042: text_out,  # CHAR type
+            1043: text_out,  # VARCHAR type
+            1082: date_send,  # date
+            1114: timestamp_send_integer,  # timestamp
+            1184: timestamptz_send_integer,  # timestamp w/ tz
+            1186: interval_send_integer,  # interval
+            1700: numeric_send,  # NUMERIC
+            2950: uuid_send,  # uuid
+        }
+
         self.inspect_funcs = {
             datetime.datetime: self.inspect_datetime,
             list: self.array_inspect,
@@ -1538,7 +2660,7 @@ class Connection(object):
                 return str(v).encode(self._client_encoding)
 
             def inet_in(data, offset, length):
-                inet_str = data[offset: offset + length].decode(
+                inet_str = bytes(data[offset: offset + length]).decode(
                     self._client_encoding)
                 if '/' in inet_str:
                     return ip_network(inet_str, False)
@@ -1550,6 +2672,7 @@ class Connection(object):
             self.py_types[IPv4Network] = (869, FC_TEXT, inet_out)  # inet
             self.py_types[IPv6Network] = (869, FC_TEXT, inet_out)  # inet
             self.pg_types[869] = (FC_TEXT, inet_in)  # inet
+            self.pg_types[1041] = (FC_TEXT, array_in(869))  # INET[]
         except ImportError:
             pass
 
@@ -1576,6 +2699,11 @@ class Connection(object):
             COPY_IN_RESPONSE: self.handle_COPY_IN_RESPONSE,
             COPY_OUT_RESPONSE: self.handle_COPY_OUT_RESPONSE}
 
+        self.in_transaction = False
+        self.notifies = []
+        self.notifies_lock = threading.Lock()
+
+    def _startup_message(self, database, application_name):
         # Int32 - Message length, including self.
         # Int32(196608) - Protocol version number.  Version 3.0.
         # Any number of key/value pairs, terminated by a zero byte:
@@ -1594,29 +2722,7 @@ class Connection(object):
             val.extend(b("application_name\x00") + application_name +
                        NULL_BYTE)
         val.append(0)
-        self._write(i_pack(len(val) + 4))
-        self._write(val)
-        self._flush()
-
-        self._cursor = self.cursor()
-        with self._lock:
-            try:
-                code = self.error = None
-                while code not in (READY_FOR_QUERY, ERROR_RESPONSE):
-                    code, data_len = ci_unpack(self._read(5))
-                    self.message_types[code](self._read(data_len - 4), None)
-                if self.error is not None:
-                    raise self.error
-            except Exception as e:
-                try:
-                    self._close()
-                except Exception:
-                    pass
-                raise e
-
-        self.in_transaction = False
-        self.notifies = []
-        self.notifies_lock = threading.Lock()
+        return i_pack(len(val) + 4) + val
 
     def handle_ERROR_RESPONSE(self, data, ps):
         msg = OrderedDict(
@@ -1680,7 +2786,26 @@ class Connection(object):
             raise InterfaceError(
                 "An input stream is required for the COPY IN response.")
 
-        if PY2:
+        if not hasattr(ps.stream, 'read'):
+            # An iterable of chunks of data, from copy_rows()
+            try:
+                for chunk in ps.stream:
+                    self._write(COPY_DATA + i_pack(len(chunk) + 4))
+                    self._write(chunk)
+                    self._flush()
+            except Exception as e:
+                # Send CopyFail, so that the server abandons the COPY
+                # Byte1('f') - Identifier.
+                # Int32 - Message length, including self.
+                # String - The reason for the failure.
+                self._send_message(
+                    COPY_FAIL,
+                    str(e).encode(self._client_encoding, 'replace') +
+                    NULL_BYTE)
+                self._write(SYNC_MSG)
+                self._flush()
+                return
+        elif PY2:
             while True:
                 data = ps.stream.read(8192)
                 if not data:
@@ -1726,14 +2851,68 @@ class Connection(object):
         with self.notifies_lock:
             self.notifies.append((backend_pid, condition))
 
-    def cursor(self):
+    def cursor(self, name=None):
         """Creates a :class:`Cursor` object bound to this
         connection.
 
         This function is part of the `DBAPI 2.0 specification
         <http://www.python.org/dev/peps/pep-0249/>`_.
+
+        :param name:
+            If a name is given, a named cursor is created. This is a pg8000
+            extension. When a query is executed with a named cursor, it's
+            declared as a cursor on the server with ``DECLARE``, and the rows
+            are fetched from it with ``FETCH``, :attr:`~Cursor.fetch_size` rows
+            at a time, as they're read from the cursor. This means that a
+            result of any size can be read using a bounded amount of memory.
+
+            With autocommit off, the cursor lasts until the end of the
+            transaction. With autocommit on, it's declared ``WITH HOLD`` and
+            lasts until the cursor is closed.
+
+            A named cursor can't be used for :meth:`~Cursor.executemany`, in a
+            pipeline, or with the ``COPY`` command.
         """
-        return Cursor(self)
+        return Cursor(self, name)
+
+    def pipeline(self):
+        """Creates a :class:`Pipeline` object bound to this connection, for use
+        as a context manager::
+
+            with conn.pipeline():
+                cursor_a.execute("SELECT name FROM book WHERE id = %s", (1,))
+                cursor_b.execute("SELECT name FROM author WHERE id = %s", (2,))
+            print(cursor_a.fetchone(), cursor_b.fetchone())
+
+        Inside the ``with`` block, statements executed on cursors of this
+        connection are queued up, and are then all sent to the server together
+        when the block exits.
+
+        This function is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+        :rtype: :class:`Pipeline`
+        """
+        return Pipeline(self)
+
+    def prepare(self, operation):
+        """Creates a :class:`PreparedStatement` for running a query many
+        times with as little overhead as possible::
+
+            statement = conn.prepare("SELECT name FROM book WHERE id = %s")
+            for i in range(1000):
+                print(statement.execute((i,)).fetchone())
+
+        This function is not part of the DBAPI standard; it is a pg8000
+        extension.
+
+        :param operation:
+            The SQL statement, with placeholders in the :data:`paramstyle`
+            that's in use when the prepared statement is created.
+
+        :rtype: :class:`PreparedStatement`
+        """
+        return PreparedStatement(self, operation)
 
     def commit(self):
         """Commits the current database transaction.
@@ -1742,6 +2921,8 @@ class Connection(object):
         <http://www.python.org/dev/peps/pep-0249/>`_.
         """
         with self._lock:
+            if self._pipeline is not None:
+                self._pipeline._sync()
             self.execute(self._cursor, "commit", None)
 
     def rollback(self):
@@ -1751,11 +2932,19 @@ class Connection(object):
         <http://www.python.org/dev/peps/pep-0249/>`_.
         """
         with self._lock:
+            if self._pipeline is not None:
+                # Any errors are available from the pipeline, and a rollback
+                # is the usual response to them anyway.
+                try:
+                    self._pipeline._sync()
+                except ProgrammingError:
+                    pass
             if not self.in_transaction:
                 return
             self.execute(self._cursor, "rollback", None)
 
     def _close(self):
+        self._copy_out = False
         try:
             # Byte1('X') - Identifies the message as a terminate message.
             # Int32(4) - Message length, including self.
@@ -1781,6 +2970,51 @@ class Connection(object):
         with self._lock:
             self._close()
 
+    def _cancel_request(self):
+        # Int32 - Message length, including self.
+        # Int32(80877102) - The cancel request code.
+        # Int32 - The process ID of the backend.
+        # Int32 - The secret key of the backend.
+        if self._sock is None:
+            raise InterfaceError("connection is closed")
+        if self._backend_key_data is None:
+            raise InterfaceError("the server hasn't sent a cancellation key")
+        key_data = self._backend_key_data
+        return ii_pack(8 + len(key_data), 80877102) + key_data
+
+    def cancel(self):
+        """Asks the server to cancel the statement that the connection is
+        running. The request is sent over a separate connection to the server,
+        and the connection's lock isn't taken, so it can be called from
+        another thread while a statement is running. The separate connection
+        times out after 10 seconds, raising :exc:`OperationalError`. A
+        cancelled statement raises a :exc:`ProgrammingError` with the SQLSTATE
+        code ``57014`` in the thread that's running it. If the connection
+        isn't running a statement by the time the server gets the request,
+        nothing happens.
+
+        This function is not part of the DBAPI standard; it is a pg8000
+        extension.
+        """
+        request = self._cancel_request()
+        if self._unix_sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = (self._host, self._port)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self._unix_sock
+        try:
+            sock.settimeout(CANCEL_TIMEOUT)
+            sock.connect(address)
+            sock.sendall(request)
+            # The server closes the connection once it's handled the
+            # request, without replying.
+            sock.recv(1)
+        except socket.error as e:
+            raise OperationalError(str(e))
+        finally:
+            sock.close()
+
     def handle_AUTHENTICATION_REQUEST(self, data, cursor):
         assert self._lock.locked()
         # Int32 -   An authentication code that represents different
@@ -1841,6 +3075,10 @@ class Connection(object):
     def handle_READY_FOR_QUERY(self, data, ps):
         # Byte1 -   Status indicator.
         self.in_transaction = data != IDLE
+        if not self.in_transaction:
+            # Portals don't outlive the transaction they were created in.
+            self._suspended_portals = 0
+            self._transactions_ended += 1
 
     def handle_BACKEND_KEY_DATA(self, data, ps):
         self._backend_key_data = data
@@ -1881,113 +3119,581 @@ class Connection(object):
             field['pg8000_fc'], field['func'] = \
                 self.pg_types[field['type_oid']]
 
-    def execute(self, cursor, operation, vals):
+        result_types = cursor.ps.get('result_types')
+        if result_types is not None:
+            self._check_result_types(cursor.ps, result_types)
+
+    def execute(self, cursor, operation, vals, prepare=None):
+        key, statement, params, args = self._lookup_statement(operation, vals)
+        if not self._use_unnamed(key, prepare):
+            ps = self._prepare(cursor, key, statement, params)
+            self._send_bind_execute(cursor, ps, args)
+        elif self.single_round_trip and key in self._result_types:
+            self._send_unnamed(cursor, key, statement, params, args)
+        else:
+            ps = self._parse(cursor, statement, params, named=False)
+            self._remember_result_types(key, ps)
+            self._send_bind_execute(cursor, ps, args)
+        self._finish_execute(cursor)
+
+    def _use_unnamed(self, key, prepare):
+        # Returns whether a statement is run with the unnamed statement,
+        # rather than being prepared or found in the statement cache.
+        if prepare is None:
+            threshold = self.prepare_threshold
+            if threshold == 0 or key in self.statement_cache:
+                return False
+            elif threshold is None:
+                return True
+
+            # Once a statement is prepared it's no longer counted, so if it's
+            # evicted from the cache it starts again with the unnamed one.
+            executions = self._executions
+            count = executions.pop(key, 0) + 1
+            if count > threshold:
+                return False
+            executions[key] = count
+            if len(executions) > MAX_EXECUTION_COUNTS:
+                executions.popitem(last=False)
+            return True
+        else:
+            return not prepare and key not in self.statement_cache
+
+    def _remember_result_types(self, key, ps):
+        if self.single_round_trip:
+            self._result_types.pop(key, None)
+            self._result_types[key] = tuple(
+                col['type_oid'] for col in ps['row_desc'])
+            if len(self._result_types) > MAX_EXECUTION_COUNTS:
+                self._result_types.popitem(last=False)
+
+    def _send_unnamed(self, cursor, key, statement, params, args):
+        # Sends the Parse of the unnamed statement along with the Bind,
+        # Describe and Execute of a portal, so that the statement is run in a
+        # single round trip. The formats of the result columns are chosen
+        # from the types they had the last time the statement was run, in the
+        # same way as for a prepared statement, and the Describe of the
+        # portal gives the row description.
+        result_types = self._result_types.pop(key)
+        self._result_types[key] = result_types
+        output_fc = tuple(self.pg_types[oid][0] for oid in result_types)
+        ps = self._send_parse(statement, params, named=False, describe=False)
+        ps['bind_1'] = self._make_bind_1(ps, params)
+        ps['bind_2'] = h_pack(len(output_fc)) + \
+            pack("!" + "h" * len(output_fc), *output_fc)
+        ps['result_types'] = result_types
+        cursor.ps = ps
+        self._send_bind_execute(cursor, ps, args, describe=True)
+
+    def _check_result_types(self, ps, result_types):
+        # The result types of a statement sent by _send_unnamed() can only
+        # differ from last time if the schema has been changed by another
+        # connection since. If the formats that were asked for don't suit the
+        # new types, the values can't be decoded, although the statement has
+        # run.
+        ps['input_funcs'] = tuple(col['func'] for col in ps['row_desc'])
+        if tuple(col['type_oid'] for col in ps['row_desc']) == result_types:
+            return
+        self._result_types.clear()
+        for col in ps['row_desc']:
+            if col['format'] != col['pg8000_fc']:
+                self.error = OperationalError(
+                    "The result types of the statement have changed since it "
+                    "was last run, so its results can't be decoded. The "
+                    "statement has been run.")
+                return
+
+    def execute_prepared(self, cursor, prepared, vals):
+        # The statement on the server that the prepared statement used last
+        # time is used again if it's still open and the types of the
+        # parameters are the same, and it's marked as recently used in the
+        # statement cache. Types whose parameters depend on the value, such as
+        # datetime and list, always go through make_params().
         if vals is None:
             vals = ()
-        paramstyle = pg8000.paramstyle
-        cache = self._caches[paramstyle]
+        args = prepared._make_args(vals)
+        types = tuple(map(type, args))
+        ps = prepared._ps
+        if types != prepared._types or ps['closed']:
+            params = self.make_params(args)
+            key = (prepared._statement, params)
+            ps = self._prepare(cursor, key, prepared._statement, params)
+            if all(typ in self.py_types for typ in types):
+                prepared._types, prepared._key, prepared._ps = types, key, ps
+            else:
+                prepared._types = None
+        else:
+            self.statement_cache.touch(prepared._key)
+            cursor.ps = ps
+        self._send_bind_execute(cursor, ps, args)
+        self._finish_execute(cursor)
+
+    def _finish_execute(self, cursor):
+        self._flush()
+        self.handle_messages(cursor)
+        if cursor.portal_suspended:
+            self._suspended_portals += 1
+        else:
+            self.close_portal(cursor)
+
+    def _send_bind_execute(self, cursor, ps, args, describe=False):
+        cursor._cached_rows.clear()
+        cursor._row_count = -1
+        cursor.portal_name = "pg8000_portal_" + str(self.portal_number)
+        self.portal_number += 1
+        cursor.portal_name_bin = cursor.portal_name.encode('ascii') + NULL_BYTE
+
+        # Outside of a transaction, the portal would be closed by the Sync
+        # at the end of the Execute, so all the rows have to be fetched. The
+        # FETCH of a named cursor already limits the rows.
+        if self.in_transaction and cursor.name is None:
+            fetch_size = cursor.fetch_size
+        else:
+            fetch_size = 0
+        cursor.execute_msg = cursor.portal_name_bin + i_pack(fetch_size)
+
+        self._send_message(
+            BIND, self._make_bind(cursor.portal_name_bin, ps, args))
+        if describe:
+            self._send_message(DESCRIBE, PORTAL + cursor.portal_name_bin)
+        self.send_EXECUTE(cursor)
+        self._write(SYNC_MSG)
+
+    def declare(self, cursor, operation, args, prepare=None):
+        if cursor._declared:
+            self.close_named(cursor)
+
+        name = quote_identifier(cursor.name)
+        for key in self._fetch_statements.pop(cursor.name, ()):
+            self.statement_cache.discard(key)
+        cursor._hold = self.autocommit
+        self.execute(
+            cursor,
+            "DECLARE " + name + " NO SCROLL CURSOR " +
+            ("WITH HOLD " if cursor._hold else "") + "FOR " + operation,
+            args, prepare)
+        cursor._declared = True
+        cursor._declared_in = self._transactions_ended
+        cursor._more_rows = True
+        self.fetch_named(cursor)
+
+    def fetch_named(self, cursor):
+        name = quote_identifier(cursor.name)
+        if cursor.fetch_size > 0:
+            fetch = "FETCH FORWARD " + str(cursor.fetch_size) + " FROM " + name
+        else:
+            fetch = "FETCH ALL FROM " + name
+        self._fetch_statements[cursor.name].add(
+            self._lookup_statement(fetch, None)[0])
+        self.execute(cursor, fetch, None)
+        cursor._more_rows = 0 < cursor.fetch_size <= cursor._row_count
+        cursor._row_count = -1
 
+    def _fetch_more(self, cursor):
+        # Fetches the next lot of rows of a cursor, from a suspended portal or
+        # a named cursor.
+        if cursor.portal_suspended:
+            self.send_EXECUTE(cursor)
+            self._write(SYNC_MSG)
+            self._flush()
+            self.handle_messages(cursor)
+            if not cursor.portal_suspended:
+                self._suspended_portals -= 1
+                self.close_portal(cursor)
+        elif cursor._more_rows:
+            if not self.in_transaction and not self.autocommit:
+                self.execute(cursor, "begin transaction", None)
+            self.fetch_named(cursor)
+
+    def fetch_raw(self, cursor, data_row):
+        # Fetches the next lot of rows of a cursor, passing the contents of
+        # each DataRow message to data_row() rather than decoding it into a
+        # row. The contents are only valid until the next message is read.
+        # Returns False if there were no more rows to fetch.
+        if not (cursor.portal_suspended or cursor._more_rows):
+            return False
+        handle_DATA_ROW = self.message_types[DATA_ROW]
+        self.message_types[DATA_ROW] = lambda data, cursor: data_row(data)
         try:
-            statement, make_args = cache['statement'][operation]
-        except KeyError:
-            statement, make_args = convert_paramstyle(paramstyle, operation)
-            cache['statement'][operation] = statement, make_args
+            self._fetch_more(cursor)
+        finally:
+            self.message_types[DATA_ROW] = handle_DATA_ROW
+        return True
+
+    def close_named(self, cursor):
+        # A cursor that isn't WITH HOLD is closed by the end of the
+        # transaction it was declared in. It's an error to close a cursor
+        # that doesn't exist.
+        cursor._declared = cursor._more_rows = False
+        if cursor._hold or (
+                self.in_transaction and
+                cursor._declared_in == self._transactions_ended):
+            name = quote_identifier(cursor.name)
+            try:
+                self.execute(cursor, "CLOSE " + name, None)
+            except ProgrammingError:
+                if not cursor._hold:
+                    raise
+
+    def _binary_recv_func(self, oid):
+        # Returns the function that receives a type in the binary format, or
+        # raises KeyError if there isn't one.
+        fc, recv_func = self.pg_types[oid]
+        if fc == FC_BINARY:
+            return recv_func
+        else:
+            return self.pg_binary_recv[oid]
+
+    def copy_rows(self, cursor, table, columns, rows):
+        # The types of the columns are found from the row description of a
+        # query that returns no rows.
+        columns = ', '.join(quote_identifier(col) for col in columns)
+        self.execute(
+            cursor, "SELECT " + columns + " FROM " + table + " LIMIT 0", None)
+        send_funcs = []
+        for col in cursor.ps['row_desc']:
+            try:
+                send_funcs.append(self.pg_binary_send[col['type_oid']])
+            except KeyError:
+                raise NotSupportedError(
+                    "The type of column " + repr(col['name']) + " with oid " +
+                    str(col['type_oid']) + " can't be sent in the binary "
+                    "COPY format.")
+
+        errors = []
+        names = [
+            col['name'].decode(self._client_encoding)
+            for col in cursor.ps['row_desc']]
+        cursor.stream = self._copy_chunks(rows, names, send_funcs, errors)
+        try:
+            self.execute(
+                cursor,
+                "COPY " + table + " (" + columns + ") FROM STDIN WITH BINARY",
+                None)
+        except ProgrammingError:
+            # Raise the error that made the COPY fail, rather than the error
+            # from the server saying that it failed.
+            if len(errors) > 0:
+                raise errors[0]
+            raise
+        finally:
+            cursor.stream = None
+
+    def copy_out_rows(self, cursor, query):
+        # The query is prepared to find the types of its columns
+        key, statement, params, args = self._lookup_statement(query, None)
+        ps = self._prepare(cursor, key, statement, params)
+        recv_funcs = []
+        for col in ps['row_desc']:
+            try:
+                recv_funcs.append(self._binary_recv_func(col['type_oid']))
+            except KeyError:
+                raise NotSupportedError(
+                    "The type of column " + repr(col['name']) + " with oid " +
+                    str(col['type_oid']) + " can't be received in the binary "
+                    "COPY format.")
+        make_row = cursor.row_factory(
+            [col['name'].decode(self._client_encoding)
+             for col in ps['row_desc']])
+
+        key, statement, params, args = self._lookup_statement(
+            "COPY (" + query + ") TO STDOUT WITH BINARY", None)
+        ps = self._prepare(cursor, key, statement, params)
+        cursor._cached_rows.clear()
+        cursor._row_count = -1
+        self._send_message(BIND, self._make_bind(NULL_BYTE, ps, args))
+        self._send_message(EXECUTE, NULL_BYTE + i_pack(0))
+        self._write(SYNC_MSG)
+        self._flush()
+
+        # Each CopyData message is decoded and its rows yielded as a list as
+        # soon as it's read, rather than reading all the messages up to
+        # ReadyForQuery as handle_messages() does. Until then nothing else
+        # can be sent, see _flush().
+        code = self.error = None
+        self._copy_out = True
+        try:
+            while code != READY_FOR_QUERY:
+                code, data = self._read_message()
+                if code == COPY_DATA:
+                    yield [
+                        make_row(row) for row in
+                        self._copy_out_decode(data, recv_funcs)]
+                elif code != COPY_OUT_RESPONSE:
+                    self.message_types[code](data, cursor)
+        except GeneratorExit:
+            # Iteration has stopped early, so discard the rest of the COPY
+            # to leave the connection ready for the next query.
+            while code != READY_FOR_QUERY:
+                code, data = self._read_message()
+                if code not in (COPY_DATA, COPY_OUT_RESPONSE):
+                    self.message_types[code](data, cursor)
+            raise
+        except EOFError:
+            self.error = OperationalError("No data to read from socket")
+        except (socket.error, struct.error) as e:
+            self.error = OperationalError(str(e))
+        except Exception:
+            self._close()
+            raise
+        finally:
+            self._copy_out = False
+
+        if self.error is not None:
+            raise self.error
+
+    def _copy_out_decode(self, data, recv_funcs):
+        # The first CopyData message may start with the header, which is the
+        # signature, a flags field, and a header extension area.
+        idx = 0
+        if data[:11] == COPY_BINARY_SIGNATURE:
+            idx = 19 + i_unpack(data, 15)[0]
+
+        rows = []
+        data_len = len(data)
+        while idx < data_len:
+            num_fields = h_unpack(data, idx)[0]
+            idx += 2
+            if num_fields == -1:
+                break
+            row = []
+            for recv_func in recv_funcs:
+                vlen = i_unpack(data, idx)[0]
+                idx += 4
+                if vlen == -1:
+                    row.append(None)
+                else:
+                    row.append(recv_func(data, idx, vlen))
+                    idx += vlen
+            rows.append(row)
+        return rows
+
+    def _copy_chunks(self, rows, names, send_funcs, errors):
+        num_cols = len(send_funcs)
+        row_header = h_pack(num_cols)
+        chunk = bytearray(COPY_BINARY_HEADER)
+        try:
+            for row in rows:
+                if len(row) != num_cols:
+                    raise ProgrammingError(
+                        "Expected " + str(num_cols) + " values in each row, "
+                        "but got " + str(len(row)) + ".")
+                chunk.extend(row_header)
+                for value, name, send_func in zip(row, names, send_funcs):
+                    if value is None:
+                        chunk.extend(NULL)
+                    else:
+                        try:
+                            data = send_func(value)
+                        except (struct.error, OverflowError) as e:
+                            raise DataError(
+                                "The value " + repr(value) + " can't be "
+                                "sent for column " + repr(name) + ": " +
+                                str(e))
+                        chunk.extend(i_pack(len(data)))
+                        chunk.extend(data)
+                if len(chunk) >= COPY_CHUNK_SIZE:
+                    yield chunk
+                    chunk = bytearray()
+            chunk.extend(COPY_BINARY_TRAILER)
+            yield chunk
+        except Exception as e:
+            errors.append(e)
+            raise
+
+    def executemany(self, cursor, operation, param_sets, batch_size):
+        # The statement is prepared once, and then a Bind / Execute pair is
+        # written for each parameter set without waiting for the server to
+        # reply. A single Sync ends each batch of batch_size parameter sets,
+        # and the replies for the whole batch are then read in one go. The
+        # unnamed portal is used, as each Bind to it replaces the previous
+        # one, and we ask for all the rows at once so it never suspends.
+        cursor._cached_rows.clear()
+        cursor._row_count = -1
+        execute_msg = NULL_BYTE + i_pack(0)
+        key = ps = None
+        pending = 0
+        try:
+            for vals in param_sets:
+                new_key, statement, params, args = self._lookup_statement(
+                    operation, vals)
+
+                # A change in the types of the parameters means a different
+                # prepared statement. If it's already prepared and its rows
+                # are decoded in the same way, it can go in the same batch.
+                # Otherwise preparing it needs a round trip of its own, or
+                # the rows of the batch so far would be decoded wrongly, so
+                # the batch so far must be sent first.
+                if new_key != key:
+                    key = new_key
+                    try:
+                        new_ps = self.statement_cache.get(key)
+                    except KeyError:
+                        new_ps = None
+
+                    if pending > 0 and (
+                            new_ps is None or
+                            new_ps['input_funcs'] != ps['input_funcs']):
+                        pending = 0
+                        self._write(SYNC_MSG)
+                        self._flush()
+                        self.handle_messages(cursor)
+
+                    if new_ps is None:
+                        ps = self._prepare(cursor, key, statement, params)
+                    else:
+                        ps = cursor.ps = new_ps
+
+                self._send_message(BIND, self._make_bind(NULL_BYTE, ps, args))
+                self._send_message(EXECUTE, execute_msg)
+                pending += 1
+
+                if pending >= batch_size:
+                    pending = 0
+                    self._write(SYNC_MSG)
+                    self._flush()
+                    self.handle_messages(cursor)
 
+            # No parameter sets means no rows affected.
+            if key is None:
+                cursor._row_count = 0
+        finally:
+            # Make sure that anything already written is terminated by a
+            # Sync, otherwise it would be run along with the next query.
+            if pending > 0:
+                self._write(SYNC_MSG)
+                self._flush()
+                self.handle_messages(cursor)
+
+    def _lookup_statement(self, operation, vals):
+        if vals is None:
+            vals = ()
+        statement, make_args = cached_convert_paramstyle(
+            pg8000.paramstyle, operation)
         args = make_args(vals)
         params = self.make_params(args)
-        key = operation, params
+        key = statement, params
+        return key, statement, params, args
 
+    def _prepare(self, cursor, key, statement, params):
         try:
-            ps = cache['ps'][key]
+            ps = self.statement_cache.get(key)
             cursor.ps = ps
+            return ps
         except KeyError:
+            pass
+
+        ps = self._parse(cursor, statement, params)
+        self.statement_cache.put(key, ps)
+        return ps
+
+    def _parse(self, cursor, statement, params, named=True):
+        ps = self._send_parse(statement, params, named)
+        cursor.ps = ps
+        self._write(SYNC_MSG)
+
+        try:
+            self._flush()
+        except AttributeError as e:
+            if self._sock is None:
+                raise InterfaceError("connection is closed")
+            else:
+                raise e
+        except socket.error as e:
+            raise OperationalError(str(e))
+
+        self.handle_messages(cursor)
+        self._complete_parse(ps, params)
+        return ps
+
+    def _evict_statement(self, ps):
+        ps['closed'] = True
+        self._statements_to_close.append(ps['statement_name_bin'])
+
+    def _send_parse(self, statement, params, named=True, describe=True):
+        # Close the statements evicted from the cache. Closing a statement
+        # also closes its portals, so wait until there are no suspended
+        # portals that might belong to one of them.
+        if len(self._statements_to_close) > 0 and \
+                (self._suspended_portals == 0 or not self.in_transaction):
+            for statement_name_bin in self._statements_to_close:
+                self._send_message(CLOSE, STATEMENT + statement_name_bin)
+            del self._statements_to_close[:]
+
+        if named:
             statement_name = "pg8000_statement_" + str(self.statement_number)
             self.statement_number += 1
             statement_name_bin = statement_name.encode('ascii') + NULL_BYTE
-            ps = {
-                'row_desc': [],
-                'param_funcs': tuple(x[2] for x in params),
-            }
-            cursor.ps = ps
+        else:
+            statement_name_bin = NULL_BYTE
+        ps = {
+            'row_desc': [],
+            'param_funcs': tuple(x[2] for x in params),
+            'statement_name_bin': statement_name_bin,
+            'closed': False,
+            'row_decoders': {},
+        }
 
-            param_fcs = tuple(x[1] for x in params)
-
-            # Byte1('P') - Identifies the message as a Parse command.
-            # Int32 -   Message length, including self.
-            # String -  Prepared statement name. An empty string selects the
-            #           unnamed prepared statement.
-            # String -  The query string.
-            # Int16 -   Number of parameter data types specified (can be zero).
-            # For each parameter:
-            #   Int32 - The OID of the parameter data type.
-            val = bytearray(statement_name_bin)
-            val.extend(statement.encode(self._client_encoding) + NULL_BYTE)
-            val.extend(h_pack(len(params)))
-            for oid, fc, send_func in params:
-                # Parse message doesn't seem to handle the -1 type_oid for NULL
-                # values that other messages handle.  So we'll provide type_oid
-                # 705, the PG "unknown" type.
-                val.extend(i_pack(705 if oid == -1 else oid))
-
-            # Byte1('D') - Identifies the message as a describe command.
-            # Int32 - Message length, including self.
-            # Byte1 - 'S' for prepared statement, 'P' for portal.
-            # String - The name of the item to describe.
-            self._send_message(PARSE, val)
+        # Byte1('P') - Identifies the message as a Parse command.
+        # Int32 -   Message length, including self.
+        # String -  Prepared statement name. An empty string selects the
+        #           unnamed prepared statement.
+        # String -  The query string.
+        # Int16 -   Number of parameter data types specified (can be zero).
+        # For each parameter:
+        #   Int32 - The OID of the parameter data type.
+        val = bytearray(statement_name_bin)
+        val.extend(statement.encode(self._client_encoding) + NULL_BYTE)
+        val.extend(h_pack(len(params)))
+        for oid, fc, send_func in params:
+            # Parse message doesn't seem to handle the -1 type_oid for NULL
+            # values that other messages handle.  So we'll provide type_oid
+            # 705, the PG "unknown" type.
+            val.extend(i_pack(705 if oid == -1 else oid))
+
+        # Byte1('D') - Identifies the message as a describe command.
+        # Int32 - Message length, including self.
+        # Byte1 - 'S' for prepared statement, 'P' for portal.
+        # String - The name of the item to describe.
+        self._send_message(PARSE, val)
+        if describe:
             self._send_message(DESCRIBE, STATEMENT + statement_name_bin)
-            self._write(SYNC_MSG)
+        return ps
 
-            try:
-                self._flush()
-            except AttributeError as e:
-                if self._sock is None:
-                    raise InterfaceError("connection is closed")
-                else:
-                    raise e
-            except socket.error as e:
-                raise OperationalError(str(e))
+    def _complete_parse(self, ps, params):
+        # We've got row_desc that allows us to identify what we're
+        # going to get back from this statement.
+        output_fc = tuple(
+            self.pg_types[f['type_oid']][0] for f in ps['row_desc'])
 
-            self.handle_messages(cursor)
-
-            # We've got row_desc that allows us to identify what we're
-            # going to get back from this statement.
-            output_fc = tuple(
-                self.pg_types[f['type_oid']][0] for f in ps['row_desc'])
-
-            ps['input_funcs'] = tuple(f['func'] for f in ps['row_desc'])
-            # Byte1('B') - Identifies the Bind command.
-            # Int32 - Message length, including self.
-            # String - Name of the destination portal.
-            # String - Name of the source prepared statement.
-            # Int16 - Number of parameter format codes.
-            # For each parameter format code:
-            #   Int16 - The parameter format code.
-            # Int16 - Number of parameter values.
-            # For each parameter value:
-            #   Int32 - The length of the parameter value, in bytes, not
-            #           including this length.  -1 indicates a NULL parameter
-            #           value, in which no value bytes follow.
-            #   Byte[n] - Value of the parameter.
-            # Int16 - The number of result-column format codes.
-            # For each result-column format code:
-            #   Int16 - The format code.
-            ps['bind_1'] = statement_name_bin + h_pack(len(params)) + \
-                pack("!" + "h" * len(param_fcs), *param_fcs) + \
-                h_pack(len(params))
-
-            ps['bind_2'] = h_pack(len(output_fc)) + \
-                pack("!" + "h" * len(output_fc), *output_fc)
-
-            cache['ps'][key] = ps
+        ps['input_funcs'] = tuple(f['func'] for f in ps['row_desc'])
+        ps['bind_1'] = self._make_bind_1(ps, params)
+        ps['bind_2'] = h_pack(len(output_fc)) + \
+            pack("!" + "h" * len(output_fc), *output_fc)
 
-        cursor._cached_rows.clear()
-        cursor._row_count = -1
-        cursor.portal_name = "pg8000_portal_" + str(self.portal_number)
-        self.portal_number += 1
-        cursor.portal_name_bin = cursor.portal_name.encode('ascii') + NULL_BYTE
-        cursor.execute_msg = cursor.portal_name_bin + \
-            Connection._row_cache_size_bin
+    def _make_bind_1(self, ps, params):
+        # Byte1('B') - Identifies the Bind command.
+        # Int32 - Message length, including self.
+        # String - Name of the destination portal.
+        # String - Name of the source prepared statement.
+        # Int16 - Number of parameter format codes.
+        # For each parameter format code:
+        #   Int16 - The parameter format code.
+        # Int16 - Number of parameter values.
+        # For each parameter value:
+        #   Int32 - The length of the parameter value, in bytes, not
+        #           including this length.  -1 indicates a NULL parameter
+        #           value, in which no value bytes follow.
+        #   Byte[n] - Value of the parameter.
+        # Int16 - The number of result-column format codes.
+        # For each result-column format code:
+        #   Int16 - The format code.
+        param_fcs = tuple(x[1] for x in params)
+        return ps['statement_name_bin'] + h_pack(len(params)) + \
+            pack("!" + "h" * len(param_fcs), *param_fcs) + \
+            h_pack(len(params))
 
+    def _make_bind(self, portal_name_bin, ps, args):
         # Byte1('B') - Identifies the Bind command.
         # Int32 - Message length, including self.
         # String - Name of the destination portal.
@@ -2004,7 +3710,7 @@ class Connection(object):
         # Int16 - The number of result-column format codes.
         # For each result-column format code:
         #   Int16 - The format code.
-        retval = bytearray(cursor.portal_name_bin + ps['bind_1'])
+        retval = bytearray(portal_name_bin + ps['bind_1'])
         for value, send_func in zip(args, ps['param_funcs']):
             if value is None:
                 val = NULL
@@ -2013,36 +3719,34 @@ class Connection(object):
                 retval.extend(i_pack(len(val)))
             retval.extend(val)
         retval.extend(ps['bind_2'])
-
-        self._send_message(BIND, retval)
-        self.send_EXECUTE(cursor)
-        self._write(SYNC_MSG)
-        self._flush()
-        self.handle_messages(cursor)
-        if cursor.portal_suspended:
-            if self.autocommit:
-                raise InterfaceError(
-                    "With autocommit on, it's not possible to retrieve more "
-                    "rows than the pg8000 cache size, as the portal is closed "
-                    "when the transaction is closed.")
-
-        else:
-            self.close_portal(cursor)
+        return retval
 
     def _send_message(self, code, data):
+        # There's no Flush after each message, as a Sync is always sent before
+        # waiting for the server, and the server sends its replies then.
         try:
             self._write(code)
             self._write(i_pack(len(data) + 4))
             self._write(data)
-            self._write(FLUSH_MSG)
-        except ValueError as e:
-            if str(e) == "write to closed file":
-                raise InterfaceError("connection is closed")
-            else:
-                raise e
         except AttributeError:
             raise InterfaceError("connection is closed")
 
+    def _flush(self):
+        # Sends the buffered messages with a single sendall() call.
+        if self._sock is None:
+            del self._wbuf[:]
+            raise InterfaceError("connection is closed")
+        elif self._copy_out:
+            del self._wbuf[:]
+            raise InterfaceError(
+                "The connection is in the middle of a copy_out_rows() COPY, "
+                "so it can't be used until the iterator is exhausted or "
+                "closed.")
+        try:
+            self._usock.sendall(self._wbuf)
+        finally:
+            del self._wbuf[:]
+
     def send_EXECUTE(self, cursor):
         # Byte1('E') - Identifies the message as an execute message.
         # Int32 -   Message length, including self.
@@ -2067,39 +3771,183 @@ class Connection(object):
                 cursor._row_count += row_count
 
         if command in DDL_COMMANDS:
-            for k in self._caches:
-                self._caches[k]['ps'].clear()
+            self.statement_cache.clear()
+            self._result_types.clear()
+
+    def _row_decoder(self, ps, row_factory):
+        # Returns the function that decodes the contents of a DataRow message
+        # into a row made by row_factory. It's made the first time it's
+        # needed for each statement and row factory.
+        try:
+            return ps['row_decoders'][row_factory]
+        except KeyError:
+            pass
+
+        make_row = row_factory(
+            [col['name'].decode(self._client_encoding)
+             for col in ps['row_desc']])
+        if make_row is tuple or make_row is list:
+            decoder = self._make_row_decoder(ps['input_funcs'], make_row)
+        else:
+            decode_row = self._make_row_decoder(ps['input_funcs'], tuple)
+
+            def decoder(data):
+                return make_row(decode_row(data))
+        ps['row_decoders'][row_factory] = decoder
+        return decoder
+
+    def _make_row_decoder(self, input_funcs, row_type=list):
+        # Returns a function that decodes the contents of a DataRow message
+        # into a row, which is a list or a tuple depending on row_type.
+        as_tuple = row_type is tuple
+        if self.speedup_kinds is not None:
+            kinds = tuple(
+                self.speedup_kinds.get(f, _speedups.CALL)
+                for f in input_funcs)
+            speedups_decode_row = _speedups.decode_row
+
+            def decode_speedups_row(data):
+                return speedups_decode_row(
+                    data, kinds, input_funcs, self._client_encoding,
+                    as_tuple)
+            return decode_speedups_row
+
+        # Without the _speedups extension, each run of adjacent columns with
+        # fixed-width binary types is decoded by a single Struct, which
+        # unpacks the length of each value along with the value itself. A
+        # NULL has a length of -1 and no value, so if the lengths aren't the
+        # expected ones the run is decoded a column at a time instead. A
+        # single fixed-width column isn't worth a run of its own, and is
+        # decoded along with its neighbours.
+        runs = []
+        for fixed, funcs in groupby(
+                input_funcs, lambda f: f in self.fixed_width_formats):
+            funcs = tuple(funcs)
+            if fixed and (len(funcs) > 1 or len(input_funcs) == 1):
+                fmts = [self.fixed_width_formats[f] for f in funcs]
+                st = Struct('!' + ''.join('i' + fmt for fmt in fmts))
+                lengths = tuple(struct.calcsize('!' + fmt) for fmt in fmts)
+                runs.append((st.unpack_from, st.size, lengths, funcs))
+            elif len(runs) > 0 and runs[-1][0] is None:
+                runs[-1] = (None, 0, None, runs[-1][3] + funcs)
+            else:
+                runs.append((None, 0, None, funcs))
+
+        def decode_row(data):
+            idx = 2
+            row = []
+            for unpack, size, lengths, funcs in runs:
+                if unpack is not None and idx + size <= len(data):
+                    values = unpack(data, idx)
+                    if values[::2] == lengths:
+                        row.extend(values[1::2])
+                        idx += size
+                        continue
+
+                for func in funcs:
+                    vlen = i_unpack(data, idx)[0]
+                    idx += 4
+                    if vlen == -1:
+                        row.append(None)
+                    else:
+                        row.append(func(data, idx, vlen))
+                        idx += vlen
+            return tuple(row) if as_tuple else row
+
+        # A row of only fixed-width columns is the common case of a wide
+        # numeric row, and needs no loop over the runs.
+        if len(runs) == 1 and runs[0][0] is not None:
+            unpack, size, lengths, funcs = runs[0]
+
+            def decode_fixed_row(data):
+                if len(data) == size + 2:
+                    values = unpack(data, 2)
+                    if values[::2] == lengths:
+                        return row_type(values[1::2])
+                return decode_row(data)
+            return decode_fixed_row
+
+        return decode_row
 
     def handle_DATA_ROW(self, data, cursor):
-        data_idx = 2
-        row = []
-        for func in cursor.ps['input_funcs']:
-            vlen = i_unpack(data, data_idx)[0]
-            data_idx += 4
-            if vlen == -1:
-                row.append(None)
+        try:
+            decode_row = cursor.ps['row_decoders'][cursor.row_factory]
+        except KeyError:
+            decode_row = self._row_decoder(cursor.ps, cursor.row_factory)
+        cursor._cached_rows.append(decode_row(data))
+
+    if PY2:
+        def _read_message(self):
+            chunk = self._read(5)
+            if len(chunk) < 5:
+                raise EOFError()
+            code, data_len = ci_unpack(chunk)
+            return code, self._read(data_len - 4)
+    else:
+        def _read_message(self):
+            # Returns the code and the contents of the next message. Messages
+            # are split out of a buffer that's filled by reading from the
+            # socket as much as is available. The contents of DataRow and
+            # CopyData messages are returned as a memoryview of the buffer
+            # rather than a copy, and so are only valid until the next message
+            # is read.
+            pos = self._rbuf_pos
+            if self._rbuf_end - pos < 5:
+                pos = self._fill(5)
+            code, data_len = ci_unpack(self._rbuf, pos)
+            end = pos + 1 + data_len
+            if end > self._rbuf_end:
+                pos = self._fill(1 + data_len)
+                end = pos + 1 + data_len
+            self._rbuf_pos = end
+            if code == DATA_ROW or code == COPY_DATA:
+                return code, self._rview[pos + 5:end]
             else:
-                row.append(func(data, data_idx, vlen))
-                data_idx += vlen
-        cursor._cached_rows.append(row)
+                return code, bytes(self._rview[pos + 5:end])
+
+        def _fill(self, n):
+            # Reads from the socket until at least n bytes are buffered from
+            # the current position, and returns the position, which changes if
+            # the buffered bytes have to be moved to the start of the buffer
+            # to make room. A buffer bigger than _read_buffer_size is only kept
+            # for as long as it's needed. The buffer is replaced rather than
+            # resized, as it can't be resized while there are views of it.
+            pos, end = self._rbuf_pos, self._rbuf_end
+            if pos + n > len(self._rbuf):
+                size = max(n, self._read_buffer_size)
+                if size == len(self._rbuf):
+                    self._rbuf[:end - pos] = self._rbuf[pos:end]
+                else:
+                    rbuf = bytearray(size)
+                    rbuf[:end - pos] = self._rbuf[pos:end]
+                    self._rbuf = rbuf
+                    self._rview = memoryview(rbuf)
+                pos, end = 0, end - pos
+
+            rview = self._rview
+            try:
+                while end - pos < n:
+                    bytes_read = self._usock.recv_into(rview[end:])
+                    if bytes_read == 0:
+                        raise EOFError()
+                    end += bytes_read
+            finally:
+                self._rbuf_pos, self._rbuf_end = pos, end
+            return pos
 
     def handle_messages(self, cursor):
         code = self.error = None
 
         try:
             while code != READY_FOR_QUERY:
-                chunk = self._read(5)
-                code, data_len = ci_unpack(chunk)
-                self.message_types[code](self._read(data_len - 4), cursor)
+                code, data = self._read_message()
+                self.message_types[code](data, cursor)
+        except EOFError:
+            self.error = OperationalError("No data to read from socket")
         except socket.error as e:
             self.error = OperationalError(str(e))
         except struct.error as e:
-            if len(chunk) == 0:
-                self.error = OperationalError(
-                    "No data to read from socket"
-                )
-            else:
-                self.error = OperationalError(str(e))
+            self.error = OperationalError(str(e))
         except Exception:
             self._close()
             raise
@@ -2148,6 +3996,13 @@ class Connection(object):
                 self.py_types[datetime.timedelta] = (
                     1186, FC_BINARY, interval_send_integer)
                 self.pg_types[1186] = (FC_BINARY, interval_recv_integer)
+
+                self.pg_types[1083] = (FC_BINARY, time_recv_integer)
+                self.pg_types[1266] = (FC_BINARY, timetz_recv_integer)
+
+                self.pg_binary_send[1114] = timestamp_send_integer
+                self.pg_binary_send[1184] = timestamptz_send_integer
+                self.pg_binary_send[1186] = interval_send_integer
             else:
                 self.py_types[1114] = (1114, FC_BINARY, timestamp_send_float)
                 self.pg_types[1114] = (FC_BINARY, timestamp_recv_float)
@@ -2160,6 +4015,13 @@ class Connection(object):
                     1186, FC_BINARY, interval_send_float)
                 self.pg_types[1186] = (FC_BINARY, interval_recv_float)
 
+                self.pg_types[1083] = (FC_BINARY, time_recv_float)
+                self.pg_types[1266] = (FC_BINARY, timetz_recv_float)
+
+                self.pg_binary_send[1114] = timestamp_send_float
+                self.pg_binary_send[1184] = timestamptz_send_float
+                self.pg_binary_send[1186] = interval_send_float
+
         elif key == b("server_version"):
             self._server_version = LooseVersion(value.decode('ascii'))
             if self._server_version < LooseVersion('8.2.0'):
@@ -2393,6 +4255,7 @@ class Connection(object):
             previous_autocommit_mode = self.autocommit
             self.autocommit = True
             curs = self.cursor()
+            curs.row_factory = tuple_row
             curs.execute("select gid FROM pg_prepared_xacts")
             return [self.xid(0, row[0], '') for row in curs]
         finally:
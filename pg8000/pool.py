@@ -0,0 +1,393 @@
+"""A thread-safe pool of connections.
+
+Opening a connection takes a TCP connect, a startup packet and an
+authentication exchange before the first query can run. A
+:class:`ConnectionPool` keeps connections open between uses so that this cost
+is only paid once per connection rather than once per request::
+
+    pool = pg8000.pool.ConnectionPool(
+        min_size=2, max_size=10, user="postgres", password="C.P.Snow")
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        conn.commit()
+    pool.close()
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pg8000
+from pg8000.core import InterfaceError
+
+
+# The attributes of a connection that are put back to the values they had when
+# it was opened, when it's given back to the pool.
+CONNECTION_SETTINGS = (
+    'autocommit', 'fetch_size', 'row_factory', 'prepare_threshold',
+    'single_round_trip')
+
+
+class PoolTimeout(InterfaceError):
+    """Raised when a connection can't be obtained from a pool within the
+    timeout, because all the connections are in use and the pool is at its
+    maximum size.
+    """
+    pass
+
+
+class ConnectionPool(object):
+    """A pool of connections, all opened with the same arguments. It's safe to
+    share a pool between threads.
+
+    This class is not part of the DBAPI standard; it is a pg8000 extension.
+
+    :param min_size:
+        The number of connections opened when the pool is created, and the
+        number of idle connections that are kept open however long they've
+        been idle. When a connection that's given back is closed, because it's
+        broken or too old, new connections are opened to make the pool up to
+        this size again. Defaults to ``0``.
+
+    :param max_size:
+        The maximum number of connections, both idle and in use. Defaults to
+        ``10``.
+
+    :param timeout:
+        The maximum time in seconds that :meth:`getconn` waits for a
+        connection when all of them are in use, before raising
+        :class:`PoolTimeout`. The default is ``None``, meaning wait for ever.
+
+    :param max_idle:
+        Idle connections above ``min_size`` that haven't been used for this
+        many seconds are closed. The default is ``None``, meaning that idle
+        connections are never closed.
+
+    :param max_lifetime:
+        Connections that have been open for more than this many seconds are
+        closed rather than reused. The default is ``None``, meaning no limit.
+
+    :param kwargs:
+        The remaining keyword arguments are passed to :func:`pg8000.connect`
+        to open each connection.
+    """
+
+    def __init__(
+            self, min_size=0, max_size=10, timeout=None, max_idle=None,
+            max_lifetime=None, **kwargs):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(
+                "max_size must be at least 1, and not less than min_size")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._connect_kwargs = kwargs
+
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # The idle connections as (connection, time returned) pairs, with the
+        # most recently returned at the right.
+        self._idle = deque()
+
+        # The time each connection was opened, for all open connections.
+        self._opened = {}
+
+        # The settings of each connection when it was opened, as (name,
+        # value) pairs, along with the size of its statement cache.
+        self._settings = {}
+
+        # The connections that have been taken from the pool.
+        self._in_use = set()
+
+        # Connections being opened, which count towards max_size.
+        self._opening = 0
+
+        self._stats = dict(
+            connections_opened=0, connections_closed=0, checkouts=0,
+            waits=0, timeouts=0, rollbacks=0, broken=0)
+
+        for i in range(min_size):
+            conn = self._open()
+            with self._cond:
+                self._idle.append((conn, time.time()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self):
+        conn = pg8000.connect(**self._connect_kwargs)
+        settings = [
+            (name, getattr(conn, name)) for name in CONNECTION_SETTINGS]
+        settings.append(conn.statement_cache.max_size)
+        with self._cond:
+            self._opened[conn] = time.time()
+            self._settings[conn] = settings
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        # Called with the lock held; the caller closes the connection once
+        # the lock is released.
+        del self._opened[conn]
+        del self._settings[conn]
+        self._stats['connections_closed'] += 1
+        self._cond.notify()
+
+    def _fill(self):
+        # Opens idle connections until the pool is at its minimum size again.
+        # A connection that can't be opened is left until the next time.
+        while True:
+            with self._cond:
+                if self._closed or \
+                        len(self._opened) + self._opening >= self.min_size:
+                    return
+                self._opening += 1
+
+            try:
+                conn = self._open()
+            except Exception:
+                conn = None
+
+            with self._cond:
+                self._opening -= 1
+                closed = self._closed
+                if conn is None:
+                    self._cond.notify()
+                    return
+                elif closed:
+                    self._discard(conn)
+                else:
+                    self._idle.append((conn, time.time()))
+                    self._cond.notify()
+
+            if closed:
+                self._close_quietly(conn)
+                return
+
+    def _reset(self, conn):
+        # Gets a connection that's been given back ready for reuse. Any
+        # pipeline is ended without sending its queued statements, any
+        # transaction is rolled back, and the settings are put back to what
+        # they were when the connection was opened.
+        with conn._lock:
+            pipeline = conn._pipeline
+            if pipeline is not None:
+                del pipeline._queue[:]
+                conn._pipeline = None
+
+        if conn.in_transaction:
+            conn.rollback()
+            with self._cond:
+                self._stats['rollbacks'] += 1
+
+        settings = self._settings[conn]
+        for name, value in settings[:-1]:
+            setattr(conn, name, value)
+        conn.statement_cache.max_size = settings[-1]
+
+    def _expired(self, conn, now):
+        return self.max_lifetime is not None and \
+            now - self._opened[conn] > self.max_lifetime
+
+    def _evict(self, now):
+        # Called with the lock held. Returns the connections to be closed.
+        evicted = []
+        keep = deque()
+        while len(self._idle) > 0:
+            conn, returned = self._idle.popleft()
+            idle_too_long = self.max_idle is not None and \
+                now - returned > self.max_idle and \
+                len(self._idle) + len(keep) >= self.min_size
+            if idle_too_long or self._expired(conn, now):
+                self._discard(conn)
+                evicted.append(conn)
+            else:
+                keep.append((conn, returned))
+        self._idle = keep
+        return evicted
+
+    def getconn(self, timeout=None):
+        """Takes a connection from the pool, opening a new one if none are
+        idle and the pool isn't at its maximum size. If the pool is at its
+        maximum size, waits for a connection to be returned.
+
+        :param timeout:
+            The maximum time to wait for a connection, in seconds. Defaults to
+            the ``timeout`` of the pool.
+
+        :rtype:
+            A :class:`pg8000.Connection` object, which must be given back with
+            :meth:`putconn`.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.time() + timeout
+        evicted = []
+        conn = None
+        try:
+            with self._cond:
+                waited = False
+                while True:
+                    if self._closed:
+                        raise InterfaceError("The pool is closed.")
+
+                    now = time.time()
+                    evicted.extend(self._evict(now))
+                    if len(self._idle) > 0:
+                        conn = self._idle.pop()[0]
+                        self._in_use.add(conn)
+                        self._stats['checkouts'] += 1
+                        return conn
+
+                    if len(self._opened) + self._opening < self.max_size:
+                        self._opening += 1
+                        break
+
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    if deadline is None:
+                        self._cond.wait()
+                    elif now < deadline:
+                        self._cond.wait(deadline - now)
+                    else:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            "Timed out waiting for a connection from the "
+                            "pool.")
+        finally:
+            for c in evicted:
+                self._close_quietly(c)
+
+        try:
+            conn = self._open()
+        finally:
+            with self._cond:
+                self._opening -= 1
+                if conn is None:
+                    self._cond.notify()
+                else:
+                    self._in_use.add(conn)
+                    self._stats['checkouts'] += 1
+        return conn
+
+    def putconn(self, conn):
+        """Gives a connection taken with :meth:`getconn` back to the pool.
+
+        If the connection is in a transaction, the transaction is rolled back.
+        A pipeline that's still active is ended without its queued statements
+        being run. The ``autocommit``, ``fetch_size``, ``row_factory``,
+        ``prepare_threshold`` and ``single_round_trip`` attributes, and the
+        maximum size of the ``statement_cache``, are put back to what they
+        were when the connection was opened. Connections that are broken, too
+        old, or in the middle of a
+        :meth:`~pg8000.Cursor.copy_out_rows` ``COPY`` are closed rather
+        than being kept for reuse. Giving back a connection that isn't taken
+        from the pool raises :exc:`pg8000.InterfaceError`.
+        """
+        with self._cond:
+            if conn not in self._opened:
+                raise InterfaceError(
+                    "The connection doesn't belong to this pool.")
+            if conn not in self._in_use:
+                raise InterfaceError(
+                    "The connection has already been given back to the pool.")
+            self._in_use.remove(conn)
+
+        healthy = conn._sock is not None and not conn._copy_out
+        if healthy:
+            try:
+                self._reset(conn)
+            except Exception:
+                healthy = False
+
+        now = time.time()
+        with self._cond:
+            keep = healthy and not self._closed and \
+                not self._expired(conn, now)
+            if keep:
+                self._idle.append((conn, now))
+                self._cond.notify()
+            else:
+                if not healthy:
+                    self._stats['broken'] += 1
+                self._discard(conn)
+            evicted = self._evict(now)
+
+        if not keep:
+            evicted.append(conn)
+        for c in evicted:
+            self._close_quietly(c)
+        if len(evicted) > 0:
+            self._fill()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """A context manager that takes a connection from the pool with
+        :meth:`getconn`, and gives it back with :meth:`putconn` when the
+        ``with`` block exits. Work that isn't committed inside the block is
+        rolled back.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        """Returns a dictionary of statistics for the pool:
+
+        ``size``
+            The number of open connections, both idle and in use.
+        ``idle``
+            The number of idle connections.
+        ``in_use``
+            The number of connections that have been taken from the pool.
+        ``connections_opened``, ``connections_closed``
+            The number of connections opened and closed by the pool.
+        ``checkouts``
+            The number of times a connection has been taken from the pool.
+        ``waits``, ``timeouts``
+            The number of times :meth:`getconn` has had to wait for a
+            connection, and the number of times it gave up waiting.
+        ``rollbacks``
+            The number of connections given back in a transaction, that were
+            rolled back.
+        ``broken``
+            The number of connections given back that were unusable.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = len(self._opened)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+        return stats
+
+    def close(self):
+        """Closes the idle connections, and stops the pool from handing out any
+        more. Connections that are in use are closed when they're given back.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, returned in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._discard(conn)
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
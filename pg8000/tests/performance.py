@@ -57,4 +57,87 @@ with warnings.catch_warnings(), closing(pg8000.connect(**db_connect)) as db:
         cursor.fetchall()
     print("Took {0} seconds.".format(time.time() - begin_time))
 
+    print("Beginning small queries test...")
+    for i in range(1, 5):
+        begin_time = time.time()
+        for j in range(5000):
+            cursor.execute("select %s, %s", (j, 'x'))
+            cursor.fetchall()
+        elapsed = time.time() - begin_time
+        print(
+            "Attempt %s - %s seconds, %d queries per second." % (
+                i, elapsed, 5000 / elapsed))
+
+    # Statements run with the unnamed statement, each run 4 times, as
+    # single_round_trip only applies from a statement's second run.
+    db.prepare_threshold = None
+    for single_round_trip in (False, True):
+        db.single_round_trip = single_round_trip
+        print(
+            "Beginning unprepared statements test, single_round_trip %s..." %
+            single_round_trip)
+        begin_time = time.time()
+        for i in range(4):
+            for j in range(500):
+                cursor.execute("select %s, " + str(j), ('x',))
+                cursor.fetchall()
+        elapsed = time.time() - begin_time
+        print(
+            "Took %s seconds, %d statements per second." % (
+                elapsed, 2000 / elapsed))
+    db.single_round_trip = False
+    db.prepare_threshold = 0
+
+    array_tests = (
+        ("cast(id as numeric) / 7", 'numeric[]'),
+        ("'quoted \"text\", ' || id", 'text[]'),
+        ("date '2001-09-28' + id", 'date[]'),
+        ("cast(id %% 32767 as int2)", 'int2[]'),
+    )
+    for txt, name in array_tests:
+        query = """SELECT array_agg({0}) FROM (
+            SELECT generate_series(1, 10000) AS id) AS tbl""".format(txt)
+        print("Beginning %s test..." % name)
+        for i in range(1, 5):
+            begin_time = time.time()
+            cursor.execute(query)
+            cursor.fetchall()
+            elapsed = time.time() - begin_time
+            print(
+                "Attempt %s - %s seconds, %d elements per second." % (
+                    i, elapsed, 10000 / elapsed))
+    db.commit()
+
+socket_tests = (
+    ({}, 'defaults'),
+    ({'tcp_nodelay': False}, 'tcp_nodelay=False'),
+    ({'read_buffer_size': 2 ** 13}, 'read_buffer_size=8192'),
+    ({'read_buffer_size': 2 ** 20}, 'read_buffer_size=1048576'),
+    ({'socket_rcvbuf': 2 ** 20, 'read_buffer_size': 2 ** 20},
+        'socket_rcvbuf=1048576, read_buffer_size=1048576'),
+)
+for options, name in socket_tests:
+    params = dict(db_connect, **options)
+    with warnings.catch_warnings(), closing(pg8000.connect(**params)) as db:
+        cursor = db.cursor()
+        print("Beginning socket options test, %s..." % name)
+        begin_time = time.time()
+        for j in range(5000):
+            cursor.execute("select %s, %s", (j, 'x'))
+            cursor.fetchall()
+        elapsed = time.time() - begin_time
+        print(
+            "Small queries - %s seconds, %d queries per second." % (
+                elapsed, 5000 / elapsed))
+        begin_time = time.time()
+        for j in range(5):
+            cursor.execute(
+                "select repeat('x', 1000) from generate_series(1, 20000)")
+            cursor.fetchall()
+        elapsed = time.time() - begin_time
+        print(
+            "Large results - %s seconds, %.1f MB per second." % (
+                elapsed, 5 * 20000 * 1000 / elapsed / 10 ** 6))
+        db.commit()
+
 print("Whole time - %s seconds." % (time.time() - whole_begin_time))
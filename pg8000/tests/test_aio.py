@@ -0,0 +1,110 @@
+import unittest
+import sys
+import pg8000
+from .connection_settings import db_connect
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    import pg8000.aio
+
+
+# Tests of the asyncio connection and cursor.
+@unittest.skipIf(sys.version_info < (3, 5), "asyncio needs Python 3.5")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.db = self.run_coro(pg8000.aio.connect(**db_connect))
+
+    def tearDown(self):
+        if self.db._sock is not None:
+            self.run_coro(self.db.close())
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_coro(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def testSelect(self):
+        cursor = self.db.cursor()
+        self.run_coro(cursor.execute("SELECT %s, 'hello'", (1.5,)))
+        self.assertEqual(self.run_coro(cursor.fetchall()), ((1.5, 'hello'),))
+        self.run_coro(self.db.rollback())
+
+    def testPortalSuspended(self):
+        cursor = self.db.cursor()
+        count = self.db.fetch_size * 2 + 1
+        self.run_coro(
+            cursor.execute("SELECT generate_series(1, %s)", (count,)))
+
+        rows = []
+        while True:
+            try:
+                rows.append(self.run_coro(cursor.__anext__()))
+            except StopAsyncIteration:
+                break
+        self.assertEqual(rows, [(i,) for i in range(1, count + 1)])
+        self.run_coro(self.db.rollback())
+
+    def testFetchmany(self):
+        cursor = self.db.cursor()
+        self.run_coro(cursor.execute("SELECT generate_series(1, 5)"))
+        self.assertEqual(
+            self.run_coro(cursor.fetchmany(2)), ((1,), (2,)))
+        self.assertEqual(self.run_coro(cursor.fetchone()), (3,))
+        self.assertEqual(self.run_coro(cursor.fetchall()), ((4,), (5,)))
+        self.run_coro(self.db.commit())
+
+    def testError(self):
+        cursor = self.db.cursor()
+        self.assertRaises(
+            pg8000.ProgrammingError, self.run_coro,
+            cursor.execute("SELECT * FROM t99"))
+        self.run_coro(self.db.rollback())
+
+        self.run_coro(cursor.execute("SELECT 1"))
+        self.assertEqual(self.run_coro(cursor.fetchone()), (1,))
+
+    def testConcurrentConnections(self):
+        conns = self.run_coro(
+            asyncio.gather(
+                *(pg8000.aio.connect(**db_connect) for i in range(5))))
+        cursors = [conn.cursor() for conn in conns]
+        self.run_coro(
+            asyncio.gather(
+                *(c.execute("SELECT pg_sleep(0.1), %s", (i,))
+                    for i, c in enumerate(cursors))))
+        self.assertEqual(
+            [self.run_coro(c.fetchone())[1] for c in cursors],
+            [str(i) for i in range(5)])
+        self.run_coro(asyncio.gather(*(conn.close() for conn in conns)))
+
+    def testSocketOptions(self):
+        params = dict(db_connect, tcp_keepalive=True, read_buffer_size=16)
+        db = self.run_coro(pg8000.aio.connect(**params))
+        try:
+            cursor = db.cursor()
+            self.run_coro(cursor.execute(
+                "SELECT repeat('x', 1000) FROM generate_series(1, 100)"))
+            self.assertEqual(
+                self.run_coro(cursor.fetchall()), (('x' * 1000,),) * 100)
+        finally:
+            self.run_coro(db.close())
+
+    def testStatementTimeout(self):
+        cursor = self.db.cursor()
+        with self.assertRaises(pg8000.ProgrammingError) as cm:
+            self.run_coro(cursor.execute("SELECT pg_sleep(30)", timeout=0.5))
+        self.assertEqual(cm.exception.args[1], '57014')  # query canceled
+        self.run_coro(self.db.rollback())
+        self.run_coro(cursor.execute("SELECT 1", timeout=0.1))
+        self.assertEqual(self.run_coro(cursor.fetchall()), ((1,),))
+
+    def testClosed(self):
+        self.run_coro(self.db.close())
+        cursor = self.db.cursor()
+        self.assertRaises(
+            pg8000.InterfaceError, self.run_coro, cursor.execute("SELECT 1"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 import pg8000
 from pg8000.tests.connection_settings import db_connect
 from six import PY2, u
+import socket
 import sys
 from distutils.version import LooseVersion
 
@@ -210,6 +211,39 @@ class Tests(unittest.TestCase):
         cur2.close()
         db2.close()
 
+    def testClosed(self):
+        db = pg8000.connect(**db_connect)
+        cur = db.cursor()
+        db.close()
+        self.assertRaises(pg8000.InterfaceError, cur.execute, "select 1")
+        self.assertRaises(pg8000.InterfaceError, db.close)
+
+    def testSocketOptions(self):
+        params = db_connect.copy()
+        params.update(
+            tcp_nodelay=False, tcp_keepalive=True, socket_rcvbuf=2 ** 17,
+            read_buffer_size=16)
+        db = pg8000.connect(**params)
+        try:
+            sock = db._usock
+            if 'unix_sock' not in db_connect:
+                self.assertEqual(
+                    sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY),
+                    0)
+                self.assertNotEqual(
+                    sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE),
+                    0)
+            self.assertGreaterEqual(
+                sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 2 ** 17)
+
+            # Messages bigger than the read buffer are still read whole.
+            cur = db.cursor()
+            cur.execute(
+                "SELECT repeat('x', 1000) FROM generate_series(1, 100)")
+            self.assertEqual(cur.fetchall(), (('x' * 1000,),) * 100)
+        finally:
+            db.close()
+
     def testApplicatioName(self):
         params = db_connect.copy()
         params['application_name'] = 'my test application name'
@@ -3,6 +3,8 @@ import pg8000
 from .connection_settings import db_connect
 from six import b, BytesIO, u, iteritems
 from sys import exc_info
+import datetime
+import decimal
 
 
 class Tests(unittest.TestCase):
@@ -70,7 +72,7 @@ class Tests(unittest.TestCase):
 
             cursor.execute("SELECT * FROM t1 ORDER BY f1")
             retval = cursor.fetchall()
-            self.assertEqual(retval, ([1, 1, '1'], [2, 2, '2'], [3, 3, '3']))
+            self.assertEqual(retval, ((1, 1, '1'), (2, 2, '2'), (3, 3, '3')))
             self.db.rollback()
         finally:
             cursor.close()
@@ -86,7 +88,7 @@ class Tests(unittest.TestCase):
 
             cursor.execute("SELECT * FROM t1 ORDER BY f1")
             retval = cursor.fetchall()
-            self.assertEqual(retval, ([1, 1, None],))
+            self.assertEqual(retval, ((1, 1, None),))
             self.db.commit()
         finally:
             cursor.close()
@@ -113,5 +115,182 @@ class Tests(unittest.TestCase):
         finally:
             cursor.close()
 
+    def testCopyRows(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.copy_rows(
+                "t1", ("f1", "f2", "f3"),
+                ((i, i * 2, None if i % 2 else u('r\u00f6w')) for i in
+                    range(10000)))
+            self.assertEqual(cursor.rowcount, 10000)
+
+            cursor.execute("SELECT count(*), sum(f2) FROM t1")
+            self.assertEqual(cursor.fetchone(), (10000, 99990000))
+            cursor.execute("SELECT * FROM t1 WHERE f1 < 2 ORDER BY f1")
+            self.assertEqual(
+                cursor.fetchall(), ((0, 0, u('r\u00f6w')), (1, 2, None)))
+            self.db.rollback()
+        finally:
+            cursor.close()
+
+    def testCopyRowsTypes(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.execute(
+                "CREATE TEMPORARY TABLE t2 (f1 bool, f2 float8, f3 bigint, "
+                "f4 date, f5 timestamp, f6 bytea, f7 numeric, f8 point)")
+            row = (
+                True, 1.5, 2 ** 40, datetime.date(2016, 2, 29),
+                datetime.datetime(1999, 12, 31, 23, 59, 59, 123456), b('\x00'),
+                decimal.Decimal('-12.3400'))
+            cursor.copy_rows(
+                "t2", ("f1", "f2", "f3", "f4", "f5", "f6", "f7"), (row,))
+            cursor.execute("SELECT f1, f2, f3, f4, f5, f6, f7 FROM t2")
+            retval = tuple(cursor.fetchone())
+            self.assertEqual(retval, row)
+            self.assertEqual(str(retval[6]), '-12.3400')
+
+            self.assertRaises(
+                pg8000.NotSupportedError, cursor.copy_rows, "t2", ("f8",),
+                ((1,),))
+            self.db.rollback()
+        finally:
+            cursor.close()
+
+    def testCopyRowsQuoting(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.execute("CREATE SCHEMA copy_schema")
+            cursor.execute(
+                'CREATE TABLE copy_schema.t2 ("Mixed" int, "select" text, '
+                '"a""b" int)')
+            cursor.copy_rows(
+                "copy_schema.t2", ("Mixed", "select", 'a"b'), ((1, 'x', 2),))
+            cursor.execute(
+                'SELECT "Mixed", "select", "a""b" FROM copy_schema.t2')
+            self.assertEqual(cursor.fetchall(), ((1, 'x', 2),))
+
+            # Names are matched exactly
+            self.assertRaises(
+                pg8000.ProgrammingError, cursor.copy_rows, "copy_schema.t2",
+                ("mixed",), ((1,),))
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testCopyRowsError(self):
+        try:
+            cursor = self.db.cursor()
+            self.db.commit()
+            self.assertRaises(
+                pg8000.ProgrammingError, cursor.copy_rows, "t1", ("f1", "f2"),
+                ((1, 1), (2, 2, 2)))
+            self.db.rollback()
+
+            # A value that's out of range for its column
+            self.assertRaises(
+                pg8000.DataError, cursor.copy_rows, "t1", ("f1", "f2"),
+                ((1, 2 ** 40),))
+            self.db.rollback()
+
+            # A duplicate key is reported by the server
+            try:
+                cursor.copy_rows("t1", ("f1", "f2"), ((1, 1), (1, 2)))
+                self.assertTrue(False, "Should have raised an exception")
+            except pg8000.ProgrammingError as e:
+                self.assertEqual(e.args[1], '23505')
+            self.db.rollback()
+
+            # The connection is still usable
+            cursor.execute("SELECT count(*) FROM t1")
+            self.assertEqual(cursor.fetchone(), (0,))
+        finally:
+            cursor.close()
+
+    def testCopyOutRows(self):
+        try:
+            cursor = self.db.cursor()
+            rows = cursor.copy_out_rows(
+                "SELECT i, 'row ' || i, "
+                "CASE WHEN i %% 2 = 0 THEN i * 1.5::float8 END, "
+                "i > 5, timestamptz '2016-01-01 00:00+00', "
+                "decode('00ff', 'hex') FROM generate_series(1, 10000) AS i")
+            rows = list(rows)
+            self.assertEqual(len(rows), 10000)
+            self.assertEqual(
+                rows[:2], [
+                    (1, 'row 1', None, False,
+                        datetime.datetime(2016, 1, 1, tzinfo=pg8000.utc),
+                        b('\x00\xff')),
+                    (2, 'row 2', 3.0, False,
+                        datetime.datetime(2016, 1, 1, tzinfo=pg8000.utc),
+                        b('\x00\xff'))])
+            self.assertEqual(cursor.rowcount, 10000)
+
+            rows = cursor.copy_out_rows(
+                "SELECT -1.50::numeric, 'NaN'::numeric")
+            self.assertEqual(
+                [[str(v) for v in row] for row in rows], [['-1.50', 'NaN']])
+            self.db.rollback()
+        finally:
+            cursor.close()
+
+    def testCopyOutRowsClose(self):
+        try:
+            cursor = self.db.cursor()
+            rows = cursor.copy_out_rows(
+                "SELECT generate_series(1, 100000)")
+            self.assertEqual(next(rows), (1,))
+            self.assertEqual(next(rows), (2,))
+            rows.close()
+
+            # The rest of the COPY has been discarded
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchall(), ((1,),))
+
+            self.assertRaises(
+                pg8000.NotSupportedError, list,
+                cursor.copy_out_rows("SELECT point(1, 2)"))
+            self.db.rollback()
+
+            self.assertRaises(
+                pg8000.ProgrammingError, list,
+                cursor.copy_out_rows("SELECT 1 / (10 - i) FROM "
+                                     "generate_series(1, 20) AS i"))
+            self.db.rollback()
+        finally:
+            cursor.close()
+
+    def testCopyOutRowsInUse(self):
+        try:
+            cursor, other = self.db.cursor(), self.db.cursor()
+            rows = cursor.copy_out_rows(
+                "SELECT generate_series(1, 100000)")
+            self.assertEqual(next(rows), (1,))
+            self.assertFalse(self.db._lock.locked())
+
+            # Using the connection during the COPY fails rather than hangs,
+            # and the COPY carries on.
+            self.assertRaises(
+                pg8000.InterfaceError, other.execute, "SELECT 1")
+            self.assertRaises(pg8000.InterfaceError, self.db.commit)
+            self.assertEqual(next(rows), (2,))
+            self.assertEqual(sum(1 for row in rows), 99998)
+
+            other.execute("SELECT 1")
+            self.assertEqual(other.fetchall(), ((1,),))
+
+            # An abandoned iterator doesn't stop the connection being used
+            # once it's closed.
+            rows = cursor.copy_out_rows("SELECT generate_series(1, 100000)")
+            self.assertEqual(next(rows), (1,))
+            del rows
+            other.execute("SELECT 2")
+            self.assertEqual(other.fetchall(), ((2,),))
+            self.db.rollback()
+        finally:
+            cursor.close()
+            other.close()
+
 if __name__ == "__main__":
     unittest.main()
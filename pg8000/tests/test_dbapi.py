@@ -265,17 +265,18 @@ class Tests(unittest.TestCase):
             cursor.close()
 
     # If autocommit is on and we do an operation that returns more rows than
-    # the cache holds, make sure exception raised.
+    # the fetch size, make sure all the rows are fetched at once.
     def testAutocommitMaxRows(self):
         self.db.autocommit = True
         try:
             cursor = self.db.cursor()
-            self.assertRaises(
-                pg8000.InterfaceError, cursor.execute,
-                "select generate_series(1, " +
-                str(pg8000.core.Connection._row_cache_size + 1) + ")")
+            count = cursor.fetch_size + 1
+            cursor.execute("select generate_series(1, " + str(count) + ")")
+            self.assertFalse(cursor.portal_suspended)
+            self.assertEqual(len(cursor.fetchall()), count)
         finally:
             cursor.close()
+            self.db.autocommit = False
 
 if __name__ == "__main__":
     unittest.main()
@@ -60,5 +60,39 @@ class Tests(unittest.TestCase):
             "SELECT $1, $2, \"f1_%\", E'txt_%' FROM t WHERE a=$3 AND b='75%'")
         self.assertEqual(make_args((1, 2, 3)), (1, 2, 3))
 
+    def testCasts(self):
+        new_query, make_args = pg8000.core.convert_paramstyle(
+            "named", "SELECT :f1::int, f2::text FROM t WHERE a=':f3'")
+        self.assertEqual(
+            new_query, "SELECT $1::int, f2::text FROM t WHERE a=':f3'")
+        self.assertEqual(make_args({"f1": 1}), (1,))
+
+        new_query, make_args = pg8000.core.convert_paramstyle(
+            "numeric", "SELECT :1::int, f2::text")
+        self.assertEqual(new_query, "SELECT $1::int, f2::text")
+
+    def testErrors(self):
+        convert = pg8000.core.convert_paramstyle
+        self.assertRaises(
+            pg8000.InterfaceError, convert, "format", "SELECT %d")
+        self.assertRaises(
+            pg8000.InterfaceError, convert, "format", "SELECT '%d'")
+        self.assertRaises(
+            pg8000.InterfaceError, convert, "pyformat", "SELECT %(f1)s, %s")
+        self.assertRaises(
+            pg8000.InterfaceError, convert, "nonexistent", "SELECT 1")
+
+    def testCache(self):
+        query = "SELECT ?, 'cached'"
+        conversion = pg8000.core.cached_convert_paramstyle("qmark", query)
+        self.assertEqual(conversion[0], "SELECT $1, 'cached'")
+        self.assertIs(
+            pg8000.core.cached_convert_paramstyle("qmark", query), conversion)
+        self.assertIsNot(
+            pg8000.core.cached_convert_paramstyle("format", query),
+            conversion)
+        self.assertTrue(
+            len(pg8000.core._conversions) <= pg8000.core.MAX_CONVERSIONS)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+import threading
+import time
+import pg8000
+from pg8000.pool import ConnectionPool, PoolTimeout
+from .connection_settings import db_connect
+
+
+# Tests of the connection pool.
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(min_size=1, max_size=2, **db_connect)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def testReuse(self):
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        with self.pool.connection() as conn2:
+            self.assertTrue(conn is conn2)
+        stats = self.pool.stats()
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 1)
+
+    def testPutTwice(self):
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        self.assertRaises(pg8000.InterfaceError, self.pool.putconn, conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+        # The connection is only handed out once.
+        a = self.pool.getconn()
+        b = self.pool.getconn()
+        self.assertFalse(a is b)
+        self.pool.putconn(a)
+        self.pool.putconn(b)
+
+    def testRollbackOnReturn(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            self.assertTrue(conn.in_transaction)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(self.pool.stats()['rollbacks'], 1)
+
+    def testFailedTransaction(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            self.assertRaises(
+                pg8000.ProgrammingError, cursor.execute, "SELECT * FROM t99")
+
+        # The connection is rolled back, so it can be used straight away
+        with self.pool.connection() as conn2:
+            self.assertTrue(conn is conn2)
+            cursor = conn2.cursor()
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def testBrokenConnection(self):
+        conn = self.pool.getconn()
+        conn.close()
+        self.pool.putconn(conn)
+        stats = self.pool.stats()
+        self.assertEqual(stats['broken'], 1)
+
+        # A new connection is opened to keep the pool at its minimum size
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['connections_opened'], 2)
+
+        with self.pool.connection() as conn2:
+            self.assertFalse(conn is conn2)
+
+    def testResetOnReturn(self):
+        conn = self.pool.getconn()
+        cursor = conn.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE t1 (f1 int)")
+        conn.commit()
+        conn.autocommit = True
+        conn.fetch_size = 7
+        conn.row_factory = pg8000.dict_row
+        conn.prepare_threshold = None
+        conn.single_round_trip = True
+        conn.statement_cache.max_size = 3
+        conn.pipeline().__enter__()
+        cursor.execute("INSERT INTO t1 VALUES (1)")
+        self.pool.putconn(conn)
+
+        with self.pool.connection() as conn2:
+            self.assertTrue(conn is conn2)
+            self.assertFalse(conn.autocommit)
+            self.assertEqual(conn.fetch_size, 100)
+            self.assertTrue(conn.row_factory is pg8000.tuple_row)
+            self.assertEqual(conn.prepare_threshold, 0)
+            self.assertFalse(conn.single_round_trip)
+            self.assertEqual(conn.statement_cache.max_size, 100)
+
+            # The statement queued in the pipeline wasn't run
+            self.assertTrue(conn._pipeline is None)
+            cursor = conn.cursor()
+            cursor.execute("SELECT count(*) FROM t1")
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def testCopyOutOnReturn(self):
+        conn = self.pool.getconn()
+        conn.autocommit = True
+        rows = conn.cursor().copy_out_rows("SELECT generate_series(1, 100000)")
+        self.assertEqual(next(rows), (1,))
+        self.pool.putconn(conn)
+        self.assertEqual(self.pool.stats()['broken'], 1)
+        self.assertEqual(conn._sock, None)
+
+    def testTimeout(self):
+        conn1 = self.pool.getconn()
+        conn2 = self.pool.getconn()
+        try:
+            self.assertRaises(PoolTimeout, self.pool.getconn, 0.1)
+            self.assertEqual(self.pool.stats()['timeouts'], 1)
+        finally:
+            self.pool.putconn(conn1)
+            self.pool.putconn(conn2)
+
+    def testWait(self):
+        conn1 = self.pool.getconn()
+        conn2 = self.pool.getconn()
+
+        def give_back():
+            time.sleep(0.1)
+            self.pool.putconn(conn1)
+
+        t = threading.Thread(target=give_back)
+        t.start()
+        conn3 = self.pool.getconn(5)
+        t.join()
+        self.assertTrue(conn3 is conn1)
+        self.assertEqual(self.pool.stats()['waits'], 1)
+        self.pool.putconn(conn2)
+        self.pool.putconn(conn3)
+
+    def testMaxLifetime(self):
+        self.pool.max_lifetime = 0
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        self.assertEqual(conn._sock, None)
+
+        # It's replaced, as the minimum size is 1
+        self.assertEqual(self.pool.stats()['size'], 1)
+        with self.pool.connection() as conn2:
+            self.assertFalse(conn is conn2)
+
+    def testMaxIdle(self):
+        self.pool.max_idle = 0
+        conn1 = self.pool.getconn()
+        conn2 = self.pool.getconn()
+        self.pool.putconn(conn1)
+        self.pool.putconn(conn2)
+
+        # One connection is kept, as the minimum size is 1
+        time.sleep(0.01)
+        with self.pool.connection():
+            pass
+        self.assertEqual(self.pool.stats()['size'], 1)
+
+    def testClosed(self):
+        conn = self.pool.getconn()
+        self.pool.close()
+        self.assertRaises(pg8000.InterfaceError, self.pool.getconn)
+        self.pool.putconn(conn)
+        self.assertEqual(conn._sock, None)
+
+if __name__ == "__main__":
+    unittest.main()
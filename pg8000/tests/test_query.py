@@ -1,14 +1,27 @@
 import unittest
 import threading
+import socket
+import time
 import pg8000
 from .connection_settings import db_connect
 from six import u
 from sys import exc_info
 import datetime
+import decimal
 from distutils.version import LooseVersion
 
 from warnings import filterwarnings
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 
 # Tests relating to the basic operation of the database driver, driven by the
 # pg8000 custom interface.
@@ -89,7 +102,7 @@ class Tests(unittest.TestCase):
             c1, c2 = self.db.cursor(), self.db.cursor()
             c1count, c2count = 0, 0
             q = "select * from generate_series(1, %s)"
-            params = (self.db._row_cache_size + 1,)
+            params = (self.db.fetch_size + 1,)
             c1.execute(q, params)
             c2.execute(q, params)
             for c2row in c2:
@@ -103,15 +116,228 @@ class Tests(unittest.TestCase):
 
         self.assertEqual(c1count, c2count)
 
+    def testFetchSize(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.fetch_size = 10
+            cursor.execute("select * from generate_series(1, 25)")
+            self.assertTrue(cursor.portal_suspended)
+            self.assertEqual(len(cursor._cached_rows), 10)
+            self.assertEqual(
+                cursor.fetchall(), tuple((i,) for i in range(1, 26)))
+
+            # Zero means all the rows at once
+            cursor.fetch_size = 0
+            cursor.execute("select * from generate_series(1, 250)")
+            self.assertFalse(cursor.portal_suspended)
+            self.assertEqual(len(cursor._cached_rows), 250)
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+        db = pg8000.connect(fetch_size=5, **db_connect)
+        try:
+            self.assertEqual(db.cursor().fetch_size, 5)
+        finally:
+            db.close()
+
+    def testNamedCursor(self):
+        try:
+            cursor = self.db.cursor(name='c"1')
+            cursor.fetch_size = 100
+            cursor.execute(
+                "SELECT i, 'x' FROM generate_series(1, %s) AS i", (250,))
+            self.assertEqual(len(cursor._cached_rows), 100)
+            self.assertEqual(len(cursor.description), 2)
+            self.assertEqual(
+                [row[0] for row in cursor], list(range(1, 251)))
+            self.assertEqual(cursor.fetchone(), None)
+
+            # The same name can be used for a query with different columns
+            cursor.execute("SELECT 'y', generate_series(1, 100)")
+            self.assertEqual(cursor.fetchone(), ('y', 1))
+            self.assertEqual(len(cursor.fetchall()), 99)
+
+            self.assertRaises(
+                pg8000.ProgrammingError, cursor.executemany, "SELECT %s",
+                ((1,), (2,)))
+            cursor.close()
+
+            other = self.db.cursor()
+            other.execute(
+                "SELECT count(*) FROM pg_cursors WHERE name = 'c\"1'")
+            self.assertEqual(other.fetchone(), (0,))
+        finally:
+            self.db.rollback()
+
+    def testFetchColumns(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.fetch_size = 7
+            cursor.execute(
+                "SELECT i, 'x' || i FROM generate_series(1, 20) AS i")
+            self.assertEqual(cursor.fetchone(), (1, 'x1'))
+            self.assertEqual(
+                cursor.fetch_columns(), [
+                    list(range(2, 21)),
+                    ['x' + str(i) for i in range(2, 21)]])
+        finally:
+            self.db.rollback()
+
+    @unittest.skipIf(numpy is None, "NumPy isn't installed")
+    def testFetchNumpy(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.fetch_size = 7
+            cursor.execute(
+                "SELECT i, cast(i as int8), cast(i as float8), i > 10, "
+                "NULLIF(cast(i %% 3 as int2), 0), "
+                "timestamp '2000-01-01' + i * interval '1 ms', "
+                "date '2020-02-28' + i, timestamptz 'infinity' "
+                "FROM generate_series(1, 20) AS i")
+            arrays = cursor.fetch_numpy()
+            self.assertEqual(
+                [a.dtype for a in arrays], [
+                    numpy.int32, numpy.int64, numpy.float64, numpy.bool_,
+                    numpy.int16, numpy.dtype('datetime64[us]'),
+                    numpy.dtype('datetime64[D]'),
+                    numpy.dtype('datetime64[us]')])
+            self.assertEqual(arrays[0].tolist(), list(range(1, 21)))
+            self.assertEqual(arrays[3].sum(), 10)
+            self.assertEqual(
+                arrays[4].tolist(),
+                [None if i % 3 == 0 else i % 3 for i in range(1, 21)])
+            self.assertEqual(
+                arrays[5][2], numpy.datetime64('2000-01-01T00:00:00.003'))
+            self.assertEqual(arrays[6][1], numpy.datetime64('2020-03-01'))
+            self.assertTrue(numpy.isnat(arrays[7].data).all())
+
+            # Columns of other types hold Python objects
+            cursor.execute(
+                "SELECT NULLIF(i, 2), 'x' || i, ARRAY[i] "
+                "FROM generate_series(1, 20) AS i")
+            self.assertEqual(cursor.fetchone(), (1, 'x1', [1]))
+            arrays = cursor.fetch_numpy()
+            self.assertEqual(
+                arrays[0].tolist(), [None] + list(range(3, 21)))
+            self.assertEqual(arrays[1][0], 'x2')
+            self.assertEqual(arrays[2][0], [2])
+
+            cursor.execute("SELECT 1 WHERE false")
+            self.assertEqual(len(cursor.fetch_numpy()[0]), 0)
+        finally:
+            self.db.rollback()
+
+    @unittest.skipIf(numpy is None, "NumPy isn't installed")
+    def testFetchNumpyNamedCursor(self):
+        try:
+            cursor = self.db.cursor(name='c1')
+            cursor.fetch_size = 10
+            cursor.execute("SELECT generate_series(1, 25)")
+            self.assertEqual(
+                cursor.fetch_numpy()[0].tolist(), list(range(1, 26)))
+        finally:
+            self.db.rollback()
+
+    @unittest.skipIf(
+        numpy is None or pyarrow is None, "PyArrow isn't installed")
+    def testFetchArrowBatches(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.fetch_size = 7
+            cursor.execute(
+                "SELECT i, NULLIF('x' || i, 'x2') AS x, i > 10 AS b, "
+                "NULLIF(cast(i as int8), 3) AS n, date '2020-02-28' + i AS d, "
+                "timestamptz '2000-01-01' + i * interval '1 ms' AS t, "
+                "cast(i as numeric) AS num "
+                "FROM generate_series(1, 20) AS i")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            batches = list(cursor.fetch_arrow_batches(batch_size=8))
+            self.assertEqual([b.num_rows for b in batches], [8, 8, 3])
+            schema = batches[0].schema
+            self.assertEqual(
+                schema.types, [
+                    pyarrow.int32(), pyarrow.string(), pyarrow.bool_(),
+                    pyarrow.int64(), pyarrow.date32(),
+                    pyarrow.timestamp('us', 'UTC'), pyarrow.string()])
+            self.assertEqual(
+                schema.names, ['i', 'x', 'b', 'n', 'd', 't', 'num'])
+            table = pyarrow.Table.from_batches(batches)
+            self.assertEqual(
+                table.column(0).to_pylist(), list(range(2, 21)))
+            self.assertEqual(
+                table.column(1).to_pylist(),
+                [None] + ['x' + str(i) for i in range(3, 21)])
+            self.assertEqual(table.column(3).null_count, 1)
+            self.assertEqual(
+                table.column(4)[0].as_py(), datetime.date(2020, 3, 1))
+            self.assertEqual(table.column(6).to_pylist()[-1], '20')
+
+            # The Arrow type of a column of another type is inferred from the
+            # first batch with a value that isn't NULL.
+            cursor.execute(
+                "SELECT NULLIF(cast(i as numeric(5, 1)), 1), "
+                "CASE WHEN i > 1 THEN interval '1 s' * i END "
+                "FROM generate_series(1, 3) AS i")
+            batches = list(cursor.fetch_arrow_batches(batch_size=1))
+            self.assertEqual(
+                [b.schema.types for b in batches], [
+                    [pyarrow.decimal128(5, 1), pyarrow.null()],
+                    [pyarrow.decimal128(5, 1), pyarrow.duration('us')],
+                    [pyarrow.decimal128(5, 1), pyarrow.duration('us')]])
+
+            cursor.execute("SELECT 1 WHERE false")
+            batches = list(cursor.fetch_arrow_batches())
+            self.assertEqual(len(batches), 1)
+            self.assertEqual(batches[0].num_rows, 0)
+            self.assertEqual(batches[0].schema.types, [pyarrow.int32()])
+        finally:
+            self.db.rollback()
+
+    @unittest.skipIf(
+        numpy is None or pyarrow is None, "PyArrow isn't installed")
+    def testFetchArrowBatchesNamedCursor(self):
+        try:
+            cursor = self.db.cursor(name='c1')
+            cursor.fetch_size = 10
+            cursor.execute("SELECT generate_series(1, 25) AS n")
+            batches = list(cursor.fetch_arrow_batches(batch_size=10))
+            self.assertEqual([b.num_rows for b in batches], [10, 10, 5])
+            self.assertEqual(
+                pyarrow.Table.from_batches(batches).column('n').to_pylist(),
+                list(range(1, 26)))
+        finally:
+            self.db.rollback()
+
+    def testNamedCursorAutocommit(self):
+        self.db.autocommit = True
+        try:
+            cursor = self.db.cursor(name='c1')
+            cursor.fetch_size = 10
+            cursor.execute("SELECT generate_series(1, 25)")
+
+            # The cursor is WITH HOLD, so it outlives transactions
+            other = self.db.cursor()
+            other.execute("SELECT 1")
+            self.assertEqual(
+                cursor.fetchall(), tuple((i,) for i in range(1, 26)))
+            cursor.close()
+
+            other.execute(
+                "SELECT count(*) FROM pg_cursors WHERE name = 'c1'")
+            self.assertEqual(other.fetchone(), (0,))
+        finally:
+            self.db.autocommit = False
+
     # Test query works if the number of rows returned is exactly the same as
-    # the size of the row cache
+    # the fetch size
 
     def testQuerySizeCache(self):
         try:
             cursor = self.db.cursor()
             cursor.execute(
                 "select * from generate_series(1, %s)",
-                (self.db._row_cache_size,))
+                (self.db.fetch_size,))
             for row in cursor:
                 pass
         finally:
@@ -305,6 +531,557 @@ class Tests(unittest.TestCase):
             cursor.close()
             self.db.commit()
 
+    def testExecutemanyBatches(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.executemany_batch_size = 7
+            cursor.executemany(
+                "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)",
+                ((i, i, None if i % 3 else str(i)) for i in range(50)))
+            self.assertEqual(cursor.rowcount, 50)
+
+            cursor.execute("SELECT count(*), sum(f2) FROM t1")
+            self.assertEqual(cursor.fetchone(), (50, sum(range(50))))
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testExecutemanyError(self):
+        try:
+            cursor = self.db.cursor()
+            self.assertRaises(
+                pg8000.ProgrammingError, cursor.executemany,
+                "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)",
+                ((1, 1, None), (2, 2, None), (1, 3, None)))
+            self.db.rollback()
+
+            # The connection must still be usable after the failed batch
+            cursor.execute("SELECT count(*) FROM t1")
+            self.assertEqual(cursor.fetchone(), (0,))
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testExecutemanyAutocommit(self):
+        self.db.autocommit = True
+        try:
+            cursor = self.db.cursor()
+            rows = ((1, 1, None), (2, 2, None), (1, 3, None), (4, 4, None))
+            for batch_size in (1, 2, 100):
+                # Whatever the batch size, a failure means none of the rows
+                # are inserted.
+                cursor.executemany_batch_size = batch_size
+                self.assertRaises(
+                    pg8000.ProgrammingError, cursor.executemany,
+                    "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)", rows)
+                self.assertFalse(self.db.in_transaction)
+                cursor.execute("SELECT count(*) FROM t1")
+                self.assertEqual(cursor.fetchone(), (0,))
+
+            cursor.executemany(
+                "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)", rows[:2])
+            self.assertEqual(cursor.rowcount, 2)
+            self.assertFalse(self.db.in_transaction)
+            cursor.execute("SELECT count(*) FROM t1")
+            self.assertEqual(cursor.fetchone(), (2,))
+        finally:
+            cursor.close()
+            self.db.autocommit = False
+
+    def testExecutemanyEmpty(self):
+        try:
+            cursor = self.db.cursor()
+            cursor.executemany(
+                "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)", ())
+            self.assertEqual(cursor.rowcount, 0)
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testExecutemanyTypeChanges(self):
+        flushes = []
+        flush = self.db._flush
+
+        def count_flush():
+            flushes.append(None)
+            flush()
+        self.db._flush = count_flush
+        try:
+            cursor = self.db.cursor()
+            operation = "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s) " \
+                "RETURNING f3"
+            cursor.executemany(operation, ((0, 0, None), (1, 1, 'one')))
+            self.assertEqual(cursor.fetchall(), ((None,), ('one',)))
+
+            # Both statements are now prepared, so alternating between them
+            # doesn't split the batch.
+            rows = [(i, i, None if i % 2 else str(i)) for i in range(2, 100)]
+            del flushes[:]
+            cursor.executemany(operation, rows)
+            self.assertEqual(len(flushes), 1)
+            self.assertEqual(cursor.rowcount, len(rows))
+            self.assertEqual(
+                cursor.fetchall(), tuple((row[2],) for row in rows))
+
+            # Rows of different types are still decoded with the right
+            # statement.
+            rows = ((1.5,), ('a',), (2.5,), ('b',))
+            cursor.executemany("SELECT %s, 1.5", rows)
+            self.assertEqual(
+                cursor.fetchall(),
+                tuple((v, decimal.Decimal('1.5')) for v, in rows))
+        finally:
+            del self.db._flush
+            cursor.close()
+            self.db.rollback()
+
+    def testPipeline(self):
+        try:
+            c1, c2 = self.db.cursor(), self.db.cursor()
+            with self.db.pipeline():
+                c1.execute(
+                    "INSERT INTO t1 (f1, f2, f3) VALUES (%s, %s, %s)",
+                    (1, 1, None))
+                c1.execute("SELECT f2 FROM t1 WHERE f1 = %s", (1,))
+                c2.execute("SELECT cast(%s as int4), %s", (2, 'two'))
+            self.assertEqual(c1.fetchall(), ((1,),))
+            self.assertEqual(c2.fetchall(), ((2, 'two'),))
+        finally:
+            c1.close()
+            c2.close()
+            self.db.rollback()
+
+    def testPipelineErrors(self):
+        self.db.autocommit = True
+        try:
+            c1, c2, c3 = self.db.cursor(), self.db.cursor(), self.db.cursor()
+            pipeline = self.db.pipeline()
+            try:
+                with pipeline:
+                    c1.execute("SELECT 1")
+                    c2.execute("SELECT * FROM t99")
+                    c3.execute("SELECT 1 / %s", (0,))
+                self.assertTrue(False, "Should have raised an exception")
+            except pg8000.ProgrammingError as e:
+                self.assertEqual(e.args[1], '42P01')
+
+            self.assertEqual(c1.fetchall(), ((1,),))
+            self.assertEqual(
+                [(c, e.args[1]) for c, op, e in pipeline.errors],
+                [(c2, '42P01'), (c3, '22012')])
+        finally:
+            c1.close()
+            c2.close()
+            c3.close()
+            self.db.autocommit = False
+
+    def testPipelineDependent(self):
+        try:
+            cursor = self.db.cursor()
+            with self.db.pipeline():
+                cursor.execute("CREATE TEMPORARY TABLE pp (a int4)")
+                cursor.execute("INSERT INTO pp VALUES (%s)", (1,))
+                cursor.execute("SELECT a FROM pp")
+            self.assertEqual(cursor.fetchall(), ((1,),))
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testPipelineTransactionError(self):
+        try:
+            c1, c2, c3 = self.db.cursor(), self.db.cursor(), self.db.cursor()
+            pipeline = self.db.pipeline()
+            try:
+                with pipeline:
+                    c1.execute("SELECT 1")
+                    c2.execute("SELECT * FROM t99")
+                    c3.execute("SELECT 2")
+                self.assertTrue(False, "Should have raised an exception")
+            except pg8000.ProgrammingError as e:
+                self.assertEqual(e.args[1], '42P01')
+
+            # The statement after the error is skipped rather than failed
+            self.assertEqual(c1.fetchall(), ((1,),))
+            self.assertEqual(
+                [(c, e.args[1]) for c, op, e in pipeline.errors],
+                [(c2, '42P01')])
+            self.assertEqual(pipeline.skipped, [(c3, "SELECT 2")])
+            self.db.rollback()
+
+            # The same goes for an error when a statement is run rather than
+            # when it's parsed
+            try:
+                with pipeline:
+                    c1.execute("SELECT 1")
+                    c2.execute("SELECT 1 / %s", (0,))
+                    c3.execute("SELECT 2")
+                self.assertTrue(False, "Should have raised an exception")
+            except pg8000.ProgrammingError as e:
+                self.assertEqual(e.args[1], '22012')
+            self.assertEqual(pipeline.skipped, [(c3, "SELECT 2")])
+        finally:
+            c1.close()
+            c2.close()
+            c3.close()
+            self.db.rollback()
+
+    def testPrepare(self):
+        try:
+            statement = self.db.prepare("SELECT %s + 1, %s")
+            cache = self.db.statement_cache
+            cursor = statement.execute((1, 'a'))
+            self.assertIs(cursor, statement.cursor)
+            self.assertEqual(cursor.fetchall(), ((2, 'a'),))
+
+            # The same types reuse the statement without the cache
+            hits, misses = cache.hits, cache.misses
+            ps = cursor.ps
+            self.assertEqual(statement.execute((2, 'b')).fetchone(), (3, 'b'))
+            self.assertIs(cursor.ps, ps)
+            self.assertEqual((cache.hits, cache.misses), (hits, misses))
+
+            # Other types prepare another statement
+            self.assertEqual(
+                statement.execute((2.5, None)).fetchone(), (3.5, None))
+            self.assertIsNot(cursor.ps, ps)
+
+            # The statement is prepared again once it's been closed
+            cache.clear()
+            self.assertEqual(statement.execute((2, 'b')).fetchone(), (3, 'b'))
+
+            with self.db.pipeline():
+                self.assertRaises(
+                    pg8000.InterfaceError, statement.execute, (1, 'a'))
+        finally:
+            self.db.rollback()
+
+    def testPrepareRecentlyUsed(self):
+        cache = self.db.statement_cache
+        max_size = cache.max_size
+        cache.max_size = 3
+        try:
+            statement = self.db.prepare("SELECT %s")
+            ps = statement.execute((1,)).ps
+            cursor = self.db.cursor()
+            for i in range(20):
+                # Reusing the prepared statement keeps it in the cache while
+                # the other statements are evicted.
+                self.assertIs(statement.execute((i,)).ps, ps)
+                cursor.execute("SELECT %s, " + str(i % 3), (i,))
+            self.assertFalse(ps['closed'])
+        finally:
+            cache.max_size = max_size
+            self.db.rollback()
+
+    def testSingleRoundTrip(self):
+        self.db.prepare_threshold = None
+        self.db.single_round_trip = True
+        flushes = []
+        flush = self.db._flush
+
+        def count_flush():
+            flushes.append(None)
+            flush()
+        self.db._flush = count_flush
+        try:
+            cache = self.db.statement_cache
+            size = len(cache)
+            cursor, other = self.db.cursor(), self.db.cursor()
+            query = "SELECT %s::int4, 'x'::text, 1.5::numeric, ARRAY[1, 2], " \
+                "'2016-01-01'::date, '08:00:2b:01:02:03'::macaddr, " \
+                "'1.2.3.4'::inet"
+            db = pg8000.connect(**db_connect)
+            try:
+                prepared = db.cursor()
+                prepared.execute(query, (1,))
+                expected = prepared.fetchall()
+            finally:
+                db.close()
+
+            # The first time, the result types aren't known, so the statement
+            # takes an extra round trip. After that, the results are the same
+            # as for the prepared statement.
+            other.execute("SELECT 1")  # begins the transaction
+            counts = []
+            for i in range(2):
+                del flushes[:]
+                cursor.execute(query, (1,))
+                counts.append(len(flushes))
+                self.assertEqual(cursor.fetchall(), expected)
+            self.assertEqual(counts[1], counts[0] - 1)
+            self.assertEqual(
+                expected[0][:5],
+                (1, 'x', decimal.Decimal('1.5'), [1, 2],
+                 datetime.date(2016, 1, 1)))
+            self.assertEqual(len(cache), size)
+
+            # A suspended portal isn't affected by other statements
+            cursor.fetch_size = 10
+            for i in range(2):
+                cursor.execute("SELECT generate_series(1, 25)")
+                self.assertTrue(cursor.portal_suspended)
+                other.execute("SELECT 'y'")
+                self.assertEqual(other.fetchall(), (('y',),))
+                self.assertEqual(
+                    cursor.fetchall(), tuple((i,) for i in range(1, 26)))
+        finally:
+            del self.db._flush
+            self.db.prepare_threshold = 0
+            self.db.single_round_trip = False
+            self.db.rollback()
+
+    def testSingleRoundTripReturning(self):
+        self.db.prepare_threshold = None
+        self.db.single_round_trip = True
+        self.db.autocommit = True
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("CREATE TEMPORARY TABLE srt (a int4, b inet)")
+            cursor.execute("SELECT '1.2.3.4'::inet", prepare=True)
+            inet = cursor.fetchone()[0]
+            self.assertNotIsInstance(inet, bytes)
+            for i in range(2):
+                cursor.execute(
+                    "INSERT INTO srt VALUES (%s, '1.2.3.4') RETURNING a, b",
+                    (i,))
+                self.assertEqual(cursor.fetchall(), ((i, inet),))
+            cursor.execute("SELECT count(*) FROM srt")
+            self.assertEqual(cursor.fetchall(), ((2,),))
+        finally:
+            cursor.close()
+            self.db.prepare_threshold = 0
+            self.db.single_round_trip = False
+            self.db.autocommit = False
+
+    def testCancel(self):
+        cursor = self.db.cursor()
+        timer = threading.Timer(0.5, self.db.cancel)
+        timer.start()
+        try:
+            cursor.execute("SELECT pg_sleep(30)")
+            self.fail("the statement wasn't cancelled")
+        except pg8000.ProgrammingError as e:
+            self.assertEqual(e.args[1], '57014')  # query canceled
+        finally:
+            timer.join()
+        self.db.rollback()
+
+        # Cancelling when there's no statement running does nothing.
+        self.db.cancel()
+        cursor.execute("SELECT 1")
+        self.assertEqual(cursor.fetchall(), ((1,),))
+        self.db.rollback()
+
+    def testCancelTimeout(self):
+        # A server that accepts the cancel request's connection, but never
+        # replies to it.
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        address = self.db._host, self.db._port, self.db._unix_sock
+        cancel_timeout = pg8000.core.CANCEL_TIMEOUT
+        pg8000.core.CANCEL_TIMEOUT = 0.5
+        try:
+            self.db._host, self.db._port = listener.getsockname()
+            self.db._unix_sock = None
+            self.assertRaises(pg8000.OperationalError, self.db.cancel)
+
+            # The statement's result isn't held up for long by a stalled
+            # cancel request.
+            cursor = self.db.cursor()
+            begin_time = time.time()
+            cursor.execute("SELECT pg_sleep(0.2), 1", timeout=0.1)
+            self.assertEqual(cursor.fetchall(), (('', 1),))
+            self.assertLess(time.time() - begin_time, 2)
+        finally:
+            pg8000.core.CANCEL_TIMEOUT = cancel_timeout
+            self.db._host, self.db._port, self.db._unix_sock = address
+            listener.close()
+            self.db.rollback()
+
+    def testStatementTimeout(self):
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("SELECT pg_sleep(30)", timeout=0.5)
+            self.fail("the statement wasn't cancelled")
+        except pg8000.ProgrammingError as e:
+            self.assertEqual(e.args[1], '57014')  # query canceled
+        self.db.rollback()
+
+        # A statement that finishes in time isn't cancelled, and neither is
+        # the statement after it.
+        cursor.execute("SELECT 1", timeout=0.1)
+        self.assertEqual(cursor.fetchall(), ((1,),))
+        cursor.execute("SELECT pg_sleep(0.3)")
+        self.db.rollback()
+
+    def testPrepareThreshold(self):
+        self.db.prepare_threshold = 2
+        try:
+            cache = self.db.statement_cache
+            cursor = self.db.cursor()
+            query = "SELECT %s::int4 + 1"
+            for i in range(2):
+                cursor.execute(query, (i,))
+                self.assertEqual(cursor.fetchone(), (i + 1,))
+                self.assertEqual(cursor.ps['statement_name_bin'], b'\x00')
+            size = len(cache)
+            cursor.execute(query, (2,))
+            self.assertEqual(cursor.fetchone(), (3,))
+            self.assertNotEqual(cursor.ps['statement_name_bin'], b'\x00')
+            self.assertEqual(len(cache), size + 1)
+
+            # The prepare argument overrides the threshold
+            cursor.execute("SELECT 'unnamed'", prepare=False)
+            self.assertEqual(cursor.ps['statement_name_bin'], b'\x00')
+            cursor.execute("SELECT 'named'", prepare=True)
+            self.assertNotEqual(cursor.ps['statement_name_bin'], b'\x00')
+
+            # Statements are never prepared
+            self.db.prepare_threshold = None
+            cursor.execute("SELECT 'unnamed'")
+            cursor.execute("SELECT 'unnamed'")
+            self.assertEqual(cursor.ps['statement_name_bin'], b'\x00')
+            self.assertEqual(cursor.fetchone(), ('unnamed',))
+
+            # A suspended portal of the unnamed statement isn't affected by
+            # the next one
+            cursor.fetch_size = 10
+            cursor.execute("SELECT generate_series(1, 25)")
+            self.assertTrue(cursor.portal_suspended)
+            other = self.db.cursor()
+            other.execute("SELECT 'y'")
+            self.assertEqual(other.fetchall(), (('y',),))
+            self.assertEqual(
+                cursor.fetchall(), tuple((i,) for i in range(1, 26)))
+        finally:
+            self.db.prepare_threshold = 0
+            self.db.rollback()
+
+    def testStatementCache(self):
+        db = pg8000.connect(max_prepared_statements=2, **db_connect)
+        try:
+            cursor = db.cursor()
+            for i in range(5):
+                cursor.execute("SELECT %s + " + str(i), (1,))
+            cursor.execute("SELECT %s + 4", (1,))
+            cache = db.statement_cache
+
+            # The 'begin transaction' statement counts as well
+            self.assertEqual((cache.hits, cache.misses), (1, 6))
+            self.assertEqual(cache.evictions, 4)
+
+            # The evicted statements have been closed on the server, apart
+            # from the one evicted by this query, which is closed the next
+            # time a statement is prepared.
+            cursor.execute("SELECT count(*) FROM pg_prepared_statements")
+            self.assertEqual(cursor.fetchone(), (3,))
+        finally:
+            db.close()
+
+    def testStatementCacheSuspendedPortal(self):
+        db = pg8000.connect(max_prepared_statements=1, **db_connect)
+        try:
+            c1, c2 = db.cursor(), db.cursor()
+            count = db.fetch_size + 1
+            c1.execute("SELECT generate_series(1, %s)", (count,))
+
+            # Evicts the statement of c1 while its portal is still open
+            c2.execute("SELECT 1")
+            self.assertEqual(len(c1.fetchall()), count)
+        finally:
+            db.close()
+
+    def testLargeMessages(self):
+        # Messages bigger than the read buffer, and many small messages
+        # split across reads.
+        try:
+            cursor = self.db.cursor()
+            cursor.execute(
+                "SELECT repeat('x', 1000000), decode(repeat('ff', 200000), "
+                "'hex')")
+            retval = cursor.fetchone()
+            self.assertEqual(retval[0], 'x' * 1000000)
+            self.assertEqual(bytes(retval[1]), b'\xff' * 200000)
+
+            cursor.execute(
+                "SELECT i, repeat('y', i %% 100) FROM generate_series(1, %s) "
+                "AS i", (self.db.fetch_size,))
+            self.assertEqual(
+                cursor.fetchall(),
+                tuple((i, 'y' * (i % 100))
+                      for i in range(1, self.db.fetch_size + 1)))
+        finally:
+            cursor.close()
+
+    def testRowDecoder(self):
+        # Runs of fixed-width columns are decoded together, falling back to
+        # a column at a time when there's a NULL.
+        try:
+            cursor = self.db.cursor()
+            cursor.execute(
+                "SELECT i, cast(i as int2), cast(i as int8), "
+                "cast(i as float4), cast(i as float8), i > 1, "
+                "cast(i as oid), 'x' || i, NULLIF(i, 2), i + 1 "
+                "FROM generate_series(1, 3) AS i")
+            self.assertEqual(
+                cursor.fetchall(), tuple(
+                    (i, i, i, i, i, i > 1, i, 'x' + str(i),
+                     None if i == 2 else i, i + 1) for i in range(1, 4)))
+
+            cursor.execute(
+                "SELECT NULLIF(i, 2), NULLIF(i, 3) FROM generate_series(1, 3) "
+                "AS i")
+            self.assertEqual(
+                cursor.fetchall(), ((1, 1), (None, 2), (3, None)))
+
+            cursor.execute("SELECT 1, 'a', 2.5::float8, 'b'")
+            self.assertEqual(cursor.fetchall(), ((1, 'a', 2.5, 'b'),))
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+    def testRowFactory(self):
+        try:
+            cursor = self.db.cursor()
+            self.assertIs(cursor.row_factory, pg8000.tuple_row)
+            query = "SELECT i AS a, 'x' || i AS b, 1, 2 AS b " \
+                "FROM generate_series(1, 3) AS i"
+
+            cursor.row_factory = pg8000.list_row
+            cursor.execute(query)
+            self.assertEqual(cursor.fetchone(), [1, 'x1', 1, 2])
+
+            cursor.row_factory = pg8000.dict_row
+            cursor.execute(query)
+            self.assertEqual(
+                cursor.fetchone(), {'a': 1, 'b': 2, '?column?': 1})
+            self.assertEqual(
+                cursor.fetch_columns(), [[2, 3], [2, 2], [1, 1], [2, 2]])
+
+            # The row class is made once for the statement
+            cursor.row_factory = pg8000.namedtuple_row
+            cursor.execute(query)
+            row = cursor.fetchone()
+            self.assertEqual((row.a, row.b, row._2, row._3), (1, 'x1', 1, 2))
+            cursor.execute(query)
+            self.assertIs(type(cursor.fetchone()), type(row))
+
+            rows = list(cursor.copy_out_rows("SELECT 1 AS one"))
+            self.assertEqual(rows[0].one, 1)
+        finally:
+            cursor.close()
+            self.db.rollback()
+
+        db = pg8000.connect(row_factory=pg8000.dict_row, **db_connect)
+        try:
+            cursor = db.cursor()
+            cursor.execute("SELECT 1 AS one")
+            self.assertEqual(cursor.fetchall(), ({'one': 1},))
+            self.assertEqual(db.tpc_recover(), [])
+        finally:
+            db.close()
+
     # Check that autocommit stays off
     # We keep track of whether we're in a transaction or not by using the
     # READY_FOR_QUERY message.
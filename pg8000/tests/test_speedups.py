@@ -0,0 +1,139 @@
+import unittest
+import datetime
+import struct
+import pg8000
+from pg8000.core import _speedups
+from .connection_settings import db_connect
+
+
+def data_row(*values):
+    # The contents of a DataRow message with the given values, which are
+    # bytes or None.
+    msg = struct.pack('!h', len(values))
+    for v in values:
+        if v is None:
+            msg += struct.pack('!i', -1)
+        else:
+            msg += struct.pack('!i', len(v)) + v
+    return msg
+
+
+# Tests that the _speedups extension gives the same values as the pure Python
+# code.
+@unittest.skipIf(_speedups is None, "The _speedups extension isn't built")
+class Tests(unittest.TestCase):
+    def setUp(self):
+        self.db = pg8000.connect(**db_connect)
+        self.cursor = self.db.cursor()
+
+    def tearDown(self):
+        self.cursor.close()
+        self.db.close()
+
+    def decoders(self, oids, row_type=list):
+        # Returns the row decoders with and without the extension, for
+        # columns of the given types.
+        funcs = tuple(self.db.pg_types[oid][1] for oid in oids)
+        fast = self.db._make_row_decoder(funcs, row_type)
+        kinds = self.db.speedup_kinds
+        try:
+            self.db.speedup_kinds = None
+            slow = self.db._make_row_decoder(funcs, row_type)
+        finally:
+            self.db.speedup_kinds = kinds
+        return fast, slow
+
+    def assertParity(self, oids, *rows):
+        for row_type in (list, tuple):
+            fast, slow = self.decoders(oids, row_type)
+            for row in rows:
+                data = data_row(*row)
+                for d in (data, memoryview(data)):
+                    expected = slow(d)
+                    retval = fast(d)
+                    self.assertEqual(retval, expected)
+                    self.assertIs(type(retval), row_type)
+                    self.assertEqual(
+                        [type(v) for v in retval],
+                        [type(v) for v in expected])
+                    for v, e in zip(retval, expected):
+                        if isinstance(e, datetime.datetime):
+                            self.assertEqual(v.tzinfo, e.tzinfo)
+
+    def testNumbers(self):
+        self.assertParity(
+            (16, 21, 23, 20, 700, 701, 26),
+            (b'\x01', struct.pack('!h', -32768), struct.pack('!i', -1),
+             struct.pack('!q', 2 ** 63 - 1), struct.pack('!f', 1.5),
+             struct.pack('!d', -1e-300), struct.pack('!I', 2 ** 32 - 1)),
+            (b'\x00', struct.pack('!h', 32767),
+             struct.pack('!i', 2 ** 31 - 1), struct.pack('!q', -2 ** 63),
+             struct.pack('!f', float('inf')), struct.pack('!d', 0.1),
+             struct.pack('!I', 0)),
+            (None, None, None, None, None, None, None))
+
+    def testText(self):
+        self.assertParity(
+            (25, 1043, 17),
+            (b'', b'', b''),
+            (u"hello \u0173 world".encode('utf8'), b'x' * 100000,
+             b'\x00\xff'))
+
+    def testDateTimes(self):
+        timestamps = (
+            0, -1, 1, 86400 * 10 ** 6 - 1, -86400 * 10 ** 6,
+            1234567890123456, -63082281600 * 10 ** 6,
+            252455615999999999, 2 ** 63 - 1, -2 ** 63)
+        dates = (0, -1, 1, -730119, 2921939, 2 ** 31 - 1, -2 ** 31)
+        self.assertParity(
+            (1082, 1114, 1184),
+            *((struct.pack('!i', d), struct.pack('!q', t),
+               struct.pack('!q', t))
+              for d, t in zip(dates, timestamps)))
+
+    def testIntervals(self):
+        self.assertParity(
+            (1186,),
+            *((struct.pack('!qii', micros, days, months),)
+              for micros, days, months in (
+                  (0, 0, 0), (-1, 0, 0), (1, -1, 0), (86400 * 10 ** 6, 3, 0),
+                  (-123456789012, -7, 0), (1, 2, 3), (-1, 0, -1))))
+
+    def testOutOfRange(self):
+        for oid, value in (
+                (1114, struct.pack('!q', 252455616000000000)),
+                (1184, struct.pack('!q', -63082281600 * 10 ** 6 - 1)),
+                (1082, struct.pack('!i', 2921940))):
+            fast, slow = self.decoders((oid,))
+            data = data_row(value)
+            try:
+                slow(data)
+            except Exception as e:
+                self.assertRaises(type(e), fast, data)
+            else:
+                self.fail("Expected an exception")
+
+    def testCallFunction(self):
+        # Types without a kind, and values of an unexpected width, are
+        # decoded by calling the receive function.
+        self.assertParity(
+            (1700, 2950, 21),
+            (b'1.5', b'\x12' * 16, struct.pack('!i', 70000)))
+
+    def testQuery(self):
+        query = """SELECT i, i::int8, i::float8, 'x' || i, i > 50,
+            date '2000-01-01' + i, timestamp '2000-01-01' + i * interval '1 h',
+            timestamptz '2000-01-01' - i * interval '1 s',
+            i * interval '1 ms', NULLIF(i %% 3, 0), i::numeric,
+            ARRAY[i, NULL], ARRAY['a' || i], ARRAY[i::numeric]
+            FROM generate_series(1, 200) i"""
+        self.cursor.execute(query)
+        expected = self.cursor.fetchall()
+        self.db.speedup_kinds = None
+        self.db.statement_cache.clear()
+        self.cursor.execute(query)
+        self.assertEqual(self.cursor.fetchall(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -37,6 +37,26 @@ class Tests(unittest.TestCase):
         retval = self.cursor.fetchall()
         self.assertEqual(retval[0][0], datetime.date(2001, 2, 3))
 
+    def testDateTimeBinary(self):
+        self.cursor.execute(
+            "SELECT date '1999-12-31', date '2000-01-01', date 'infinity', "
+            "date '-infinity', time '00:00:00', time '23:59:59.999999', "
+            "time '12:34:56.5', timetz '04:05:06.789+05:30', "
+            "timetz '04:05:06-08'")
+        retval = self.cursor.fetchone()
+        self.assertEqual(
+            retval[:7], (
+                datetime.date(1999, 12, 31), datetime.date(2000, 1, 1),
+                datetime.date.max, datetime.date.min, datetime.time(0, 0, 0),
+                datetime.time(23, 59, 59, 999999),
+                datetime.time(12, 34, 56, 500000)))
+        self.assertEqual(retval[7].replace(tzinfo=None),
+                         datetime.time(4, 5, 6, 789000))
+        self.assertEqual(
+            retval[7].utcoffset(), datetime.timedelta(hours=5, minutes=30))
+        self.assertEqual(
+            retval[8].utcoffset(), datetime.timedelta(hours=-8))
+
     def testBoolRoundtrip(self):
         self.cursor.execute("SELECT %s as f1", (True,))
         retval = self.cursor.fetchall()
@@ -55,7 +75,7 @@ class Tests(unittest.TestCase):
             (None, None, None,))
         self.cursor.execute("SELECT * FROM TestNullWrite")
         retval = self.cursor.fetchone()
-        self.assertEqual(retval, [None, None, None])
+        self.assertEqual(retval, (None, None, None))
 
     def testNullSelectFailure(self):
         # See comment in TestNullRoundtrip.  This test is here to ensure that
@@ -74,6 +94,21 @@ class Tests(unittest.TestCase):
             retval = self.cursor.fetchall()
             self.assertEqual(str(retval[0][0]), v)
 
+    def testDecimalBinary(self):
+        # Numeric arrays are received in the binary format
+        values = (
+            "0", "0.00", "-0.5", "1E+5", "123456789012345678901234567890",
+            "0.000000000000000000001", "9999.9999", "10000.0001",
+            "-1000000000.123456789", "NaN", "1E-30", "7.1000")
+        for v in values:
+            self.cursor.execute(
+                "SELECT %s::numeric::text, ARRAY[%s::numeric]", (v, v))
+            as_text, retval = self.cursor.fetchone()
+            self.assertEqual(format(retval[0], "f"), as_text)
+            if v != "NaN":
+                self.assertEqual(retval[0], decimal.Decimal(v))
+                self.assertEqual(as_text, format(decimal.Decimal(v), "f"))
+
     def testFloatRoundtrip(self):
         # This test ensures that the binary float value doesn't change in a
         # roundtrip to the server.  That could happen if the value was
@@ -133,7 +168,7 @@ class Tests(unittest.TestCase):
         self.cursor.executemany("INSERT INTO test_int VALUES (%s)", v)
         self.cursor.execute("SELECT * from test_int")
         retval = self.cursor.fetchall()
-        self.assertEqual(retval, v)
+        self.assertEqual(retval, ((None,), (4,)))
 
     def testIntRoundtrip(self):
         int2 = 21
@@ -271,6 +306,31 @@ class Tests(unittest.TestCase):
         self.cursor.execute("select indkey from pg_index")
         retval = self.cursor.fetchall()
 
+    def testOidVectorIn(self):
+        self.cursor.execute("select cast('23 4294967295' as oidvector)")
+        self.assertEqual(self.cursor.fetchone()[0], [23, 4294967295])
+
+    def testArrayParse(self):
+        parse = pg8000.core.array_parse
+        self.assertEqual(parse('{}', int), [])
+        self.assertEqual(parse('{1,NULL,null,3}', int), [1, None, None, 3])
+        self.assertEqual(
+            parse('{{1,2},{3,4}}', int), [[1, 2], [3, 4]])
+        self.assertEqual(parse('[0:1]={5,6}', int), [5, 6])
+        self.assertEqual(
+            parse(r'{"a,b","{c}","NULL","d\"e","f\\g", h }', str),
+            ['a,b', '{c}', 'NULL', 'd"e', 'f\\g', 'h'])
+        self.assertRaises(pg8000.InterfaceError, parse, '{1,2', int)
+
+    def testDateArrayIn(self):
+        self.cursor.execute(
+            "SELECT ARRAY[date '2001-02-03', NULL], "
+            "ARRAY[[time '04:05:06']], ARRAY['{\"a\": [1, \"b,c\"]}'::json]")
+        self.assertEqual(
+            self.cursor.fetchone(), (
+                [datetime.date(2001, 2, 3), None],
+                [[datetime.time(4, 5, 6)]], [{"a": [1, "b,c"]}]))
+
     def testTimestampTzOut(self):
         self.cursor.execute(
             "SELECT '2001-02-03 04:05:06.17 America/Edmonton'"
@@ -344,6 +404,12 @@ class Tests(unittest.TestCase):
         self.cursor.fetchall()
         # It is sufficient that no errors were encountered.
 
+        self.cursor.execute(
+            "SELECT cast(4294967295 as oid), cast('4294967295' as xid), "
+            "ARRAY[cast(23 as oid)]")
+        self.assertEqual(
+            self.cursor.fetchone(), (4294967295, 4294967295, [23]))
+
     def testBooleanOut(self):
         self.cursor.execute("SELECT cast('t' as bool)")
         retval = self.cursor.fetchall()
@@ -666,6 +732,10 @@ class Tests(unittest.TestCase):
             retval = self.cursor.fetchall()
             self.assertEqual(retval[0][0], val)
 
+            self.cursor.execute(
+                "SELECT ARRAY[cast(%s as jsonb), NULL]", (json.dumps(val),))
+            self.assertEqual(self.cursor.fetchone()[0], [val, None])
+
     def test_timestamp_send_float(self):
         assert b('A\xbe\x19\xcf\x80\x00\x00\x00') == \
             pg8000.core.timestamp_send_float(
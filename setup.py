@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 
+import platform
+import sys
 import versioneer
-from setuptools import setup
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 
 long_description = """\
 
@@ -21,6 +24,32 @@ PostgreSQL interface for Python."""
 cmdclass = dict(versioneer.get_cmdclass())
 version = versioneer.get_version()
 
+
+class OptionalBuildExt(build_ext):
+    """The _speedups extension is optional. If it can't be built, pg8000 uses
+    its pure Python code instead."""
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except Exception as e:
+            self.warn("Not building the _speedups extension: " + str(e))
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except Exception as e:
+            self.warn("Not building the _speedups extension: " + str(e))
+
+
+cmdclass['build_ext'] = OptionalBuildExt
+
+if platform.python_implementation() == 'CPython' and \
+        sys.version_info >= (3, 3):
+    ext_modules = [Extension('pg8000._speedups', ['pg8000/_speedups.c'])]
+else:
+    ext_modules = []
+
 try:
     from sphinx.setup_command import BuildDoc
     cmdclass['build_sphinx'] = BuildDoc
@@ -61,6 +90,7 @@ setup(
     ],
     keywords="postgresql dbapi",
     packages=("pg8000",),
+    ext_modules=ext_modules,
     command_options={
         'build_sphinx': {
             'version': ('setup.py', version),